@@ -70,6 +70,7 @@ REST_FRAMEWORK = {
 
 MIDDLEWARE = [
     'core.middleware.ResponseMiddleware',
+    'core.middleware.StorageMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
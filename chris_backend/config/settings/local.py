@@ -78,6 +78,11 @@ for app in ['collectionjson', 'core', 'feeds', 'plugins', 'plugininstances', 'pi
             'propagate': False  # required to avoid double logging with root logger
         }
 
+# Storage settings ('swift' or 'filesystem')
+# NOTE: pfcon still pushes the plugin instances' output files into swift so the
+# 'filesystem' backend can't register them (see core.filesystemmanager)
+STORAGE_BACKEND = 'swift'
+
 # Swift service settings
 DEFAULT_FILE_STORAGE = 'swift.storage.SwiftStorage'
 SWIFT_AUTH_URL = 'http://swift_service:8080/auth/v1.0'
@@ -87,6 +92,13 @@ SWIFT_CONTAINER_NAME = 'users'
 SWIFT_CONNECTION_PARAMS = {'user': SWIFT_USERNAME,
                            'key': SWIFT_KEY,
                            'authurl': SWIFT_AUTH_URL}
+SWIFT_CONNECTION_POOL_SIZE = 10
+SWIFT_CONNECTION_POOL_TIMEOUT = 30
+SWIFT_CONNECTION_POOL_HEALTH_CHECK_INTERVAL = 60
+SWIFT_AUTH_TOKEN_TTL = 82800
+SWIFT_LOOKUP_CACHE_SIZE = 1024
+SWIFT_LOOKUP_CACHE_TTL = 30
+SWIFT_LOOKUP_CACHE_BACKEND = None
 try:
     SwiftManager(SWIFT_CONTAINER_NAME, SWIFT_CONNECTION_PARAMS).create_container()
 except Exception as e:
@@ -6,6 +6,7 @@ Production Configurations
 
 from .common import *  # noqa
 from environs import Env, EnvValidationError
+from core.filesystemmanager import FileSystemManager
 from core.swiftmanager import SwiftManager
 
 # Normally you should not import ANYTHING from Django directly
@@ -51,20 +52,43 @@ DATABASES['default']['HOST'] = get_secret('DATABASE_HOST')
 DATABASES['default']['PORT'] = get_secret('DATABASE_PORT')
 
 
-# SWIFT SERVICE CONFIGURATION
+# STORAGE CONFIGURATION
 # ------------------------------------------------------------------------------
-DEFAULT_FILE_STORAGE = 'swift.storage.SwiftStorage'
-SWIFT_AUTH_URL = get_secret('SWIFT_AUTH_URL')
-SWIFT_USERNAME = get_secret('SWIFT_USERNAME')
-SWIFT_KEY = get_secret('SWIFT_KEY')
-SWIFT_CONTAINER_NAME = get_secret('SWIFT_CONTAINER_NAME')
-SWIFT_CONNECTION_PARAMS = {'user': SWIFT_USERNAME,
-                           'key': SWIFT_KEY,
-                           'authurl': SWIFT_AUTH_URL}
-try:
-    SwiftManager(SWIFT_CONTAINER_NAME, SWIFT_CONNECTION_PARAMS).create_container()
-except Exception as e:
-    raise ImproperlyConfigured(str(e))
+# 'swift' or 'filesystem' (a POSIX filesystem shared with the compute environment)
+# NOTE: pfcon still pushes the plugin instances' output files into swift, so with the
+# 'filesystem' backend their registration fails unless the compute environment writes
+# the outputs directly to MEDIA_ROOT (see core.filesystemmanager.FileSystemManager)
+STORAGE_BACKEND = env.str('STORAGE_BACKEND', 'swift')
+if STORAGE_BACKEND == 'filesystem':
+    DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    MEDIA_ROOT = get_secret('MEDIA_ROOT')
+    STORAGE_FILESYSTEM_HARDLINKS = env.bool('STORAGE_FILESYSTEM_HARDLINKS', True)
+    try:
+        FileSystemManager(MEDIA_ROOT).create_container()
+    except Exception as e:
+        raise ImproperlyConfigured(str(e))
+else:
+    # SWIFT SERVICE CONFIGURATION
+    DEFAULT_FILE_STORAGE = 'swift.storage.SwiftStorage'
+    SWIFT_AUTH_URL = get_secret('SWIFT_AUTH_URL')
+    SWIFT_USERNAME = get_secret('SWIFT_USERNAME')
+    SWIFT_KEY = get_secret('SWIFT_KEY')
+    SWIFT_CONTAINER_NAME = get_secret('SWIFT_CONTAINER_NAME')
+    SWIFT_CONNECTION_PARAMS = {'user': SWIFT_USERNAME,
+                               'key': SWIFT_KEY,
+                               'authurl': SWIFT_AUTH_URL}
+    SWIFT_CONNECTION_POOL_SIZE = env.int('SWIFT_CONNECTION_POOL_SIZE', 10)
+    SWIFT_CONNECTION_POOL_TIMEOUT = env.int('SWIFT_CONNECTION_POOL_TIMEOUT', 30)
+    SWIFT_CONNECTION_POOL_HEALTH_CHECK_INTERVAL = env.int(
+        'SWIFT_CONNECTION_POOL_HEALTH_CHECK_INTERVAL', 60)
+    SWIFT_AUTH_TOKEN_TTL = env.int('SWIFT_AUTH_TOKEN_TTL', 82800)
+    SWIFT_LOOKUP_CACHE_SIZE = env.int('SWIFT_LOOKUP_CACHE_SIZE', 1024)
+    SWIFT_LOOKUP_CACHE_TTL = env.int('SWIFT_LOOKUP_CACHE_TTL', 30)
+    SWIFT_LOOKUP_CACHE_BACKEND = env.str('SWIFT_LOOKUP_CACHE_BACKEND', None)
+    try:
+        SwiftManager(SWIFT_CONTAINER_NAME, SWIFT_CONNECTION_PARAMS).create_container()
+    except Exception as e:
+        raise ImproperlyConfigured(str(e))
 
 
 # CHRIS STORE SERVICE CONFIGURATION
@@ -3,7 +3,7 @@ from django.contrib import admin
 from django.contrib.auth.models import Group
 from rest_framework.authtoken.models import Token
 
-from .models import ChrisInstance
+from .models import ChrisInstance, StorageDeletion
 
 
 class ChrisInstanceAdmin(admin.ModelAdmin):
@@ -17,8 +17,20 @@ class ChrisInstanceAdmin(admin.ModelAdmin):
         return False
 
 
+class StorageDeletionAdmin(admin.ModelAdmin):
+    readonly_fields = ['creation_date', 'modification_date', 'paths', 'status',
+                       'objects_deleted', 'objects_failed', 'batches', 'attempts']
+    list_display = ('id', 'status', 'objects_deleted', 'objects_failed', 'batches',
+                    'attempts', 'creation_date', 'modification_date')
+    list_filter = ['status']
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.site_header = 'ChRIS Administration'
 admin.site.site_title = 'ChRIS Admin'
 admin.site.unregister(Group)
 admin.site.unregister(Token)
 admin.site.register(ChrisInstance, ChrisInstanceAdmin)
+admin.site.register(StorageDeletion, StorageDeletionAdmin)
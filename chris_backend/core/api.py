@@ -32,6 +32,9 @@ urlpatterns = format_suffix_patterns([
     path('v1/chrisinstance/<int:pk>/',
          core_views.ChrisInstanceDetail.as_view(), name='chrisinstance-detail'),
 
+    path('v1/storagemetrics/',
+         core_views.StorageMetricsDetail.as_view(), name='storagemetrics-detail'),
+
 
     path('v1/',
         feed_views.FeedList.as_view(), name='feed-list'),
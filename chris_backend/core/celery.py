@@ -4,7 +4,9 @@ from logging.config import dictConfig
 from django.conf import settings
 
 from celery import Celery
-from celery.signals import setup_logging
+from celery.signals import setup_logging, task_prerun, task_postrun
+
+from core import storagemetrics
 
 # set the default Django settings module for the 'celery' program
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.local')
@@ -23,12 +25,17 @@ app.autodiscover_tasks()
 # define the the queue for each task
 # the default 'celery' queue is exclusively used for the automated tests
 task_routes = {
+    'core.tasks.delete_storage_objects': {'queue': 'main'},
+    'core.tasks.purge_expired_task_leases': {'queue': 'main'},
     'plugininstances.tasks.sum': {'queue': 'main'},
     'plugininstances.tasks.run_plugin_instance': {'queue': 'main'},
     'plugininstances.tasks.check_plugin_instance_exec_status': {'queue': 'main'},
+    'plugininstances.tasks.register_plugin_instance_output_files': {'queue': 'main'},
     'plugininstances.tasks.cancel_plugin_instance': {'queue': 'main'},
     'plugininstances.tasks.run_waiting_for_previous_plugin_instances':
         {'queue': 'main'},
+    'plugininstances.tasks.check_compute_resource_plugin_instances_exec_status':
+        {'queue': 'main'},
     'plugininstances.tasks.check_started_plugin_instances_exec_status':
         {'queue': 'main'},
     'plugininstances.tasks.cancel_waiting_for_previous_plugin_instances':
@@ -50,6 +57,10 @@ app.conf.beat_schedule = {
         'task': 'plugininstances.tasks.cancel_waiting_for_previous_plugin_instances',
         'schedule': 20.0,
     },
+    'purge-expired-task-leases-every-hour': {
+        'task': 'core.tasks.purge_expired_task_leases',
+        'schedule': 3600.0,
+    },
 }
 
 # use logging settings in Django settings
@@ -57,6 +68,16 @@ app.conf.beat_schedule = {
 def config_loggers(*args, **kwags):
     dictConfig(settings.LOGGING)
 
+# attribute the storage operations made by tasks to celery
+@task_prerun.connect
+def set_storage_metrics_context(*args, **kwargs):
+    storagemetrics.set_context('celery')
+
+@task_postrun.connect
+def flush_storage_metrics(*args, **kwargs):
+    storagemetrics.clear_context()
+    storagemetrics.flush()
+
 # example task that is passed info about itself
 @app.task(bind=True)
 def debug_task(self):
@@ -0,0 +1,494 @@
+"""
+POSIX filesystem storage manager module.
+"""
+
+import datetime
+import fcntl
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import time
+import uuid
+from email.utils import formatdate
+
+from swiftclient.exceptions import ClientException
+
+from .storagemanager import StorageManager
+
+
+logger = logging.getLogger(__name__)
+
+# ioctl request to clone (reflink) a file on filesystems that support it (Btrfs, XFS)
+FICLONE = 0x40049409
+
+# prefix of the temporary files used to atomically write objects
+TMP_PREFIX = '.chris-tmp-'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileSystemManager(StorageManager):
+    """
+    Storage manager that keeps the objects as files under a root directory of a
+    (usually shared, parallel) POSIX filesystem. Object names map to relative file
+    paths. Objects are written atomically through a temporary file so copies can
+    safely be hard links (or reflinks) of the source file.
+
+    NOTE: pfcon still pushes the plugin instances' output files into swift storage
+    ('swiftPut'), so with this backend they are not found under the instances'
+    output paths and their registration fails once the wait deadline is reached.
+    This backend is only usable for plugin instances whose compute environment
+    writes the output files directly to the shared filesystem.
+    """
+
+    def __init__(self, root_dir, use_hardlinks=True):
+        # absolute path of the directory where the objects are stored
+        self.root_dir = os.path.abspath(root_dir)
+        # whether copies are hard links of the source file when possible
+        self.use_hardlinks = use_hardlinks
+
+    def create_container(self):
+        """
+        Create the storage root dir.
+        """
+        try:
+            os.makedirs(self.root_dir, exist_ok=True)
+        except OSError as e:
+            raise self._get_client_exception(e, self.root_dir)
+
+    def ls(self, path, **kwargs):
+        """
+        Return a list of objects in the filesystem storage with the provided path as a
+        prefix. If the 'details' keyword argument is True then the listing dictionaries
+        (name, bytes, hash, content_type, last_modified) are returned instead of just
+        the names.
+        """
+        l_ls = []
+        for l_page in self.ls_pages(path, details=kwargs.get('details', False)):
+            l_ls.extend(l_page)
+        return l_ls
+
+    def ls_pages(self, path, page_size=10000, **kwargs):
+        """
+        Generator that lazily yields the listing of objects in the filesystem storage
+        with the provided path as a prefix, one page of at most <page_size> entries at
+        a time, in the same order as swift. Directories are scanned with os.scandir
+        only as the listing is consumed. Supported keyword arguments are 'marker',
+        'delimiter' (only '/' is supported) and 'details'.
+        """
+        if not path:
+            return
+        marker = kwargs.get('marker', '')
+        b_subdirs = kwargs.get('delimiter') == '/'
+        b_details = kwargs.get('details', False)
+        (rel_dir, _, name_prefix) = path.lstrip('/').rpartition('/')
+        page = []
+        try:
+            for d_obj in self._scan(rel_dir, name_prefix, marker, b_subdirs):
+                page.append(d_obj if b_details else d_obj.get('name', d_obj.get('subdir')))
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        except OSError as e:
+            exc = self._get_client_exception(e, path)
+            logger.error(str(exc))
+            raise exc
+        if page:
+            yield page
+
+    def path_exists(self, path):
+        """
+        Return True/False if passed path exists in the filesystem storage.
+        """
+        return next(self.ls_pages(path, page_size=1), None) is not None
+
+    def obj_exists(self, obj_path):
+        """
+        Return True/False if passed object exists in the filesystem storage.
+        """
+        return os.path.isfile(self._get_abs_path(obj_path))
+
+    def stat_obj(self, obj_path):
+        """
+        Return a listing dictionary (with 'name', 'bytes', 'hash', 'content_type' and
+        'last_modified' keys) for an object in the filesystem storage. As in the
+        listings no content hash is computed.
+        """
+        try:
+            st = os.stat(self._get_abs_path(obj_path))
+        except OSError as e:
+            raise self._get_client_exception(e, obj_path)
+        return {'name': obj_path,
+                'bytes': st.st_size,
+                'hash': '',
+                'content_type': mimetypes.guess_type(obj_path)[0] or
+                                'application/octet-stream',
+                'last_modified': datetime.datetime.utcfromtimestamp(
+                    st.st_mtime).isoformat()}
+
+    def upload_obj(self, obj_path, contents, **kwargs):
+        """
+        Upload an object (a file contents) into the filesystem storage. The contents
+        can be a string, bytes or a file-like object.
+        """
+        chunk_size = kwargs.get('chunk_size', 65536)
+        abs_path = self._get_abs_path(obj_path)
+        try:
+            with self._open_tmp_file(abs_path) as (f, tmp_path):
+                if isinstance(contents, str):
+                    f.write(contents.encode('utf-8'))
+                elif isinstance(contents, bytes):
+                    f.write(contents)
+                else:
+                    shutil.copyfileobj(contents, f, chunk_size)
+            os.replace(tmp_path, abs_path)
+        except OSError as e:
+            exc = self._get_client_exception(e, obj_path)
+            logger.error(str(exc))
+            raise exc
+
+    def download_obj(self, obj_path, **kwargs):
+        """
+        Download an object from the filesystem storage.
+        """
+        try:
+            with open(self._get_abs_path(obj_path), 'rb') as f:
+                return f.read()
+        except OSError as e:
+            exc = self._get_client_exception(e, obj_path)
+            logger.error(str(exc))
+            raise exc
+
+    def stream_obj(self, obj_path, chunk_size=65536, **kwargs):
+        """
+        Return swift-like response headers for an object in the filesystem storage and
+        an iterable over its contents in chunks of <chunk_size> bytes. A single range
+        'Range' header is honoured.
+        """
+        abs_path = self._get_abs_path(obj_path)
+        try:
+            st = os.stat(abs_path)
+        except OSError as e:
+            raise self._get_client_exception(e, obj_path)
+        size = st.st_size
+        (start, end) = (0, size - 1)
+        resp_headers = {
+            'content-type': mimetypes.guess_type(obj_path)[0] or
+                            'application/octet-stream',
+            'etag': '%x-%x' % (st.st_mtime_ns, size),
+            'last-modified': formatdate(st.st_mtime, usegmt=True),
+        }
+        range_match = RANGE_RE.match(kwargs.get('headers', {}).get('Range', ''))
+        if range_match:
+            (first, last) = range_match.groups()
+            if first:
+                (start, end) = (int(first), min(int(last), size - 1) if last else size - 1)
+            elif last:
+                (start, end) = (max(size - int(last), 0), size - 1)
+            if start > end:
+                raise ClientException('%s: range not satisfiable' % obj_path,
+                                      http_status=416)
+            resp_headers['content-range'] = 'bytes %s-%s/%s' % (start, end, size)
+        resp_headers['content-length'] = str(max(end - start + 1, 0))
+        return resp_headers, self._read_chunks(obj_path, chunk_size, start, end)
+
+    def prefetch_objs(self, obj_paths, max_workers=4, chunk_size=65536,
+                      buffer_chunks=16):
+        """
+        Generator that yields (obj_path, chunks) tuples in the same order as the passed
+        iterable of object paths, where chunks is an iterator over the object contents.
+        Local files are read lazily so no prefetching is needed. Iterating chunks
+        raises ClientException if the object could not be read.
+        """
+        for obj_path in obj_paths:
+            yield obj_path, self._read_chunks(obj_path, chunk_size)
+
+    def copy_obj(self, obj_path, dest_path, **kwargs):
+        """
+        Copy an object to a new destination in the filesystem storage. The copy is a
+        hard link of the source file when possible, otherwise a reflink on filesystems
+        that support it and a plain copy as a last resort.
+        """
+        src_path = self._get_abs_path(obj_path)
+        abs_path = self._get_abs_path(dest_path)
+        try:
+            os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+            tmp_path = os.path.join(os.path.dirname(abs_path),
+                                    TMP_PREFIX + uuid.uuid4().hex)
+            try:
+                if not self.use_hardlinks:
+                    raise OSError('hard links disabled')
+                os.link(src_path, tmp_path)
+            except OSError:
+                with open(src_path, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+                    try:
+                        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    except OSError:
+                        shutil.copyfileobj(fsrc, fdst, 1048576)
+            os.replace(tmp_path, abs_path)
+        except OSError as e:
+            exc = self._get_client_exception(e, obj_path)
+            logger.error(str(exc))
+            raise exc
+
+    def copy_objs(self, copy_list, max_workers=8, retries=3, progress_callback=None,
+                  **kwargs):
+        """
+        Copy many objects to new destinations in the filesystem storage. <copy_list>
+        is a list of (obj_path, dest_path, nbytes) tuples. Copies are cheap links so
+        they are done in the calling thread. Return a dictionary with the totals and
+        the list of objects that could not be copied.
+        """
+        nobjects = 0
+        nbytes = 0
+        l_failed = []
+        for (obj_path, dest_path, size) in copy_list:
+            try:
+                self.copy_obj(obj_path, dest_path, **kwargs)
+            except ClientException:
+                l_failed.append(obj_path)
+            else:
+                nobjects += 1
+                nbytes += size
+            if progress_callback is not None:
+                progress_callback(nobjects, nbytes)
+        return {'objects': nobjects, 'bytes': nbytes, 'failed': l_failed}
+
+    def delete_obj(self, obj_path):
+        """
+        Delete an object from the filesystem storage.
+        """
+        try:
+            os.remove(self._get_abs_path(obj_path))
+        except OSError as e:
+            exc = self._get_client_exception(e, obj_path)
+            logger.error(str(exc))
+            raise exc
+
+    def delete_objs(self, obj_paths, batch_size=1000, retries=3,
+                    progress_callback=None):
+        """
+        Delete many objects from the filesystem storage. <obj_paths> can be any
+        iterable (for instance a lazy listing). Objects that do not exist are
+        considered deleted and the dirs left empty are removed. If provided, the
+        <progress_callback> is called after every <batch_size> objects with the number
+        of objects deleted and the number of batches so far. Return a dictionary with
+        those totals and the list of objects that could not be deleted.
+        """
+        ndeleted = 0
+        nbatches = 0
+        nbatch = 0
+        l_failed = []
+        s_dirs = set()
+        for obj_path in obj_paths:
+            abs_path = self._get_abs_path(obj_path)
+            try:
+                os.remove(abs_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error('Deletion of %s failed, detail: %s', obj_path, str(e))
+                l_failed.append(obj_path)
+                continue
+            s_dirs.add(os.path.dirname(abs_path))
+            ndeleted += 1
+            nbatch += 1
+            if nbatch >= batch_size:
+                nbatches += 1
+                nbatch = 0
+                if progress_callback is not None:
+                    progress_callback(ndeleted, nbatches)
+        if nbatch:
+            nbatches += 1
+            if progress_callback is not None:
+                progress_callback(ndeleted, nbatches)
+        self._remove_empty_dirs(s_dirs)
+        return {'objects': ndeleted, 'batches': nbatches, 'failed': l_failed}
+
+    def upload_files(self, local_dir, swift_prefix='', max_workers=4,
+                     chunk_size=65536, **kwargs):
+        """
+        Upload all the files within a local directory recursively to the filesystem
+        storage. The location in storage maps 1:1 to the location of the files in the
+        local filesystem unless it is remapped with <swift_prefix>. Existing objects
+        are skipped. Return the same report dictionary as SwiftManager.upload_files.
+        """
+        results = []
+        start = time.monotonic()
+        for root, dirs, files in os.walk(local_dir):
+            swift_base = root.replace(local_dir, swift_prefix, 1) if swift_prefix else root
+            for filename in files:
+                swift_path = os.path.join(swift_base, filename)
+                local_file_path = os.path.join(root, filename)
+                d_result = {'local_path': local_file_path, 'swift_path': swift_path,
+                            'status': 'skipped', 'bytes': 0}
+                results.append(d_result)
+                if self.obj_exists(swift_path):
+                    continue
+                try:
+                    with open(local_file_path, 'rb') as f:
+                        self.upload_obj(swift_path, f, chunk_size=chunk_size)
+                except (OSError, ClientException) as e:
+                    d_result['status'] = 'failed'
+                    d_result['error'] = str(e)
+                else:
+                    d_result['status'] = 'uploaded'
+                    d_result['bytes'] = os.path.getsize(local_file_path)
+        elapsed = time.monotonic() - start
+
+        uploaded = [d for d in results if d['status'] == 'uploaded']
+        total_bytes = sum(d['bytes'] for d in uploaded)
+        return {
+            'results':          results,
+            'uploaded':         len(uploaded),
+            'skipped':          len([d for d in results if d['status'] == 'skipped']),
+            'failed':           len([d for d in results if d['status'] == 'failed']),
+            'bytes':            total_bytes,
+            'elapsed':          elapsed,
+            'files_per_sec':    len(uploaded) / elapsed if elapsed else 0,
+            'bytes_per_sec':    total_bytes / elapsed if elapsed else 0
+        }
+
+    def _get_abs_path(self, obj_path):
+        """
+        Internal method to get the absolute filesystem path of an object making sure
+        that it is within the storage root dir.
+        """
+        abs_path = os.path.normpath(os.path.join(self.root_dir, obj_path.lstrip('/')))
+        if not abs_path.startswith(self.root_dir + os.sep):
+            raise ClientException('%s: invalid object path' % obj_path, http_status=400)
+        return abs_path
+
+    def _scan(self, rel_dir, name_prefix, marker, b_subdirs):
+        """
+        Internal generator that yields the listing dictionaries of the files under a
+        dir whose name starts with the provided prefix, in lexicographic order of
+        their relative paths.
+        """
+        abs_dir = self._get_abs_path(rel_dir) if rel_dir else self.root_dir
+        try:
+            entries = list(os.scandir(abs_dir))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        l_entries = []
+        for entry in entries:
+            if not entry.name.startswith(name_prefix) or \
+                    entry.name.startswith(TMP_PREFIX):
+                continue
+            name = rel_dir + '/' + entry.name if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                # sorting dirs with a trailing slash gives swift's global ordering
+                l_entries.append((name + '/', entry))
+            else:
+                l_entries.append((name, entry))
+        l_entries.sort(key=lambda t: t[0])
+        for (name, entry) in l_entries:
+            if name.endswith('/'):
+                if marker >= name and not marker.startswith(name):
+                    continue  # every object in the dir is before the marker
+                if b_subdirs:
+                    if name > marker:
+                        yield {'subdir': name}
+                else:
+                    yield from self._scan(name[:-1], '', marker, b_subdirs)
+            elif name > marker:
+                st = entry.stat(follow_symlinks=False)
+                yield {'name': name,
+                       'bytes': st.st_size,
+                       'hash': '',
+                       'content_type': mimetypes.guess_type(name)[0] or
+                                       'application/octet-stream',
+                       'last_modified': datetime.datetime.utcfromtimestamp(
+                           st.st_mtime).isoformat()}
+
+    def _read_chunks(self, obj_path, chunk_size, start=0, end=None):
+        """
+        Internal generator that reads an object's contents (optionally only the bytes
+        from <start> to <end> inclusive) in chunks of <chunk_size> bytes.
+        """
+        try:
+            with open(self._get_abs_path(obj_path), 'rb') as f:
+                f.seek(start)
+                remaining = None if end is None else end - start + 1
+                while remaining is None or remaining > 0:
+                    size = chunk_size if remaining is None else min(chunk_size,
+                                                                    remaining)
+                    chunk = f.read(size)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+        except OSError as e:
+            exc = self._get_client_exception(e, obj_path)
+            logger.error(str(exc))
+            raise exc
+
+    def _open_tmp_file(self, abs_path):
+        """
+        Internal method to create a temporary file in the dir of the provided path,
+        creating the dir if needed. Return a context manager for a (file object,
+        temporary file path) tuple.
+        """
+        dir_path = os.path.dirname(abs_path)
+        tmp_path = os.path.join(dir_path, TMP_PREFIX + uuid.uuid4().hex)
+        for attempt in range(2):
+            os.makedirs(dir_path, exist_ok=True)
+            try:
+                f = open(tmp_path, 'xb')
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                continue  # the dir was concurrently removed as it became empty
+            return _TmpFile(f, tmp_path)
+
+    def _remove_empty_dirs(self, dirs):
+        """
+        Internal method to remove the provided dirs and their parents up to the
+        storage root dir as long as they are empty.
+        """
+        for dir_path in sorted(dirs, key=len, reverse=True):
+            while dir_path.startswith(self.root_dir + os.sep):
+                try:
+                    os.rmdir(dir_path)
+                except OSError:
+                    break
+                dir_path = os.path.dirname(dir_path)
+
+    @staticmethod
+    def _get_client_exception(e, obj_path):
+        """
+        Internal method to get the ClientException (with the HTTP status swift would
+        have returned) corresponding to an OSError.
+        """
+        if isinstance(e, ClientException):
+            return e
+        http_status = 404 if isinstance(e, (FileNotFoundError, NotADirectoryError)) \
+            else 500
+        return ClientException('%s: %s' % (obj_path, e.strerror or str(e)),
+                               http_status=http_status)
+
+
+class _TmpFile(object):
+    """
+    Context manager for a temporary file that removes the file if an error happens
+    before it is closed.
+    """
+
+    def __init__(self, f, tmp_path):
+        self.f = f
+        self.tmp_path = tmp_path
+
+    def __enter__(self):
+        return self.f, self.tmp_path
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.f.close()
+        if exc_type is not None:
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+        return False
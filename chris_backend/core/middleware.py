@@ -1,4 +1,6 @@
 
+import logging
+
 from django.http import HttpResponse
 
 from rest_framework import status
@@ -6,6 +8,11 @@ from rest_framework.renderers import JSONRenderer
 
 from collectionjson.renderers import CollectionJsonRenderer
 
+from . import storagemetrics
+
+
+logger = logging.getLogger(__name__)
+
 
 class RenderedResponse(HttpResponse):
     """
@@ -65,3 +72,28 @@ class ResponseMiddleware(object):
     def process_exception(self, request, exception):
         print(exception)
         return api_500(request)
+
+
+class StorageMetricsMiddleware(object):
+    """
+    Middleware that attributes the storage operations made while serving a request
+    to the API and adds a summary of them to the response in a Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        summary = storagemetrics.StorageSummary()
+        storagemetrics.set_context('api', summary)
+        try:
+            response = self.get_response(request)
+        finally:
+            storagemetrics.clear_context()
+        if summary.calls:
+            response['Server-Timing'] = summary.get_server_timing()
+            logger.info('%s %s made %s storage calls (%s) in %.3fs, %s bytes, %s errors',
+                        request.method, request.path, summary.calls,
+                        summary.operations, summary.time, summary.bytes, summary.errors)
+        storagemetrics.flush()
+        return response
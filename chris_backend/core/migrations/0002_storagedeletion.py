@@ -0,0 +1,30 @@
+# Generated by Django 2.2.12 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageDeletion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('modification_date', models.DateTimeField(auto_now=True)),
+                ('paths', models.TextField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled to the worker'), ('started', 'Deleting objects'), ('finishedSuccessfully', 'Finished successfully'), ('finishedWithError', 'Finished with error')], default='scheduled', max_length=30)),
+                ('objects_deleted', models.IntegerField(default=0)),
+                ('objects_failed', models.IntegerField(default=0)),
+                ('batches', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('-creation_date',),
+            },
+        ),
+    ]
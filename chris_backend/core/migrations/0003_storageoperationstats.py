@@ -0,0 +1,31 @@
+# Generated by Django 2.2.12 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_storagedeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageOperationStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caller', models.CharField(max_length=20)),
+                ('operation', models.CharField(max_length=50)),
+                ('calls', models.BigIntegerField(default=0)),
+                ('errors', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('total_time', models.FloatField(default=0)),
+                ('histogram', models.TextField(blank=True, default='')),
+                ('modification_date', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ('caller', 'operation'),
+                'unique_together': {('caller', 'operation')},
+            },
+        ),
+    ]
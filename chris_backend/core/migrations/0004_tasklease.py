@@ -0,0 +1,22 @@
+# Generated by Django 2.2.12 on 2026-10-18 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_storageoperationstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('holder', models.CharField(blank=True, max_length=32)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
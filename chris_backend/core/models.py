@@ -1,7 +1,10 @@
 
 import uuid
+from datetime import timedelta
 
-from django.db import models
+from django.db import models, transaction
+from django.db.utils import IntegrityError
+from django.utils import timezone
 
 
 class ChrisInstance(models.Model):
@@ -37,3 +40,126 @@ class ChrisInstance(models.Model):
             obj = cls()
             obj.save()
         return obj
+
+
+STORAGE_DELETION_STATUS_CHOICES = [("scheduled",            "Scheduled to the worker"),
+                                   ("started",              "Deleting objects"),
+                                   ("finishedSuccessfully", "Finished successfully"),
+                                   ("finishedWithError",    "Finished with error")]
+
+
+class StorageDeletion(models.Model):
+    """
+    Model class that records the progress of the background deletion of all the
+    objects in swift storage under a list of path prefixes.
+    """
+    creation_date = models.DateTimeField(auto_now_add=True)
+    modification_date = models.DateTimeField(auto_now=True)
+    paths = models.TextField()  # newline-separated list of path prefixes
+    status = models.CharField(max_length=30, choices=STORAGE_DELETION_STATUS_CHOICES,
+                              default='scheduled')
+    objects_deleted = models.IntegerField(default=0)
+    objects_failed = models.IntegerField(default=0)
+    batches = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ('-creation_date',)
+
+    def __str__(self):
+        return str(self.id)
+
+    def get_paths(self):
+        """
+        Custom method to get the list of path prefixes whose objects are deleted.
+        """
+        return [path for path in self.paths.split('\n') if path]
+
+
+class StorageOperationStats(models.Model):
+    """
+    Model class that aggregates the metrics of a storage operation made by a caller
+    ('api', 'celery' or 'other') across all the CUBE processes.
+    """
+    caller = models.CharField(max_length=20)
+    operation = models.CharField(max_length=50)
+    calls = models.BigIntegerField(default=0)
+    errors = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    total_time = models.FloatField(default=0)
+    histogram = models.TextField(blank=True, default='')  # JSON list of bucket counts
+    modification_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('caller', 'operation')
+        unique_together = ('caller', 'operation')
+
+    def __str__(self):
+        return '%s %s' % (self.caller, self.operation)
+
+
+class TaskLease(models.Model):
+    """
+    Model class that defines a named lease that is held by a single holder at a time
+    until it is released or expires. It is used to ensure that a task only runs once
+    across all the workers. A holder that crashes just lets its lease expire.
+    Unlike a MySQL named lock (GET_LOCK) the lease is not tied to a DB connection, so
+    it is not silently released when Django closes or recycles the worker's
+    connection and it can be renewed from a heartbeat thread with its own connection.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    holder = models.CharField(max_length=32, blank=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def acquire(cls, name, ttl):
+        """
+        Custom class method to atomically acquire the lease with the provided name for
+        <ttl> seconds. Returns a token identifying the new holder or None if the lease
+        is currently held by another holder.
+        """
+        holder = uuid.uuid4().hex
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=ttl)
+        # take over an expired (or released) lease with a single conditional UPDATE
+        if cls.objects.filter(name=name, expires_at__lte=now).update(
+                holder=holder, expires_at=expires_at):
+            return holder
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, holder=holder, expires_at=expires_at)
+        except IntegrityError:
+            return None  # the lease exists and has not expired yet
+        return holder
+
+    @classmethod
+    def renew(cls, name, holder, ttl):
+        """
+        Custom class method to extend the lease for another <ttl> seconds if it is
+        still held by the provided holder. Returns True if the lease was renewed.
+        """
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        return bool(cls.objects.filter(name=name, holder=holder).update(
+            expires_at=expires_at))
+
+    @classmethod
+    def release(cls, name, holder):
+        """
+        Custom class method to release the lease if it is still held by the provided
+        holder.
+        """
+        cls.objects.filter(name=name, holder=holder).update(holder='',
+                                                            expires_at=timezone.now())
+
+    @classmethod
+    def purge_expired(cls, age):
+        """
+        Custom class method to delete the leases that expired more than <age> seconds
+        ago. Returns the number of leases deleted.
+        """
+        expired_before = timezone.now() - timedelta(seconds=age)
+        (count, d) = cls.objects.filter(expires_at__lte=expired_before).delete()
+        return count
@@ -0,0 +1,11 @@
+
+from rest_framework import permissions
+
+
+class IsChris(permissions.BasePermission):
+    """
+    Custom permission to only allow access to the superuser 'chris'.
+    """
+
+    def has_permission(self, request, view):
+        return request.user.username == 'chris'
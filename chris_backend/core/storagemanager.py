@@ -0,0 +1,127 @@
+"""
+Storage manager interface module.
+"""
+
+from abc import ABC, abstractmethod
+
+
+class StorageManager(ABC):
+    """
+    Interface implemented by the storage backends (swift storage and a POSIX
+    filesystem) that CUBE uses to manage the contents of its storage. Objects are
+    addressed by their relative path (name) within the storage and the errors are
+    reported with swiftclient's ClientException (with the HTTP status that swift would
+    have returned) so that callers can handle every backend in the same way.
+    """
+
+    @abstractmethod
+    def create_container(self):
+        """
+        Create the storage container.
+        """
+
+    @abstractmethod
+    def ls(self, path, **kwargs):
+        """
+        Return a list of objects in storage with the provided path as a prefix. If the
+        'details' keyword argument is True then listing dictionaries are returned
+        instead of just the names.
+        """
+
+    @abstractmethod
+    def ls_pages(self, path, page_size=10000, **kwargs):
+        """
+        Generator that lazily yields the listing of objects in storage with the
+        provided path as a prefix, one page of at most <page_size> entries at a time.
+        Supported keyword arguments are 'marker', 'delimiter' and 'details'.
+        """
+
+    def ls_iter(self, path, page_size=10000, **kwargs):
+        """
+        Generator that lazily yields the names (or listing dictionaries) of the objects
+        in storage with the provided path as a prefix, one at a time. Accepts the same
+        keyword arguments as ls_pages.
+        """
+        for l_page in self.ls_pages(path, page_size, **kwargs):
+            for obj in l_page:
+                yield obj
+
+    @abstractmethod
+    def path_exists(self, path):
+        """
+        Return True/False if passed path exists in storage.
+        """
+
+    @abstractmethod
+    def obj_exists(self, obj_path):
+        """
+        Return True/False if passed object exists in storage.
+        """
+
+    @abstractmethod
+    def stat_obj(self, obj_path):
+        """
+        Return a listing dictionary (with 'name', 'bytes', 'hash', 'content_type' and
+        'last_modified' keys) for an object in storage.
+        """
+
+    @abstractmethod
+    def upload_obj(self, obj_path, contents, **kwargs):
+        """
+        Upload an object (a file contents) into storage.
+        """
+
+    @abstractmethod
+    def download_obj(self, obj_path, **kwargs):
+        """
+        Download an object from storage.
+        """
+
+    @abstractmethod
+    def stream_obj(self, obj_path, chunk_size=65536, **kwargs):
+        """
+        Return the response headers for an object in storage and an iterable over its
+        contents in chunks of <chunk_size> bytes.
+        """
+
+    @abstractmethod
+    def prefetch_objs(self, obj_paths, max_workers=4, chunk_size=65536,
+                      buffer_chunks=16):
+        """
+        Generator that yields (obj_path, chunks) tuples in the same order as the passed
+        iterable of object paths, where chunks is an iterator over the object contents.
+        """
+
+    @abstractmethod
+    def copy_obj(self, obj_path, dest_path, **kwargs):
+        """
+        Copy an object to a new destination in storage.
+        """
+
+    @abstractmethod
+    def copy_objs(self, copy_list, max_workers=8, retries=3, progress_callback=None,
+                  **kwargs):
+        """
+        Copy many objects to new destinations in storage. <copy_list> is a list of
+        (obj_path, dest_path, nbytes) tuples.
+        """
+
+    @abstractmethod
+    def delete_obj(self, obj_path):
+        """
+        Delete an object from storage.
+        """
+
+    @abstractmethod
+    def delete_objs(self, obj_paths, batch_size=1000, retries=3,
+                    progress_callback=None):
+        """
+        Delete many objects from storage in batches of at most <batch_size> objects.
+        """
+
+    @abstractmethod
+    def upload_files(self, local_dir, swift_prefix='', max_workers=4,
+                     chunk_size=65536, **kwargs):
+        """
+        Upload all the files within a local directory recursively to storage.
+        """
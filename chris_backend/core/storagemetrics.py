@@ -0,0 +1,245 @@
+"""
+Storage operations metrics module.
+
+Storage managers record the latency, bytes transferred and errors of every storage
+operation here. The metrics are broken down by caller ('api' for API requests,
+'celery' for celery tasks and 'other' for anything else such as management commands)
+and kept in memory by every process until they are periodically flushed to the DB,
+where they are aggregated across processes.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# upper bounds in seconds of the latency histogram buckets (the last bucket is +Inf)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()  # caller and request summary of the current thread
+_lock = threading.Lock()
+_stats = {}  # (caller, operation) -> stats dictionary not yet flushed to the DB
+_last_flush = time.monotonic()
+
+
+class StorageSummary(object):
+    """
+    Thread-safe summary of the storage operations made while serving a request.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.time = 0.0
+        self.operations = {}  # operation -> number of calls
+        self._lock = threading.Lock()
+
+    def add(self, operation, elapsed, nbytes, error):
+        """
+        Add a storage operation to the summary.
+        """
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.bytes += nbytes
+            self.time += elapsed
+            self.operations[operation] = self.operations.get(operation, 0) + 1
+
+    def get_server_timing(self):
+        """
+        Return the value of a Server-Timing HTTP header for the summary.
+        """
+        return 'storage;dur=%.1f;desc="%s calls, %s bytes"' % (self.time * 1000,
+                                                               self.calls, self.bytes)
+
+
+def set_context(caller, summary=None):
+    """
+    Set the caller of the storage operations made by the current thread and the
+    summary (if any) where they are also added.
+    """
+    _local.caller = caller
+    _local.summary = summary
+
+
+def clear_context():
+    """
+    Clear the context of the storage operations made by the current thread.
+    """
+    _local.caller = 'other'
+    _local.summary = None
+
+
+def bind_context(f):
+    """
+    Return a function that calls the passed function within the context of the
+    current thread. Used for functions that are run by worker threads.
+    """
+    caller = getattr(_local, 'caller', 'other')
+    summary = getattr(_local, 'summary', None)
+
+    @wraps(f)
+    def wrapped(*args, **kwargs):
+        set_context(caller, summary)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            clear_context()
+    return wrapped
+
+
+def record(operation, elapsed, nbytes=0, error=False):
+    """
+    Record a storage operation made by the current thread.
+    """
+    caller = getattr(_local, 'caller', 'other')
+    bucket = len(LATENCY_BUCKETS)
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if elapsed <= bound:
+            bucket = i
+            break
+    with _lock:
+        d_stats = _stats.get((caller, operation))
+        if d_stats is None:
+            d_stats = {'calls': 0, 'errors': 0, 'bytes': 0, 'total_time': 0.0,
+                       'histogram': [0] * (len(LATENCY_BUCKETS) + 1)}
+            _stats[(caller, operation)] = d_stats
+        d_stats['calls'] += 1
+        d_stats['errors'] += int(error)
+        d_stats['bytes'] += nbytes
+        d_stats['total_time'] += elapsed
+        d_stats['histogram'][bucket] += 1
+    summary = getattr(_local, 'summary', None)
+    if summary is not None:
+        summary.add(operation, elapsed, nbytes, error)
+
+
+class _Tracker(object):
+    """
+    Mutable record of a tracked storage operation.
+    """
+    def __init__(self):
+        self.nbytes = 0
+
+
+@contextmanager
+def track(operation):
+    """
+    Context manager that records the latency of the storage operation made within
+    it. The number of bytes transferred can be set on the yielded tracker object and
+    exceptions are recorded as errors.
+    """
+    tracker = _Tracker()
+    start = time.monotonic()
+    try:
+        yield tracker
+    except Exception:
+        record(operation, time.monotonic() - start, tracker.nbytes, error=True)
+        raise
+    record(operation, time.monotonic() - start, tracker.nbytes)
+
+
+def instrumented(operation, get_nbytes=None):
+    """
+    Decorator that records the latency and errors of the storage operation made by
+    the decorated method. If provided, <get_nbytes> is called with the method's
+    result and arguments to get the number of bytes transferred.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            with track(operation) as tracker:
+                result = f(*args, **kwargs)
+                if get_nbytes is not None:
+                    tracker.nbytes = get_nbytes(result, *args[1:], **kwargs)
+            return result
+        return wrapped
+    return decorator
+
+
+def _restore(l_stats):
+    """
+    Add back the provided stats that could not be flushed to the DB to the stats of
+    the current process so they are flushed the next time.
+    """
+    with _lock:
+        for ((caller, operation), d_stats) in l_stats:
+            d_current = _stats.get((caller, operation))
+            if d_current is None:
+                _stats[(caller, operation)] = d_stats
+                continue
+            for name in ('calls', 'errors', 'bytes', 'total_time'):
+                d_current[name] += d_stats[name]
+            d_current['histogram'] = [n + m for (n, m) in
+                                      zip(d_current['histogram'], d_stats['histogram'])]
+
+
+def get_stats():
+    """
+    Return a list with the storage operations stats of the current process that have
+    not been flushed to the DB yet.
+    """
+    with _lock:
+        return [dict(d_stats, caller=caller, operation=operation,
+                     histogram=list(d_stats['histogram']))
+                for ((caller, operation), d_stats) in sorted(_stats.items())]
+
+
+def flush(force=False):
+    """
+    Add the storage operations stats of the current process to the aggregated stats
+    in the DB and reset them. Unless <force> is True this is only done once every
+    STORAGE_METRICS_FLUSH_INTERVAL seconds. If the DB update fails the stats are kept
+    for the next flush.
+    """
+    global _last_flush
+    interval = getattr(settings, 'STORAGE_METRICS_FLUSH_INTERVAL', 60)
+    with _lock:
+        if not _stats or (not force and time.monotonic() - _last_flush < interval):
+            return
+        l_stats = list(_stats.items())
+        _stats.clear()
+        _last_flush = time.monotonic()
+    # the storage managers are created while the settings are being loaded so the
+    # models can only be imported once they are actually needed
+    from django.db import IntegrityError, transaction
+    from .models import StorageOperationStats
+
+    def get_locked_stats(caller, operation):
+        stats_qs = StorageOperationStats.objects.select_for_update()
+        try:
+            return stats_qs.get(caller=caller, operation=operation)
+        except StorageOperationStats.DoesNotExist:
+            pass
+        try:
+            with transaction.atomic():  # savepoint
+                return StorageOperationStats.objects.create(caller=caller,
+                                                            operation=operation)
+        except IntegrityError:
+            # another process created the row concurrently
+            return stats_qs.get(caller=caller, operation=operation)
+
+    try:
+        with transaction.atomic():
+            for ((caller, operation), d_stats) in l_stats:
+                op_stats = get_locked_stats(caller, operation)
+                op_stats.calls += d_stats['calls']
+                op_stats.errors += d_stats['errors']
+                op_stats.bytes += d_stats['bytes']
+                op_stats.total_time += d_stats['total_time']
+                histogram = json.loads(op_stats.histogram or '[]')
+                histogram.extend([0] * (len(d_stats['histogram']) - len(histogram)))
+                op_stats.histogram = json.dumps([n + m for (n, m) in
+                                                 zip(histogram, d_stats['histogram'])])
+                op_stats.save()
+    except Exception as e:
+        logger.error('Flushing of storage metrics failed, detail: %s', str(e))
+        _restore(l_stats)
@@ -2,142 +2,966 @@
 Swift storage manager module.
 """
 
+import hashlib
+import json
 import logging
 import os
+import queue
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, unquote
 
+from django.conf import settings
 from swiftclient import Connection
 from swiftclient.exceptions import ClientException
 
+from . import storagemetrics
+from .storagemanager import StorageManager
+
 
 logger = logging.getLogger(__name__)
 
 
-class SwiftManager(object):
+def _get_upload_nbytes(result, swift_path, contents, **kwargs):
+    """
+    Return the number of bytes of the contents passed to SwiftManager.upload_obj.
+    """
+    if isinstance(contents, (bytes, str)):
+        return len(contents)
+    return kwargs.get('content_length') or 0
 
-    def __init__(self, container_name, conn_params):
-        self.container_name = container_name
+
+def _get_pool_setting(name, default):
+    """
+    Return the value of a pool-related Django setting or the provided default. The
+    settings modules themselves create a SwiftManager while being loaded, so the
+    Django settings might not be configured yet when this is called.
+    """
+    if settings.configured:
+        return getattr(settings, name, default)
+    return default
+
+
+class SwiftConnectionPool(object):
+    """
+    Thread-safe, bounded pool of swift storage connection objects sharing the same
+    connection parameters. Connections keep their auth token between checkouts so
+    that the auth round-trip is only made again when the token is about to expire.
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, conn_params, max_size=10, timeout=30, health_check_interval=60,
+                 token_ttl=82800):
         # swift storage connection parameters dictionary
         self.conn_params = conn_params
-        # swift storage connection object
-        self._conn = None
+        # maximum number of connections that can be checked out at the same time
+        self.max_size = max_size
+        # seconds to wait for a free connection before raising an error
+        self.timeout = timeout
+        # seconds an idle connection can sit in the pool before being health-checked
+        self.health_check_interval = health_check_interval
+        # seconds an auth token is reused before a new one is requested
+        self.token_ttl = token_ttl
 
-    def get_connection(self):
+        self._idle = deque()  # (connection, last used time) tuples
+        self._size = 0  # number of connections currently owned by the pool
+        self._token_times = {}  # connection id -> (token, time token was acquired)
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {'created': 0, 'reused': 0, 'discarded': 0, 'waits': 0,
+                       'timeouts': 0, 'health_checks': 0, 'token_refreshes': 0}
+        self._configured = False  # whether the parameters have been set from settings
+
+    @classmethod
+    def reset_after_fork(cls):
+        """
+        Custom class method to forget the pools inherited from the parent process in
+        a forked child (eg. celery prefork or gunicorn workers), as the settings
+        modules already open a connection before forking and the child must not share
+        its socket with the parent. The lock is also recreated as it might have been
+        held by another thread of the parent at the time of the fork.
         """
-        Connect to swift storage and return the connection object.
+        cls._pools_lock = threading.Lock()
+        cls._pools = {}
+
+    @classmethod
+    def get_pool(cls, conn_params):
         """
-        if self._conn is not None:
-            return self._conn
+        Return the process-wide pool for the provided connection parameters, creating
+        it the first time it is requested.
+        """
+        key = tuple(sorted((k, str(v)) for k, v in conn_params.items()))
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls(conn_params)
+                cls._pools[key] = pool
+            if not pool._configured and settings.configured:
+                # pools created while the settings were being loaded got the defaults
+                pool.configure(
+                    max_size=_get_pool_setting('SWIFT_CONNECTION_POOL_SIZE', 10),
+                    timeout=_get_pool_setting('SWIFT_CONNECTION_POOL_TIMEOUT', 30),
+                    health_check_interval=_get_pool_setting(
+                        'SWIFT_CONNECTION_POOL_HEALTH_CHECK_INTERVAL', 60),
+                    token_ttl=_get_pool_setting('SWIFT_AUTH_TOKEN_TTL', 82800))
+        return pool
+
+    def configure(self, **kwargs):
+        """
+        Update the pool's parameters (max_size, timeout, health_check_interval and
+        token_ttl) from the provided keyword arguments.
+        """
+        with self._cond:
+            for name, value in kwargs.items():
+                setattr(self, name, value)
+            self._configured = True
+            self._cond.notify_all()
+
+    @classmethod
+    def get_all_stats(cls):
+        """
+        Return a list with the statistics of all the process-wide pools.
+        """
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+        return [pool.get_stats() for pool in pools]
+
+    def get_stats(self):
+        """
+        Return a dictionary with the pool's current usage statistics.
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+        stats['authurl'] = self.conn_params.get('authurl', '')
+        return stats
+
+    def acquire(self):
+        """
+        Check out a connection from the pool, creating a new one if none is idle and
+        the pool is not full. Blocks until a connection is available or the timeout
+        expires.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    self._stats['timeouts'] += 1
+                    raise ClientException('Timed out waiting for a free swift storage '
+                                          'connection from the pool')
+            if self._idle:
+                conn, last_used = self._idle.pop()
+                self._stats['reused'] += 1
+            else:
+                conn, last_used = None, None
+                self._size += 1
+        if conn is None:
+            return self._create_connection()
+        if time.monotonic() - last_used > self.health_check_interval:
+            if not self._is_healthy(conn):
+                # replace the broken connection while keeping its slot in the pool
+                self._close(conn)
+                with self._cond:
+                    self._stats['discarded'] += 1
+                return self._create_connection()
+        self._check_token_age(conn)
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Return a connection to the pool. Broken connections are closed and dropped.
+        """
+        if discard:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that checks out a connection and always gives it back. A
+        connection that raised a transport (non-HTTP) error is discarded.
+        """
+        conn = self.acquire()
         try:
-            self._conn = Connection(**self.conn_params)
+            yield conn
         except ClientException as e:
+            self.release(conn, discard=e.http_status is None)
+            raise
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def _create_connection(self):
+        """
+        Internal method to create a new connection object owned by the pool.
+        """
+        try:
+            conn = Connection(**self.conn_params)
+        except Exception as e:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
             logger.error(str(e))
             raise
-        return self._conn
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _close(self, conn):
+        """
+        Internal method to close a connection and forget its auth token.
+        """
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._token_times.pop(id(conn), None)
+
+    def _discard(self, conn):
+        """
+        Internal method to close a connection and remove it from the pool.
+        """
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn):
+        """
+        Internal method to check whether an idle connection can still talk to swift.
+        """
+        with self._cond:
+            self._stats['health_checks'] += 1
+        try:
+            conn.head_account()
+        except Exception as e:
+            logger.info('Discarding unhealthy swift storage connection, detail: %s',
+                        str(e))
+            return False
+        return True
+
+    def _check_token_age(self, conn):
+        """
+        Internal method to drop a connection's auth token when it is about to expire
+        so that a new one is requested on the next call.
+        """
+        now = time.monotonic()
+        with self._cond:
+            token_info = self._token_times.get(id(conn))
+            if conn.token is None:
+                return
+            if token_info is None or token_info[0] != conn.token:
+                # first time this token is seen
+                self._token_times[id(conn)] = (conn.token, now)
+                return
+            if now - token_info[1] < self.token_ttl:
+                return
+            self._stats['token_refreshes'] += 1
+            del self._token_times[id(conn)]
+        conn.url = conn.token = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SwiftConnectionPool.reset_after_fork)
+
+
+class PooledObjectStream(object):
+    """
+    Iterable over the contents of a swift storage object that holds a pooled
+    connection until the contents are exhausted or the stream is closed.
+    """
+
+    def __init__(self, pool, conn, body):
+        self.pool = pool
+        self.conn = conn
+        self.body = body
+        self._exhausted = False
+        self._released = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.body:
+                yield chunk
+            self._exhausted = True
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Give the connection back to the pool. A partially read response leaves the
+        underlying HTTP connection in an unknown state so it is discarded.
+        """
+        if self._released:
+            return
+        self._released = True
+        if not self._exhausted:
+            try:
+                self.body.close()
+            except Exception:
+                pass
+        self.pool.release(self.conn, discard=not self._exhausted)
+
+
+class SwiftLookupCache(object):
+    """
+    Thread-safe, in-process LRU cache with a time-to-live for positive results of
+    swift storage existence checks. Optionally the entries are also stored in a
+    Django cache so that they are shared between processes. Negative results are
+    never cached so that objects created by other clients are seen at once, which
+    also means that only deletions can make a cached entry stale. Entry keys are
+    (kind, container_name, path) tuples.
+    """
+
+    _cache = None
+    _cache_lock = threading.Lock()
+
+    def __init__(self, max_size=1024, ttl=30, backend_alias=None):
+        # maximum number of entries kept in memory
+        self.max_size = max_size
+        # seconds an entry is considered valid, 0 disables the cache
+        self.ttl = ttl
+        # alias of the Django cache also used to store the entries (if any)
+        self.backend_alias = backend_alias
+
+        self._entries = OrderedDict()  # key -> (expiration time, generation)
+        self._index = {}  # container_name -> path -> set of keys
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._configured = False  # whether the parameters have been set from settings
+
+    @classmethod
+    def get_cache(cls):
+        """
+        Return the process-wide lookup cache, creating it the first time it is
+        requested.
+        """
+        with cls._cache_lock:
+            # a cache created while the settings were being loaded got the defaults
+            if cls._cache is None or (not cls._cache._configured and
+                                      settings.configured):
+                cls._cache = cls(
+                    max_size=_get_pool_setting('SWIFT_LOOKUP_CACHE_SIZE', 1024),
+                    ttl=_get_pool_setting('SWIFT_LOOKUP_CACHE_TTL', 30),
+                    backend_alias=_get_pool_setting('SWIFT_LOOKUP_CACHE_BACKEND', None))
+                cls._cache._configured = settings.configured
+        return cls._cache
+
+    def get_stats(self):
+        """
+        Return a dictionary with the cache's current usage statistics.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['max_size'] = self.max_size
+        stats['ttl'] = self.ttl
+        return stats
+
+    def contains(self, key):
+        """
+        Return True if there is a non-expired positive entry for the provided key.
+        """
+        if not self.ttl:
+            return False
+        now = time.monotonic()
+        backend = self._get_backend()
+        # entries stored before another process invalidated the shared entries are
+        # stale even if they have not expired yet
+        generation = self._get_generation(backend)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                (expires, entry_generation) = entry
+                if expires > now and entry_generation == generation:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return True
+                self._remove(key)
+        if backend is not None and backend.get(self._get_backend_key(generation, key)):
+            self._store(key, now, generation)
+            with self._lock:
+                self._stats['hits'] += 1
+            return True
+        with self._lock:
+            self._stats['misses'] += 1
+        return False
+
+    def add(self, key):
+        """
+        Add a positive entry for the provided key.
+        """
+        if not self.ttl:
+            return
+        backend = self._get_backend()
+        generation = self._get_generation(backend)
+        self._store(key, time.monotonic(), generation)
+        if backend is not None:
+            backend.set(self._get_backend_key(generation, key), True, self.ttl)
+
+    def invalidate(self, container_name, *obj_paths):
+        """
+        Remove the entries that might no longer be true after the provided objects have
+        been deleted, that is the objects themselves and any path that is a prefix of
+        them.
+        """
+        with self._lock:
+            d_paths = self._index.get(container_name, {})
+            for obj_path in obj_paths:
+                # look up every prefix of the path instead of scanning all the entries
+                for i in range(len(obj_path) + 1):
+                    for k in list(d_paths.get(obj_path[:i], ())):
+                        self._remove(k)
+            self._stats['invalidations'] += 1
+        backend = self._get_backend()
+        if backend is not None:
+            # shared entries can not be looked up by prefix so all of them are
+            # invalidated at once by moving to a new generation of keys
+            try:
+                backend.incr('swift_lookup:generation')
+            except ValueError:
+                backend.add('swift_lookup:generation', 1, None)
+
+    def clear(self):
+        """
+        Remove all the in-memory entries and reset the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _store(self, key, now, generation):
+        """
+        Internal method to store an in-memory entry evicting the least recently used
+        one when the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = (now + self.ttl, generation)
+            self._entries.move_to_end(key)
+            (kind, container_name, path) = key
+            self._index.setdefault(container_name, {}).setdefault(path, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        """
+        Internal method to remove an in-memory entry and its index entry. The lock
+        must be held by the caller.
+        """
+        del self._entries[key]
+        (kind, container_name, path) = key
+        d_paths = self._index[container_name]
+        d_paths[path].discard(key)
+        if not d_paths[path]:
+            del d_paths[path]
+            if not d_paths:
+                del self._index[container_name]
+
+    def _get_backend(self):
+        """
+        Internal method to get the Django cache used to share the entries (if any).
+        """
+        if not self.backend_alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend_alias]
+
+    @staticmethod
+    def _get_generation(backend):
+        """
+        Internal method to get the current generation of the shared entries (None if
+        there is no Django cache).
+        """
+        if backend is None:
+            return None
+        return backend.get('swift_lookup:generation', 0)
+
+    @staticmethod
+    def _get_backend_key(generation, key):
+        """
+        Internal method to get a Django cache key for the provided entry key.
+        """
+        digest = hashlib.sha1('\n'.join(key).encode('utf-8')).hexdigest()
+        return 'swift_lookup:%s:%s' % (generation, digest)
+
+
+class SwiftManager(StorageManager):
+
+    def __init__(self, container_name, conn_params):
+        self.container_name = container_name
+        # swift storage connection parameters dictionary
+        self.conn_params = conn_params
+        # process-wide pool of swift storage connections for these parameters
+        self.pool = SwiftConnectionPool.get_pool(conn_params)
+        # process-wide cache of positive existence checks
+        self.lookup_cache = SwiftLookupCache.get_cache()
+
+    def get_connection(self):
+        """
+        Return a context manager that checks out a pooled connection to swift storage.
+        """
+        return self.pool.connection()
+
+    def get_pool_stats(self):
+        """
+        Return the usage statistics of the underlying connection pool.
+        """
+        return self.pool.get_stats()
+
+    def get_lookup_cache_stats(self):
+        """
+        Return the usage statistics of the existence checks cache.
+        """
+        return self.lookup_cache.get_stats()
 
     def create_container(self):
         """
         Create the storage container.
         """
-        conn = self.get_connection()
         try:
-            conn.put_container(self.container_name)
+            with self.get_connection() as conn:
+                conn.put_container(self.container_name)
         except ClientException as e:
             logger.error(str(e))
             raise
 
+    @storagemetrics.instrumented('ls')
     def ls(self, path, **kwargs):
         """
         Return a list of objects in the swift storage with the provided path
-        as a prefix.
+        as a prefix. If the 'details' keyword argument is True then the listing
+        dictionaries (name, bytes, hash, content_type, last_modified) are returned
+        instead of just the names.
         """
         b_full_listing = kwargs.get('full_listing', True)
-        l_ls = []  # listing of names to return
+        b_details = kwargs.get('details', False)
+        l_ls = []  # listing of names (or object dictionaries) to return
         if path:
-            conn = self.get_connection()
             try:
                 # get the full list of objects in Swift storage with given prefix
-                ld_obj = conn.get_container(self.container_name,
-                                            prefix=path,
-                                            full_listing=b_full_listing)[1]
+                with self.get_connection() as conn:
+                    ld_obj = conn.get_container(self.container_name,
+                                                prefix=path,
+                                                full_listing=b_full_listing)[1]
             except ClientException as e:
                 logger.error(str(e))
                 raise
             else:
-                l_ls = [d_obj['name'] for d_obj in ld_obj]
+                l_ls = ld_obj if b_details else [d_obj['name'] for d_obj in ld_obj]
         return l_ls
 
+    def ls_pages(self, path, page_size=10000, **kwargs):
+        """
+        Generator that lazily yields the listing of objects in the swift storage with
+        the provided path as a prefix, one page of at most <page_size> entries at a
+        time. Each page is only requested when the previous one has been consumed so
+        callers can stop early. Supported keyword arguments are 'marker' to start the
+        listing after a given name, 'delimiter' to only list one 'directory' level
+        (subdirectories are then listed as their name ending in the delimiter) and
+        'details' to yield listing dictionaries instead of names.
+        """
+        if not path:
+            return
+        marker = kwargs.get('marker', '')
+        delimiter = kwargs.get('delimiter')
+        b_details = kwargs.get('details', False)
+        while True:
+            try:
+                with storagemetrics.track('ls'), self.get_connection() as conn:
+                    ld_obj = conn.get_container(self.container_name,
+                                                prefix=path,
+                                                marker=marker,
+                                                limit=page_size,
+                                                delimiter=delimiter)[1]
+            except ClientException as e:
+                logger.error(str(e))
+                raise
+            if not ld_obj:
+                return
+            if b_details:
+                yield ld_obj
+            else:
+                yield [d_obj.get('name', d_obj.get('subdir')) for d_obj in ld_obj]
+            if len(ld_obj) < page_size:
+                return
+            marker = ld_obj[-1].get('name', ld_obj[-1].get('subdir'))
+
     def path_exists(self, path):
         """
-        Return True/False if passed path exists in swift storage.
+        Return True/False if passed path exists in swift storage. Positive results are
+        cached for a short time.
         """
-        return len(self.ls(path, full_listing=False)) > 0
+        key = ('path', self.container_name, path)
+        if self.lookup_cache.contains(key):
+            return True
+        exists = next(self.ls_pages(path, page_size=1), None) is not None
+        if exists:
+            self.lookup_cache.add(key)
+        return exists
 
+    @storagemetrics.instrumented('obj_exists')
     def obj_exists(self, obj_path):
         """
-        Return True/False if passed object exists in swift storage.
+        Return True/False if passed object exists in swift storage. Positive results
+        are cached for a short time.
         """
-        conn = self.get_connection()
+        key = ('obj', self.container_name, obj_path)
+        if self.lookup_cache.contains(key):
+            return True
         try:
-            conn.head_object(self.container_name, obj_path)
+            with self.get_connection() as conn:
+                conn.head_object(self.container_name, obj_path)
         except ClientException as e:
             if e.http_status == 404:
                 return False
             else:
                 logger.error(str(e))
                 raise
+        self.lookup_cache.add(key)
         return True
 
+    @storagemetrics.instrumented('stat_obj')
+    def stat_obj(self, obj_path):
+        """
+        Return a listing dictionary (with 'name', 'bytes', 'hash', 'content_type' and
+        'last_modified' keys) for an object in swift storage.
+        """
+        try:
+            with self.get_connection() as conn:
+                resp_headers = conn.head_object(self.container_name, obj_path)
+        except ClientException as e:
+            if e.http_status != 404:
+                logger.error(str(e))
+            raise
+        last_modified = resp_headers.get('last-modified')
+        if last_modified:
+            last_modified = parsedate_to_datetime(last_modified).replace(
+                tzinfo=None).isoformat()
+        return {'name': obj_path,
+                'bytes': int(resp_headers.get('content-length', 0)),
+                'hash': resp_headers.get('etag', '').strip('"'),
+                'content_type': resp_headers.get('content-type', ''),
+                'last_modified': last_modified}
+
+    @storagemetrics.instrumented('upload_obj', _get_upload_nbytes)
     def upload_obj(self, swift_path, contents, **kwargs):
         """
         Upload an object (a file contents) into swift storage.
         """
-        conn = self.get_connection()
         try:
-            conn.put_object(self.container_name,
-                            swift_path,
-                            contents=contents,
-                            **kwargs)
+            with self.get_connection() as conn:
+                conn.put_object(self.container_name,
+                                swift_path,
+                                contents=contents,
+                                **kwargs)
         except ClientException as e:
             logger.error(str(e))
             raise
 
+    @storagemetrics.instrumented('download_obj', lambda result, *a, **kw: len(result))
     def download_obj(self, obj_path, **kwargs):
         """
         Download an object from swift storage.
         """
-        conn = self.get_connection()
         try:
-            resp_headers, obj_contents = conn.get_object(self.container_name,
-                                                         obj_path, **kwargs)
+            with self.get_connection() as conn:
+                resp_headers, obj_contents = conn.get_object(self.container_name,
+                                                             obj_path, **kwargs)
         except ClientException as e:
             logger.error(str(e))
             raise
         return obj_contents
 
+    @storagemetrics.instrumented('stream_obj', lambda result, *a, **kw: int(
+        result[0].get('content-length', 0)))
+    def stream_obj(self, obj_path, chunk_size=65536, **kwargs):
+        """
+        Return the response headers for an object in swift storage and an iterable
+        over its contents in chunks of <chunk_size> bytes.
+        """
+        conn = self.pool.acquire()
+        try:
+            resp_headers, body = conn.get_object(self.container_name, obj_path,
+                                                 resp_chunk_size=chunk_size, **kwargs)
+        except ClientException as e:
+            self.pool.release(conn, discard=e.http_status is None)
+            if e.http_status not in (404, 416):
+                logger.error(str(e))
+            raise
+        except Exception:
+            self.pool.release(conn, discard=True)
+            raise
+        return resp_headers, PooledObjectStream(self.pool, conn, body)
+
+    def prefetch_objs(self, obj_paths, max_workers=4, chunk_size=65536,
+                      buffer_chunks=16):
+        """
+        Generator that yields (obj_path, chunks) tuples in the same order as the passed
+        iterable of object paths, where chunks is an iterator over the object contents.
+        Up to <max_workers> objects are downloaded concurrently ahead of the consumer
+        into buffers of at most <buffer_chunks> chunks, so memory use is bounded no
+        matter how big the objects are. Iterating chunks raises ClientException if the
+        object could not be downloaded. Chunks left unread when the next tuple is
+        requested are dropped.
+        """
+        max_workers = max(1, min(max_workers, self.pool.max_size))
+        end = object()
+        cancelled = threading.Event()
+
+        def fetch(obj_path, buffer, abandoned):
+            def put(item):
+                while not (cancelled.is_set() or abandoned.is_set()):
+                    try:
+                        buffer.put(item, timeout=0.5)
+                        return True
+                    except queue.Full:
+                        pass
+                return False
+
+            try:
+                resp_headers, stream = self.stream_obj(obj_path, chunk_size=chunk_size)
+            except ClientException as e:
+                put(e)
+                return
+            except Exception as e:
+                # any other error must also reach the consumer or it would block
+                logger.error(str(e))
+                put(ClientException(str(e)))
+                return
+            try:
+                for chunk in stream:
+                    if not put(chunk):
+                        return
+            except Exception as e:
+                logger.error(str(e))
+                put(ClientException(str(e)))
+                return
+            finally:
+                stream.close()
+            put(end)
+
+        def read(buffer):
+            while True:
+                item = buffer.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+
+        pending = deque()
+        paths = iter(obj_paths)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                while True:
+                    while len(pending) < max_workers:
+                        obj_path = next(paths, None)
+                        if obj_path is None:
+                            break
+                        buffer = queue.Queue(maxsize=buffer_chunks)
+                        abandoned = threading.Event()
+                        executor.submit(storagemetrics.bind_context(fetch), obj_path,
+                                        buffer, abandoned)
+                        pending.append((obj_path, buffer, abandoned))
+                    if not pending:
+                        return
+                    (obj_path, buffer, abandoned) = pending.popleft()
+                    yield obj_path, read(buffer)
+                    abandoned.set()
+            finally:
+                cancelled.set()
+
+    @storagemetrics.instrumented('copy_obj')
     def copy_obj(self, obj_path, dest_path, **kwargs):
         """
         Copy an object to a new destination in swift storage.
         """
-        conn = self.get_connection()
         dest = os.path.join('/' + self.container_name, dest_path.lstrip('/'))
         try:
-            conn.copy_object(self.container_name, obj_path, dest, **kwargs)
+            with self.get_connection() as conn:
+                conn.copy_object(self.container_name, obj_path, dest, **kwargs)
         except ClientException as e:
             logger.error(str(e))
             raise
 
+    def copy_objs(self, copy_list, max_workers=8, retries=3, progress_callback=None,
+                  **kwargs):
+        """
+        Copy many objects concurrently to new destinations in swift storage.
+
+        <copy_list> is a list of (obj_path, dest_path, nbytes) tuples. The copies are
+        done with a pool of <max_workers> threads and copies that fail with a
+        transient error (connection errors or 5xx/408/429 responses) are retried up
+        to <retries> more times with exponential backoff. If provided, the
+        <progress_callback> is called from the calling thread after every completed
+        copy with the number of objects and bytes copied so far. Return a dictionary
+        with the totals and the list of objects that could not be copied.
+        """
+        def copy(obj_path, dest_path):
+            attempt = 0
+            while True:
+                try:
+                    return self.copy_obj(obj_path, dest_path, **kwargs)
+                except ClientException as e:
+                    transient = e.http_status is None or e.http_status >= 500 or \
+                                e.http_status in (408, 429)
+                    if not transient or attempt >= retries:
+                        raise
+                attempt += 1
+                time.sleep(min(2 ** attempt * 0.1, 5))
+
+        nobjects = 0
+        nbytes = 0
+        l_failed = []
+        n_workers = max(1, min(max_workers, self.pool.max_size))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = {executor.submit(storagemetrics.bind_context(copy),
+                                       obj_path, dest_path): (obj_path, size)
+                       for (obj_path, dest_path, size) in copy_list}
+            for future in as_completed(futures):
+                obj_path, size = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error('Copy of %s failed, detail: %s', obj_path, str(e))
+                    l_failed.append(obj_path)
+                else:
+                    nobjects += 1
+                    nbytes += size
+                if progress_callback is not None:
+                    progress_callback(nobjects, nbytes)
+        return {'objects': nobjects, 'bytes': nbytes, 'failed': l_failed}
+
+    @storagemetrics.instrumented('delete_obj')
     def delete_obj(self, obj_path):
         """
         Delete an object from swift storage.
         """
-        conn = self.get_connection()
         try:
-            conn.delete_object(self.container_name, obj_path)
+            with self.get_connection() as conn:
+                conn.delete_object(self.container_name, obj_path)
         except ClientException as e:
             logger.error(str(e))
             raise
+        finally:
+            self.lookup_cache.invalidate(self.container_name, obj_path)
+
+    def delete_objs(self, obj_paths, batch_size=1000, retries=3,
+                    progress_callback=None):
+        """
+        Delete many objects from swift storage with bulk-delete requests of at most
+        <batch_size> objects each.
+
+        <obj_paths> can be any iterable (for instance a lazy listing) and it is
+        consumed one batch at a time. Objects whose deletion fails with a transient
+        error (connection errors or 5xx/408/429 responses) are retried up to <retries>
+        more times with exponential backoff. Objects that do not exist are considered
+        deleted. When the cluster does not have the bulk middleware enabled the objects
+        are deleted one request at a time. If provided, the <progress_callback> is
+        called after every batch with the number of objects deleted and the number of
+        batches so far. Return a dictionary with those totals and the list of objects
+        that could not be deleted.
+        """
+        def batches():
+            batch = []
+            for obj_path in obj_paths:
+                batch.append(obj_path)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
 
-    def upload_files(self, local_dir, swift_prefix='', **kwargs):
+        ndeleted = 0
+        nbatches = 0
+        l_failed = []
+        for batch in batches():
+            pending = batch
+            attempt = 0
+            while pending:
+                d_status = self._bulk_delete(pending)
+                self.lookup_cache.invalidate(self.container_name, *pending)
+                l_retry = []
+                for obj_path in pending:
+                    status = d_status.get(obj_path)
+                    if status is None or status == 404:
+                        ndeleted += 1
+                    elif (status == 0 or status >= 500 or status in (408, 429)) and \
+                            attempt < retries:
+                        l_retry.append(obj_path)
+                    else:
+                        logger.error('Deletion of %s failed with status %s', obj_path,
+                                     status)
+                        l_failed.append(obj_path)
+                pending = l_retry
+                if pending:
+                    attempt += 1
+                    time.sleep(min(2 ** attempt * 0.1, 5))
+            nbatches += 1
+            if progress_callback is not None:
+                progress_callback(ndeleted, nbatches)
+        return {'objects': ndeleted, 'batches': nbatches, 'failed': l_failed}
+
+    def _bulk_delete(self, obj_paths):
+        """
+        Internal method to delete a list of objects with a single bulk-delete request.
+        Return a dictionary mapping the objects that could not be deleted to the HTTP
+        status of their failure (0 for connection errors).
+        """
+        headers = {'Accept': 'application/json', 'Content-Type': 'text/plain'}
+        data = b''.join(quote('/%s/%s' % (self.container_name, obj_path)).encode('utf-8')
+                        + b'\n' for obj_path in obj_paths)
+        try:
+            with storagemetrics.track('bulk_delete'), self.get_connection() as conn:
+                resp_headers, body = conn.post_account(headers,
+                                                       query_string='bulk-delete',
+                                                       data=data)
+        except ClientException as e:
+            logger.error('Swift storage error, detail: %s' % str(e))
+            return {obj_path: e.http_status or 0 for obj_path in obj_paths}
+        if not body:
+            # bulk middleware not enabled, fall back to one request per object
+            d_status = {}
+            for obj_path in obj_paths:
+                try:
+                    self.delete_obj(obj_path)
+                except ClientException as e:
+                    if e.http_status != 404:
+                        d_status[obj_path] = e.http_status or 0
+            return d_status
+        d_resp = json.loads(body)
+        prefix = '/%s/' % self.container_name
+        d_status = {}
+        for (name, status) in d_resp.get('Errors', []):
+            name = unquote(name)
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+            d_status[name] = int(status.split()[0])
+        resp_status = int(d_resp.get('Response Status', '200').split()[0])
+        if resp_status >= 300 and not d_status:
+            # the whole request failed
+            d_status = {obj_path: resp_status for obj_path in obj_paths}
+        return d_status
+
+    def upload_files(self, local_dir, swift_prefix='', max_workers=4,
+                     chunk_size=65536, **kwargs):
         """
         Upload all the files within a local directory recursively to swift storage.
 
@@ -156,13 +980,65 @@ class SwiftManager(object):
             '/storage/file1',
             '/storage/dir1/file_d1',
             '/storage/dir2/file_d2'
+
+        Objects that already exist are skipped using a single listing of the
+        destination prefix. The remaining files are streamed from disk in binary
+        chunks of <chunk_size> bytes by a pool of <max_workers> threads. Upload errors
+        don't stop the bulk upload, they are instead reported in the returned
+        dictionary together with per-file results and throughput numbers.
         """
-        # upload all files down the <local_dir>
+        swift_root = swift_prefix if swift_prefix else local_dir
+        existing = set(self.ls(swift_root))
+
+        # build the upload plan down the <local_dir>
+        results = []
+        pending = []
         for root, dirs, files in os.walk(local_dir):
             swift_base = root.replace(local_dir, swift_prefix, 1) if swift_prefix else root
             for filename in files:
                 swift_path = os.path.join(swift_base, filename)
-                if not self.obj_exists(swift_path):
-                    local_file_path = os.path.join(root, filename)
-                    with open(local_file_path, 'r') as f:
-                        self.upload_obj(swift_path, f.read(), **kwargs)
+                local_file_path = os.path.join(root, filename)
+                d_result = {'local_path': local_file_path, 'swift_path': swift_path,
+                            'status': 'skipped', 'bytes': 0}
+                results.append(d_result)
+                if swift_path not in existing:
+                    pending.append(d_result)
+
+        def upload(d_result):
+            size = os.path.getsize(d_result['local_path'])
+            with open(d_result['local_path'], 'rb') as f:
+                self.upload_obj(d_result['swift_path'], f, content_length=size,
+                                chunk_size=chunk_size, **kwargs)
+            return size
+
+        start = time.monotonic()
+        n_workers = max(1, min(max_workers, self.pool.max_size))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = {executor.submit(storagemetrics.bind_context(upload),
+                                       d_result): d_result
+                       for d_result in pending}
+            for future in as_completed(futures):
+                d_result = futures[future]
+                try:
+                    d_result['bytes'] = future.result()
+                except Exception as e:
+                    logger.error('Upload of %s failed, detail: %s',
+                                 d_result['local_path'], str(e))
+                    d_result['status'] = 'failed'
+                    d_result['error'] = str(e)
+                else:
+                    d_result['status'] = 'uploaded'
+        elapsed = time.monotonic() - start
+
+        uploaded = [d for d in results if d['status'] == 'uploaded']
+        total_bytes = sum(d['bytes'] for d in uploaded)
+        return {
+            'results':          results,
+            'uploaded':         len(uploaded),
+            'skipped':          len(results) - len(pending),
+            'failed':           len([d for d in results if d['status'] == 'failed']),
+            'bytes':            total_bytes,
+            'elapsed':          elapsed,
+            'files_per_sec':    len(uploaded) / elapsed if elapsed else 0,
+            'bytes_per_sec':    total_bytes / elapsed if elapsed else 0
+        }
@@ -0,0 +1,91 @@
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from celery import shared_task
+
+from .models import StorageDeletion, TaskLease
+from .swiftmanager import ClientException
+from .utils import get_storage_manager
+
+
+logger = logging.getLogger(__name__)
+
+
+def schedule_storage_deletion(paths):
+    """
+    Create a record for the deletion of all the objects in swift storage under the
+    provided path prefixes and schedule the deletion task to run once the current DB
+    transaction is committed. Prefixes already covered by another one are dropped.
+    """
+    l_paths = []
+    for path in sorted(set(paths)):
+        if not any(path.startswith(p) for p in l_paths):
+            l_paths.append(path)
+    if not l_paths:
+        return None
+    deletion = StorageDeletion.objects.create(paths='\n'.join(l_paths))
+    transaction.on_commit(lambda: delete_storage_objects.delay(deletion.id))
+    return deletion
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def delete_storage_objects(self, deletion_id):  # task is passed info about itself
+    """
+    Delete all the objects in swift storage under the path prefixes of a storage
+    deletion record. The task is retried later if some objects could not be deleted.
+    """
+    deletion = StorageDeletion.objects.get(pk=deletion_id)
+    deletion.status = 'started'
+    deletion.attempts += 1
+    deletion.objects_failed = 0
+    deletion.save()
+
+    swift_manager = get_storage_manager()
+    d_done = {'objects': deletion.objects_deleted, 'batches': deletion.batches}
+
+    def report_progress(nobjects, nbatches):
+        deletion.objects_deleted = d_done['objects'] + nobjects
+        deletion.batches = d_done['batches'] + nbatches
+        deletion.save(update_fields=['objects_deleted', 'batches',
+                                     'modification_date'])
+
+    b_error = False
+    for path in deletion.get_paths():
+        try:
+            d_result = swift_manager.delete_objs(
+                swift_manager.ls_iter(path),
+                batch_size=getattr(settings, 'STORAGE_BULK_DELETE_BATCH_SIZE', 1000),
+                retries=getattr(settings, 'STORAGE_BULK_DELETE_RETRIES', 3),
+                progress_callback=report_progress)
+        except ClientException as e:
+            logger.error('Swift storage error, detail: %s' % str(e))
+            b_error = True
+            continue
+        d_done['objects'] += d_result['objects']
+        d_done['batches'] += d_result['batches']
+        deletion.objects_failed += len(d_result['failed'])
+    deletion.objects_deleted = d_done['objects']
+    deletion.batches = d_done['batches']
+
+    if (b_error or deletion.objects_failed) and self.request.retries < self.max_retries:
+        deletion.status = 'scheduled'
+        deletion.save()
+        raise self.retry()
+    if b_error or deletion.objects_failed:
+        deletion.status = 'finishedWithError'
+    else:
+        deletion.status = 'finishedSuccessfully'
+    deletion.save()
+
+
+@shared_task
+def purge_expired_task_leases():
+    """
+    Delete the task leases (and status check markers) that expired more than
+    TASK_LEASE_PURGE_AGE seconds ago so the leases table doesn't grow forever.
+    """
+    count = TaskLease.purge_expired(getattr(settings, 'TASK_LEASE_PURGE_AGE', 3600))
+    logger.info('Purged %s expired task leases', count)
@@ -0,0 +1,469 @@
+
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from django.test import TestCase, tag, override_settings
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, reverse
+from rest_framework.test import APIClient
+
+from core import api
+from core.filesystemmanager import FileSystemManager
+from core.models import ChrisInstance
+from feeds.models import Feed, Note, Tag, Tagging, Comment
+from plugins.models import PluginMeta, Plugin, PluginParameter, ComputeResource
+from plugins.models import (DefaultStrParameter, DefaultIntParameter,
+                            DefaultFloatParameter, DefaultBoolParameter)
+from plugininstances.models import PluginInstance, PluginInstanceFile
+from plugininstances.models import (StrParameter, IntParameter, FloatParameter,
+                                    BoolParameter, PathParameter, UnextpathParameter)
+from pipelines.models import Pipeline, PluginPiping, DefaultPipingStrParameter
+from pipelineinstances.models import PipelineInstance
+from uploadedfiles.models import UploadedFile
+from pacsfiles.models import PACS, PACSFile
+from servicefiles.models import Service, ServiceFile
+
+
+COMPUTE_RESOURCE_URL = settings.COMPUTE_RESOURCE_URL
+
+# the size of the benchmark data set can be scaled with this environment variable
+SCALE = float(os.environ.get('CUBE_BENCHMARK_SCALE', 1))
+
+# if this environment variable is set the baseline file is rewritten with the results
+UPDATE_BASELINE = bool(os.environ.get('CUBE_BENCHMARK_UPDATE_BASELINE'))
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+
+# page sizes requested to the list endpoints
+PAGE_SIZES = (10, 50, 100)
+
+# minimum number of rows seeded for every list so the largest page is always full
+NLIST_ROWS = max(PAGE_SIZES) + 10
+
+# endpoints that are only available to the chris superuser
+CHRIS_ROUTES = ('storagemetrics-detail',)
+
+# endpoints that do not accept GET requests and the data POSTed to them instead
+POST_ROUTES = {'v1/auth-token/': {'username': 'foo', 'password': 'foo-pass'}}
+
+# list endpoints that always return an empty collection (the user list only serves
+# the collection+json template to create a new user)
+EMPTY_LIST_ROUTES = ('user-create',)
+
+BATCH_SIZE = 500
+
+
+@tag('benchmark')
+@override_settings(STORAGE_BACKEND='filesystem')
+class APIBenchmarkTests(TestCase):
+    """
+    Benchmark the number of SQL queries, wall time and response size of every API
+    endpoint on a realistic data set.
+    """
+    nfeeds = max(int(2000 * SCALE), NLIST_ROWS)
+    # plugin instances in the feed with a deep tree
+    ntree_nodes = max(int(1000 * SCALE), NLIST_ROWS)
+    # files written by the plugin instances in the tree
+    nfiles = max(int(100000 * SCALE), NLIST_ROWS)
+    nuploaded_files = max(int(2000 * SCALE), NLIST_ROWS)
+    npacs_series = max(int(50 * SCALE), 2)
+    npacs_files_per_series = 100
+    nservice_files = max(int(1000 * SCALE), NLIST_ROWS)
+    ntags = NLIST_ROWS
+    ncomments = NLIST_ROWS
+
+    # results shared by all the tests as the requests are only made once
+    results = None
+
+    @classmethod
+    def setUpClass(cls):
+        # the files downloaded by the file resource endpoints are stored in a local dir
+        cls.storage_dir = tempfile.mkdtemp()
+        cls.storage_settings = override_settings(MEDIA_ROOT=cls.storage_dir)
+        cls.storage_settings.enable()
+        super(APIBenchmarkTests, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(APIBenchmarkTests, cls).tearDownClass()
+        cls.storage_settings.disable()
+        shutil.rmtree(cls.storage_dir)
+
+    @classmethod
+    def setUpTestData(cls):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+        start = time.monotonic()
+
+        # pk of the object of each model that is requested to the endpoints that take
+        # an object id (the one with the most related objects)
+        cls.d_objects = {}
+
+        cls.chris_user = User.objects.create_user(username='chris', password='chris12')
+        cls.user = User.objects.create_user(username='foo', password='foo-pass')
+        cls.d_objects[ChrisInstance] = ChrisInstance.load().id
+
+        # many compute resources, plugin metas and versions of the 'ds' plugin
+        compute_resource = ComputeResource.objects.create(
+            name="host", compute_url=COMPUTE_RESOURCE_URL)
+        ComputeResource.objects.bulk_create(
+            [ComputeResource(name="host%s" % i, compute_url=COMPUTE_RESOURCE_URL)
+             for i in range(NLIST_ROWS)])
+        PluginMeta.objects.bulk_create([PluginMeta(name='plugin%s' % i, type='ds')
+                                        for i in range(NLIST_ROWS)])
+        (pl_meta, tf) = PluginMeta.objects.get_or_create(name='pacspull', type='fs')
+        (plugin_fs, tf) = Plugin.objects.get_or_create(meta=pl_meta, version='0.1')
+        plugin_fs.compute_resources.set([compute_resource])
+        (pl_meta, tf) = PluginMeta.objects.get_or_create(name='mri_convert', type='ds')
+        (plugin_ds, tf) = Plugin.objects.get_or_create(meta=pl_meta, version='0.1')
+        plugin_ds.compute_resources.set(ComputeResource.objects.all())
+        plugin_versions = []
+        for i in range(NLIST_ROWS):
+            plugin = Plugin.objects.create(meta=pl_meta, version='1.%s' % i,
+                                           dock_image='fnndsc/mri_convert:1.%s' % i)
+            param = PluginParameter.objects.create(
+                plugin=plugin, name='string_param', type='string', flag='--string',
+                optional=True)
+            DefaultStrParameter.objects.create(plugin_param=param, value='dir')
+            plugin_versions.append(plugin)
+        cls.d_objects[PluginMeta] = pl_meta.id
+        cls.d_objects[Plugin] = plugin_ds.id
+
+        # plugin parameters of every type with a default value
+        d_params = {}
+        for (param_type, default_model, value) in (
+                ('string', DefaultStrParameter, 'dir'),
+                ('integer', DefaultIntParameter, 1),
+                ('float', DefaultFloatParameter, 1.5),
+                ('boolean', DefaultBoolParameter, True)):
+            param = PluginParameter.objects.create(
+                plugin=plugin_ds, name=param_type + '_param', type=param_type,
+                flag='--' + param_type, optional=True)
+            default_model.objects.create(plugin_param=param, value=value)
+            d_params[param_type] = param
+        for i in range(NLIST_ROWS):
+            param = PluginParameter.objects.create(
+                plugin=plugin_ds, name='param%s' % i, type='string',
+                flag='--param%s' % i, optional=True)
+            DefaultStrParameter.objects.create(plugin_param=param, value='dir')
+        cls.d_objects[PluginParameter] = d_params['string'].id
+
+        # many parameters of the 'fs' plugin including path parameters
+        fs_params = [PluginParameter.objects.create(
+            plugin=plugin_fs, name='param%s' % i, type='string', flag='--param%s' % i,
+            optional=True) for i in range(NLIST_ROWS)]
+        path_param = PluginParameter.objects.create(
+            plugin=plugin_fs, name='dir', type='path', flag='--dir', optional=False)
+        unextpath_param = PluginParameter.objects.create(
+            plugin=plugin_fs, name='unextdir', type='unextpath', flag='--unextdir',
+            optional=True)
+
+        # many pipelines and a pipeline with a long chain of pipings of every version
+        # of the 'ds' plugin that has many instances
+        Pipeline.objects.bulk_create([Pipeline(name='Pipeline%s' % i, owner=cls.user)
+                                      for i in range(2, NLIST_ROWS + 2)])
+        pipeline = Pipeline.objects.create(name='Pipeline1', owner=cls.user)
+        previous = None
+        for plugin in [plugin_ds] + plugin_versions:
+            # the pipings' default parameters are created when they are saved
+            previous = PluginPiping.objects.create(pipeline=pipeline, plugin=plugin,
+                                                   previous=previous)
+        pipeline_inst = PipelineInstance.objects.create(pipeline=pipeline,
+                                                        owner=cls.user)
+        PipelineInstance.objects.bulk_create(
+            [PipelineInstance(pipeline=pipeline, owner=cls.user, title='Instance%s' % i)
+             for i in range(NLIST_ROWS)])
+        cls.d_objects[Pipeline] = pipeline.id
+        cls.d_objects[PluginPiping] = previous.id
+        cls.d_objects[DefaultPipingStrParameter] = previous.string_param.all()[0].id
+        cls.d_objects[PipelineInstance] = pipeline_inst.id
+
+        # many feeds, each one with its root 'fs' plugin instance (the ids are
+        # explicitly set so the ancestry and output path can be computed beforehand)
+        feeds = Feed.objects.bulk_create(
+            [Feed(name='Feed%s' % i) for i in range(cls.nfeeds)], batch_size=BATCH_SIZE)
+        if not feeds[0].id:
+            feeds = list(Feed.objects.order_by('id'))
+        Note.objects.bulk_create([Note(feed=feed) for feed in feeds],
+                                 batch_size=BATCH_SIZE)
+        Feed.owner.through.objects.bulk_create(
+            [Feed.owner.through(feed_id=feed.id, user_id=cls.user.id) for feed in feeds],
+            batch_size=BATCH_SIZE)
+        inst_id = 0
+        roots = []
+        for feed in feeds:
+            inst_id += 1
+            roots.append(PluginInstance(
+                id=inst_id, plugin=plugin_fs, owner=cls.user, feed=feed,
+                compute_resource=compute_resource, cpu_limit=1000, memory_limit=200,
+                number_of_workers=1, gpu_limit=0, status='finishedSuccessfully',
+                ancestry='/%s/' % inst_id,
+                output_path='foo/feed_%s/pacspull_%s/data' % (feed.id, inst_id)))
+        PluginInstance.objects.bulk_create(roots, batch_size=BATCH_SIZE)
+        root = roots[0]
+        cls.d_objects[Feed] = root.feed.id
+        cls.d_objects[PluginInstance] = root.id
+        StrParameter.objects.bulk_create(
+            [StrParameter(plugin_inst=root, plugin_param=param, value='val')
+             for param in fs_params])
+        cls.d_objects[PathParameter] = PathParameter.objects.create(
+            plugin_inst=root, plugin_param=path_param, value='foo/uploads').id
+        cls.d_objects[UnextpathParameter] = UnextpathParameter.objects.create(
+            plugin_inst=root, plugin_param=unextpath_param, value='foo/uploads').id
+
+        # a binary tree of 'ds' plugin instances below the root instance of the first
+        # feed that are part of a pipeline instance
+        tree = [root]
+        for i in range(2, cls.ntree_nodes + 1):
+            inst_id += 1
+            previous = tree[i // 2 - 1]
+            tree.append(PluginInstance(
+                id=inst_id, previous=previous, plugin=plugin_ds, owner=cls.user,
+                feed=root.feed, compute_resource=compute_resource,
+                pipeline_inst=pipeline_inst, cpu_limit=1000, memory_limit=200,
+                number_of_workers=1, gpu_limit=0, status='finishedSuccessfully',
+                ancestry=previous.ancestry + '%s/' % inst_id,
+                output_path=previous.output_path + '/mri_convert_%s/data' % inst_id))
+        PluginInstance.objects.bulk_create(tree[1:], batch_size=BATCH_SIZE)
+        for (param_model, param_type, value) in ((StrParameter, 'string', 'dir'),
+                                                 (IntParameter, 'integer', 1),
+                                                 (FloatParameter, 'float', 1.5),
+                                                 (BoolParameter, 'boolean', True)):
+            param_model.objects.bulk_create(
+                [param_model(plugin_inst=inst, plugin_param=d_params[param_type],
+                             value=value) for inst in tree[1:]], batch_size=BATCH_SIZE)
+            cls.d_objects[param_model] = param_model.objects.order_by('id')[0].id
+
+        # files written by the plugin instances in the tree (the root instance always
+        # writes more files than the largest page)
+        files = [PluginInstanceFile(plugin_inst=root,
+                                    fname='%s/root%s.txt' % (root.output_path, i),
+                                    fsize=10, content_type='text/plain')
+                 for i in range(NLIST_ROWS)]
+        for i in range(cls.nfiles):
+            inst = tree[i % len(tree)]
+            files.append(PluginInstanceFile(
+                plugin_inst=inst, fname='%s/file%s.txt' % (inst.output_path, i),
+                fsize=10, content_type='text/plain'))
+        PluginInstanceFile.objects.bulk_create(files, batch_size=BATCH_SIZE)
+        plg_inst_file = PluginInstanceFile.objects.filter(plugin_inst=root)[0]
+        cls.d_objects[PluginInstanceFile] = plg_inst_file.id
+
+        # tags of the feeds and comments in the first feed
+        tags = Tag.objects.bulk_create([Tag(name='Tag%s' % i, color='blue',
+                                            owner=cls.user) for i in range(cls.ntags)])
+        tag = Tag.objects.order_by('id')[0]
+        Tagging.objects.bulk_create([Tagging(tag=tag, feed=feed) for feed in feeds],
+                                    batch_size=BATCH_SIZE)
+        Tagging.objects.bulk_create([Tagging(tag_id=t.id, feed=root.feed)
+                                     for t in Tag.objects.exclude(pk=tag.id)])
+        cls.d_objects[Tag] = tag.id
+        cls.d_objects[Tagging] = Tagging.objects.order_by('id')[0].id
+        Comment.objects.bulk_create([Comment(feed=root.feed, owner=cls.user,
+                                             title='Comment%s' % i)
+                                     for i in range(cls.ncomments)])
+        cls.d_objects[Comment] = Comment.objects.order_by('id')[0].id
+
+        # uploaded, PACS and service files
+        UploadedFile.objects.bulk_create(
+            [UploadedFile(owner=cls.user, fname='foo/uploads/file%s.txt' % i, fsize=10)
+             for i in range(cls.nuploaded_files)], batch_size=BATCH_SIZE)
+        pacs = PACS.objects.create(identifier='MyPACS')
+        pacs_files = []
+        for i in range(cls.npacs_series):
+            for j in range(cls.npacs_files_per_series):
+                pacs_files.append(PACSFile(
+                    pacs=pacs, PatientID='12345', PatientName='Patient%s' % i,
+                    StudyInstanceUID='1.1.%s' % i, SeriesInstanceUID='1.1.%s.1' % i,
+                    fname='SERVICES/PACS/MyPACS/12345/%s/file%s.dcm' % (i, j),
+                    fsize=10))
+        PACSFile.objects.bulk_create(pacs_files, batch_size=BATCH_SIZE)
+        service = Service.objects.create(identifier='MyService')
+        ServiceFile.objects.bulk_create(
+            [ServiceFile(service=service, fname='SERVICES/MyService/file%s.txt' % i,
+                         fsize=10) for i in range(cls.nservice_files)],
+            batch_size=BATCH_SIZE)
+        for model in (UploadedFile, PACSFile, ServiceFile):
+            cls.d_objects[model] = model.objects.order_by('id')[0].id
+        cls.d_objects[PACS] = pacs.id
+        cls.d_objects[Service] = service.id
+        cls.d_objects[User] = cls.user.id
+        cls.d_objects[ComputeResource] = compute_resource.id
+
+        # the contents of the requested files are stored in the local storage
+        fs_manager = FileSystemManager(cls.storage_dir)
+        for model in (PluginInstanceFile, UploadedFile, PACSFile, ServiceFile):
+            obj = model.objects.get(pk=cls.d_objects[model])
+            fs_manager.upload_obj(obj.fname.name, 'contents of ' + obj.fname.name)
+
+        sys.stderr.write('\nbenchmark data set created in %.1fs ' % (
+            time.monotonic() - start))
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def get_routes(self, patterns=None, namespace=None):
+        """
+        Custom method to get a list of (name, url) tuples with the url of every API
+        endpoint.
+        """
+        if patterns is None:
+            patterns = api.urlpatterns
+        routes = []
+        names = set()
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                routes.extend(self.get_routes(pattern.url_patterns,
+                                              pattern.namespace or namespace))
+                continue
+            # format suffix patterns are the same endpoints as the original ones
+            if 'format' in pattern.pattern.regex.groupindex or pattern.name in names:
+                continue
+            names.add(pattern.name)
+            kwargs = {}
+            if 'pk' in pattern.pattern.regex.groupindex:
+                kwargs['pk'] = self.get_object_id(pattern)
+            if pattern.name:
+                name = namespace + ':' + pattern.name if namespace else pattern.name
+                routes.append((name, reverse(name, kwargs=kwargs)))
+            else:
+                routes.append((str(pattern.pattern), '/api/' + str(pattern.pattern)))
+        return routes
+
+    def get_object_id(self, pattern):
+        """
+        Custom method to get the id of the seeded object requested to an endpoint.
+        """
+        view_class = getattr(pattern.callback, 'view_class', None)
+        queryset = getattr(view_class, 'queryset', None)
+        if queryset is not None:
+            model = queryset.model
+        else:
+            model = view_class.serializer_class.Meta.model
+        if model not in self.d_objects:
+            obj = model.objects.order_by('pk').first()
+            return obj.pk if obj else 1
+        return self.d_objects[model]
+
+    def request(self, client, url, data=None):
+        """
+        Custom method to make a GET request (a POST request if <data> is provided) and
+        return its status code, number of SQL queries, wall time in milliseconds,
+        response size and response data.
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.monotonic()
+            if data is None:
+                response = client.get(url)
+            else:
+                response = client.post(url, data)
+            if response.streaming:
+                nbytes = len(b''.join(response.streaming_content))
+            else:
+                nbytes = len(response.content)
+            elapsed = time.monotonic() - start
+        return {'status': response.status_code, 'queries': len(ctx.captured_queries),
+                'time': round(elapsed * 1000, 1), 'bytes': nbytes,
+                'data': getattr(response, 'data', None)}
+
+    def get_results(self):
+        """
+        Custom method to request every API endpoint (the list endpoints at every page
+        size) and return a dictionary with the results. The requests are only made
+        once for all the tests.
+        """
+        if APIBenchmarkTests.results is not None:
+            return APIBenchmarkTests.results
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        chris_client = APIClient()
+        chris_client.force_authenticate(user=self.chris_user)
+        d_results = {}
+        # the remote compute environment (pfcon) must never be contacted
+        with mock.patch('plugininstances.tasks.check_plugin_instance_exec_status'):
+            for (name, url) in self.get_routes():
+                route_client = chris_client if name in CHRIS_ROUTES else client
+                d_result = self.request(route_client, url, POST_ROUTES.get(name))
+                data = d_result.pop('data')
+                if isinstance(data, dict) and 'results' in data:
+                    d_results[name] = {}
+                    for page_size in PAGE_SIZES:
+                        d_result = self.request(route_client,
+                                                url + '?limit=%s' % page_size)
+                        data = d_result.pop('data')
+                        d_result['count'] = data['count']
+                        d_results[name][str(page_size)] = d_result
+                else:
+                    d_results[name] = {'1': d_result}
+        APIBenchmarkTests.results = d_results
+        self.report(d_results)
+        if UPDATE_BASELINE:
+            with open(BASELINE_FILE, 'w') as f:
+                json.dump(d_results, f, indent=2, sort_keys=True)
+                f.write('\n')
+        return d_results
+
+    def report(self, d_results):
+        """
+        Custom method to write a table with the results to stderr.
+        """
+        sys.stderr.write('\n%-45s %6s %6s %8s %9s %10s\n' % (
+            'endpoint', 'limit', 'status', 'queries', 'time(ms)', 'bytes'))
+        for name in sorted(d_results):
+            for (page_size, d_result) in sorted(d_results[name].items(),
+                                                key=lambda item: int(item[0])):
+                sys.stderr.write('%-45s %6s %6s %8s %9s %10s\n' % (
+                    name, page_size, d_result['status'], d_result['queries'],
+                    d_result['time'], d_result['bytes']))
+
+    def test_every_endpoint_is_requested(self):
+        d_results = self.get_results()
+        self.assertGreater(len(d_results), 60)
+        for (name, d_result) in d_results.items():
+            for d in d_result.values():
+                self.assertTrue(200 <= d['status'] < 300,
+                                '%s: status %s' % (name, d['status']))
+
+    def test_every_list_endpoint_has_more_rows_than_page_size(self):
+        d_results = self.get_results()
+        for (name, d_result) in d_results.items():
+            if str(PAGE_SIZES[0]) not in d_result or name in EMPTY_LIST_ROUTES:
+                continue  # not a list endpoint
+            count = d_result[str(PAGE_SIZES[0])]['count']
+            self.assertGreater(count, max(PAGE_SIZES),
+                               '%s: only %s rows' % (name, count))
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        d_results = self.get_results()
+        for (name, d_result) in d_results.items():
+            if str(PAGE_SIZES[0]) not in d_result:
+                continue  # not a list endpoint
+            nqueries = [d_result[str(page_size)]['queries'] for page_size in PAGE_SIZES]
+            self.assertEqual(len(set(nqueries)), 1,
+                             '%s: query count grows with page size %s' % (name,
+                                                                           nqueries))
+
+    def test_query_count_does_not_exceed_baseline(self):
+        d_results = self.get_results()
+        with open(BASELINE_FILE) as f:
+            d_baseline = json.load(f)
+        for (name, d_result) in d_results.items():
+            if name not in d_baseline:
+                continue
+            for (page_size, d) in d_result.items():
+                baseline = d_baseline[name].get(page_size)
+                if baseline is not None:
+                    self.assertLessEqual(d['queries'], baseline['queries'],
+                                         '%s (limit %s): %s queries, baseline %s' % (
+                                             name, page_size, d['queries'],
+                                             baseline['queries']))
@@ -0,0 +1,83 @@
+
+import logging
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from core.filesystemmanager import FileSystemManager, ClientException
+
+
+class FileSystemManagerTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+        self.root_dir = tempfile.mkdtemp()
+        self.fs_manager = FileSystemManager(self.root_dir)
+        for obj_path in ['foo/a-b', 'foo/a/file1', 'foo/a/file2', 'foo/b', 'bar/c']:
+            self.fs_manager.upload_obj(obj_path, 'contents of ' + obj_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_ls_pages_lists_objects_in_swift_order(self):
+        """
+        Test whether ls_pages method lists the objects with the provided prefix in
+        lexicographic order, in pages and starting after the marker.
+        """
+        pages = list(self.fs_manager.ls_pages('foo/', page_size=2))
+        self.assertEqual(pages, [['foo/a-b', 'foo/a/file1'], ['foo/a/file2', 'foo/b']])
+        names = list(self.fs_manager.ls_iter('foo/a', marker='foo/a/file1'))
+        self.assertEqual(names, ['foo/a/file2'])
+        names = list(self.fs_manager.ls_iter('foo/', delimiter='/'))
+        self.assertEqual(names, ['foo/a-b', 'foo/a/', 'foo/b'])
+        self.assertTrue(self.fs_manager.path_exists('foo/a'))
+        self.assertFalse(self.fs_manager.path_exists('foo/c'))
+
+    def test_stat_obj_returns_listing_dictionary(self):
+        """
+        Test whether stat_obj method returns the same listing dictionary as ls_pages.
+        """
+        d_obj = self.fs_manager.stat_obj('foo/b')
+        self.assertEqual(d_obj['bytes'], 17)
+        self.assertEqual([d_obj], list(self.fs_manager.ls_iter('foo/b', details=True)))
+        with self.assertRaises(ClientException) as cm:
+            self.fs_manager.stat_obj('foo/missing')
+        self.assertEqual(cm.exception.http_status, 404)
+
+    def test_copy_obj_creates_hard_link(self):
+        """
+        Test whether copy_obj method copies an object as a hard link of the source.
+        """
+        self.fs_manager.copy_obj('foo/b', 'baz/b')
+        self.assertEqual(self.fs_manager.download_obj('baz/b'), b'contents of foo/b')
+        self.assertEqual(os.stat(os.path.join(self.root_dir, 'foo/b')).st_ino,
+                         os.stat(os.path.join(self.root_dir, 'baz/b')).st_ino)
+
+    def test_stream_obj_honours_range_header(self):
+        """
+        Test whether stream_obj method only streams the requested range of bytes.
+        """
+        resp_headers, stream = self.fs_manager.stream_obj(
+            'foo/b', chunk_size=4, headers={'Range': 'bytes=2-9'})
+        self.assertEqual(b''.join(stream), b'ntents o')
+        self.assertEqual(resp_headers['content-range'], 'bytes 2-9/17')
+        self.assertEqual(resp_headers['content-length'], '8')
+        with self.assertRaises(ClientException) as cm:
+            self.fs_manager.stream_obj('foo/missing')
+        self.assertEqual(cm.exception.http_status, 404)
+
+    def test_delete_objs_deletes_objects_and_empty_dirs(self):
+        """
+        Test whether delete_objs method deletes the listed objects and removes the
+        dirs left empty.
+        """
+        d_result = self.fs_manager.delete_objs(self.fs_manager.ls_iter('foo/'),
+                                               batch_size=3)
+        self.assertEqual(d_result, {'objects': 4, 'batches': 2, 'failed': []})
+        self.assertFalse(os.path.exists(os.path.join(self.root_dir, 'foo')))
+        self.assertTrue(self.fs_manager.obj_exists('bar/c'))
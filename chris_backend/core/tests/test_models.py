@@ -0,0 +1,63 @@
+
+import logging
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import TaskLease
+
+
+class TaskLeaseModelTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_acquire_is_exclusive_until_released(self):
+        """
+        Test whether custom acquire class method only grants the lease to a single
+        holder until it is released.
+        """
+        holder = TaskLease.acquire('task1', 60)
+        self.assertIsNotNone(holder)
+        self.assertIsNone(TaskLease.acquire('task1', 60))
+        self.assertIsNotNone(TaskLease.acquire('task2', 60))
+        TaskLease.release('task1', 'not-the-holder')
+        self.assertIsNone(TaskLease.acquire('task1', 60))
+        TaskLease.release('task1', holder)
+        self.assertIsNotNone(TaskLease.acquire('task1', 60))
+
+    def test_acquire_takes_over_expired_lease(self):
+        """
+        Test whether custom acquire class method grants a lease whose holder did not
+        renew it in time (for instance because its worker crashed).
+        """
+        holder = TaskLease.acquire('task1', 60)
+        TaskLease.objects.filter(name='task1').update(
+            expires_at=timezone.now() - timedelta(seconds=1))
+        new_holder = TaskLease.acquire('task1', 60)
+        self.assertIsNotNone(new_holder)
+        self.assertNotEqual(new_holder, holder)
+        self.assertFalse(TaskLease.renew('task1', holder, 60))
+        self.assertTrue(TaskLease.renew('task1', new_holder, 60))
+
+    def test_purge_expired_deletes_old_expired_leases(self):
+        """
+        Test whether custom purge_expired class method only deletes the leases that
+        expired more than the provided number of seconds ago.
+        """
+        TaskLease.acquire('task1', 60)
+        TaskLease.acquire('task2', 60)
+        TaskLease.acquire('task3', 60)
+        TaskLease.objects.filter(name='task1').update(
+            expires_at=timezone.now() - timedelta(hours=2))
+        TaskLease.objects.filter(name='task2').update(
+            expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(TaskLease.purge_expired(3600), 1)
+        self.assertEqual(sorted(TaskLease.objects.values_list('name', flat=True)),
+                         ['task2', 'task3'])
@@ -0,0 +1,131 @@
+
+import json
+import logging
+from unittest import mock
+
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from core import storagemetrics
+from core.models import StorageOperationStats
+
+
+class StorageMetricsTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+        storagemetrics.flush(force=True)
+
+    def tearDown(self):
+        storagemetrics.clear_context()
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_track_records_operation_by_caller(self):
+        """
+        Test whether track context manager records the latency, bytes and errors of
+        an operation for the caller of the current thread and adds it to the summary.
+        """
+        summary = storagemetrics.StorageSummary()
+        storagemetrics.set_context('celery', summary)
+        with storagemetrics.track('download_obj') as tracker:
+            tracker.nbytes = 10
+        with self.assertRaises(ValueError):
+            with storagemetrics.track('download_obj'):
+                raise ValueError('storage error')
+        d_stats = [d for d in storagemetrics.get_stats()
+                   if d['operation'] == 'download_obj'][0]
+        self.assertEqual(d_stats['caller'], 'celery')
+        self.assertEqual(d_stats['calls'], 2)
+        self.assertEqual(d_stats['errors'], 1)
+        self.assertEqual(d_stats['bytes'], 10)
+        self.assertEqual(sum(d_stats['histogram']), 2)
+        self.assertEqual(summary.calls, 2)
+        self.assertEqual(summary.operations, {'download_obj': 2})
+
+    def test_flush_aggregates_stats_in_the_db(self):
+        """
+        Test whether flush function adds the stats of the process to the stats
+        aggregated in the DB and resets them.
+        """
+        storagemetrics.set_context('api')
+        for i in range(2):
+            storagemetrics.record('ls', 0.001)
+            storagemetrics.flush(force=True)
+        op_stats = StorageOperationStats.objects.get(caller='api', operation='ls')
+        self.assertEqual(op_stats.calls, 2)
+        self.assertEqual(json.loads(op_stats.histogram)[0], 2)
+        self.assertEqual(storagemetrics.get_stats(), [])
+
+    def test_flush_keeps_stats_when_the_db_update_fails(self):
+        """
+        Test whether flush function keeps the stats of the process for the next flush
+        when they can not be added to the DB.
+        """
+        storagemetrics.set_context('api')
+        storagemetrics.record('ls', 0.001)
+        with mock.patch.object(StorageOperationStats.objects, 'create',
+                               side_effect=Exception('DB down')):
+            storagemetrics.flush(force=True)
+        storagemetrics.record('ls', 0.001)
+        self.assertEqual(storagemetrics.get_stats()[0]['calls'], 2)
+        storagemetrics.flush(force=True)
+        op_stats = StorageOperationStats.objects.get(caller='api', operation='ls')
+        self.assertEqual(op_stats.calls, 2)
+        self.assertEqual(json.loads(op_stats.histogram)[0], 2)
+
+    def test_flush_retries_get_when_row_is_created_concurrently(self):
+        """
+        Test whether flush function adds the stats to the row created by another
+        process between the lookup and the creation of the row instead of losing them.
+        """
+        StorageOperationStats.objects.create(caller='api', operation='ls', calls=3)
+        storagemetrics.set_context('api')
+        storagemetrics.record('ls', 0.001)
+        real_get = QuerySet.get
+        lookups = []
+
+        def get(qs, *args, **kwargs):
+            lookups.append(kwargs)
+            if len(lookups) == 1:
+                # the row is not there yet when first looked up
+                raise StorageOperationStats.DoesNotExist
+            return real_get(qs, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', get):
+            storagemetrics.flush(force=True)
+        self.assertEqual(len(lookups), 2)
+        op_stats = StorageOperationStats.objects.get(caller='api', operation='ls')
+        self.assertEqual(op_stats.calls, 4)
+
+
+class StorageMetricsViewTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+        self.url = reverse('storagemetrics-detail')
+        User.objects.create_user(username='chris', password='chris1234')
+        User.objects.create_user(username='foo', password='foopass')
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_storage_metrics_detail_success(self):
+        storagemetrics.set_context('celery')
+        storagemetrics.record('copy_obj', 0.2)
+        storagemetrics.clear_context()
+        self.client.login(username='chris', password='chris1234')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'copy_obj')
+        self.assertContains(response, 'connection_pools')
+        self.assertEqual(response['Content-Type'], 'application/vnd.collection+json')
+
+    def test_storage_metrics_detail_failure_access_denied(self):
+        self.client.login(username='foo', password='foopass')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,508 @@
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock, skipUnless
+
+from django.test import TestCase
+
+from core.swiftmanager import (SwiftManager, SwiftConnectionPool, SwiftLookupCache,
+                               ClientException)
+
+
+class SwiftConnectionPoolTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+        self.conn_params = {'user': 'chris:chris1234', 'key': 'testing',
+                            'authurl': 'http://swift_service:8080/auth/v1.0'}
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_get_pool_returns_same_pool_for_same_connection_params(self):
+        """
+        Test whether get_pool class method returns a single process-wide pool for
+        equal connection parameters.
+        """
+        pool1 = SwiftConnectionPool.get_pool(self.conn_params)
+        pool2 = SwiftConnectionPool.get_pool(dict(self.conn_params))
+        self.assertIs(pool1, pool2)
+        other_params = dict(self.conn_params, key='other')
+        self.assertIsNot(pool1, SwiftConnectionPool.get_pool(other_params))
+
+    @skipUnless(hasattr(os, 'register_at_fork'), 'requires os.register_at_fork')
+    def test_get_pool_returns_new_pool_in_forked_child(self):
+        """
+        Test whether get_pool class method returns a new pool in a forked child
+        process instead of the pool (and connections) inherited from the parent.
+        """
+        pool = SwiftConnectionPool.get_pool(self.conn_params)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # child process
+            try:
+                b_new = SwiftConnectionPool.get_pool(self.conn_params) is not pool
+                os.write(write_fd, b'1' if b_new else b'0')
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read_fd, 1), b'1')
+        os.close(read_fd)
+        # the parent keeps its pool
+        self.assertIs(SwiftConnectionPool.get_pool(self.conn_params), pool)
+
+    def test_connection_reuses_idle_connection(self):
+        """
+        Test whether connection context manager reuses an already created connection.
+        """
+        pool = SwiftConnectionPool(self.conn_params, max_size=2)
+        with mock.patch('core.swiftmanager.Connection') as connection_mock:
+            with pool.connection() as conn1:
+                pass
+            with pool.connection() as conn2:
+                pass
+            connection_mock.assert_called_once_with(**self.conn_params)
+            self.assertIs(conn1, conn2)
+            stats = pool.get_stats()
+            self.assertEqual(stats['created'], 1)
+            self.assertEqual(stats['reused'], 1)
+            self.assertEqual(stats['idle'], 1)
+            self.assertEqual(stats['in_use'], 0)
+
+    def test_acquire_raises_when_pool_is_exhausted(self):
+        """
+        Test whether acquire method raises ClientException when all the connections
+        are checked out and the timeout expires.
+        """
+        pool = SwiftConnectionPool(self.conn_params, max_size=1, timeout=0)
+        with mock.patch('core.swiftmanager.Connection'):
+            pool.acquire()
+            with self.assertRaises(ClientException):
+                pool.acquire()
+            self.assertEqual(pool.get_stats()['timeouts'], 1)
+
+    def test_connection_discards_connection_after_transport_error(self):
+        """
+        Test whether connection context manager drops a connection that raised a
+        non-HTTP error.
+        """
+        pool = SwiftConnectionPool(self.conn_params, max_size=1)
+        with mock.patch('core.swiftmanager.Connection'):
+            with self.assertRaises(ClientException):
+                with pool.connection():
+                    raise ClientException('connection reset')
+            stats = pool.get_stats()
+            self.assertEqual(stats['size'], 0)
+            self.assertEqual(stats['discarded'], 1)
+
+    def test_connection_keeps_connection_after_http_error(self):
+        """
+        Test whether connection context manager keeps a connection that raised an
+        HTTP error.
+        """
+        pool = SwiftConnectionPool(self.conn_params, max_size=1)
+        with mock.patch('core.swiftmanager.Connection'):
+            with self.assertRaises(ClientException):
+                with pool.connection():
+                    raise ClientException('not found', http_status=404)
+            self.assertEqual(pool.get_stats()['idle'], 1)
+
+    def test_acquire_replaces_unhealthy_idle_connection(self):
+        """
+        Test whether acquire method replaces an idle connection that fails its
+        health check.
+        """
+        pool = SwiftConnectionPool(self.conn_params, max_size=1,
+                                   health_check_interval=-1)
+        with mock.patch('core.swiftmanager.Connection') as connection_mock:
+            broken_conn = mock.Mock()
+            broken_conn.head_account.side_effect = ClientException('down')
+            connection_mock.side_effect = [broken_conn, mock.Mock()]
+            with pool.connection():
+                pass
+            with pool.connection() as conn:
+                self.assertIsNot(conn, broken_conn)
+            stats = pool.get_stats()
+            self.assertEqual(stats['size'], 1)
+            self.assertEqual(stats['health_checks'], 1)
+
+    def test_acquire_drops_expired_auth_token(self):
+        """
+        Test whether acquire method resets a connection's auth token once it has been
+        in use for longer than the token ttl.
+        """
+        pool = SwiftConnectionPool(self.conn_params, max_size=1, token_ttl=-1)
+        with mock.patch('core.swiftmanager.Connection'):
+            with pool.connection() as conn:
+                conn.token = 'token1'
+            with pool.connection() as conn:  # token is first seen here
+                self.assertEqual(conn.token, 'token1')
+            with pool.connection() as conn:
+                self.assertIsNone(conn.token)
+            self.assertEqual(pool.get_stats()['token_refreshes'], 1)
+
+
+class SwiftLookupCacheTests(TestCase):
+
+    def test_contains_counts_hits_and_misses(self):
+        """
+        Test whether contains method only finds non-expired entries and keeps track of
+        the hits and misses.
+        """
+        cache = SwiftLookupCache(max_size=10, ttl=30)
+        key = ('path', 'users', 'foo/uploads')
+        self.assertFalse(cache.contains(key))
+        cache.add(key)
+        self.assertTrue(cache.contains(key))
+        stats = cache.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        with mock.patch('core.swiftmanager.time.monotonic',
+                        return_value=time.monotonic() + 31):
+            self.assertFalse(cache.contains(key))
+
+    def test_add_evicts_least_recently_used_entry(self):
+        """
+        Test whether add method evicts the least recently used entry when the cache
+        is full.
+        """
+        cache = SwiftLookupCache(max_size=2, ttl=30)
+        key1 = ('obj', 'users', 'foo/file1')
+        key2 = ('obj', 'users', 'foo/file2')
+        cache.add(key1)
+        cache.add(key2)
+        cache.contains(key1)
+        cache.add(('obj', 'users', 'foo/file3'))
+        self.assertTrue(cache.contains(key1))
+        self.assertFalse(cache.contains(key2))
+
+    def test_invalidate_removes_object_and_prefix_entries(self):
+        """
+        Test whether invalidate method removes the entries for the deleted object and
+        the paths that are a prefix of it.
+        """
+        cache = SwiftLookupCache(max_size=10, ttl=30)
+        cache.add(('obj', 'users', 'foo/uploads/file1'))
+        cache.add(('path', 'users', 'foo/uploads'))
+        cache.add(('path', 'users', 'foo/feed_1'))
+        cache.invalidate('users', 'foo/uploads/file1')
+        self.assertFalse(cache.contains(('obj', 'users', 'foo/uploads/file1')))
+        self.assertFalse(cache.contains(('path', 'users', 'foo/uploads')))
+        self.assertTrue(cache.contains(('path', 'users', 'foo/feed_1')))
+
+    def test_invalidate_only_removes_entries_of_the_container(self):
+        """
+        Test whether invalidate method keeps the entries of other containers and the
+        paths that are not a prefix of the deleted objects.
+        """
+        cache = SwiftLookupCache(max_size=10, ttl=30)
+        cache.add(('path', 'users', 'foo'))
+        cache.add(('path', 'other', 'foo'))
+        cache.add(('obj', 'users', 'foo/uploads/file2'))
+        cache.invalidate('users', 'foo/uploads/file1', 'bar/file1')
+        self.assertFalse(cache.contains(('path', 'users', 'foo')))
+        self.assertTrue(cache.contains(('path', 'other', 'foo')))
+        self.assertTrue(cache.contains(('obj', 'users', 'foo/uploads/file2')))
+        self.assertEqual(cache.get_stats()['size'], 2)
+
+    def test_contains_ignores_entries_invalidated_by_another_process(self):
+        """
+        Test whether contains method ignores the in-memory entries stored before
+        another cache sharing the same Django cache invalidated the shared entries.
+        """
+        from django.core.cache import cache as default_cache
+        default_cache.clear()
+        cache1 = SwiftLookupCache(max_size=10, ttl=30, backend_alias='default')
+        cache2 = SwiftLookupCache(max_size=10, ttl=30, backend_alias='default')
+        key = ('obj', 'users', 'foo/uploads/file1')
+        cache1.add(key)
+        self.assertTrue(cache2.contains(key))
+        cache1.invalidate('users', 'foo/uploads/file1')
+        self.assertFalse(cache2.contains(key))
+        self.assertEqual(cache2.get_stats()['size'], 0)
+
+
+class SwiftManagerTests(TestCase):
+
+    def setUp(self):
+        self.conn_params = {'user': 'chris:chris1234', 'key': 'testing',
+                            'authurl': 'http://swift_service:8080/auth/v1.0'}
+        # start every test with a fresh shared pool so that no mocked connection
+        # created by a previous test is reused
+        SwiftConnectionPool._pools.clear()
+        SwiftLookupCache.get_cache().clear()
+
+    def test_managers_share_connection_pool(self):
+        """
+        Test whether swift managers created with the same connection parameters
+        share the same connection pool.
+        """
+        swift_manager1 = SwiftManager('users', self.conn_params)
+        swift_manager2 = SwiftManager('users', self.conn_params)
+        self.assertIs(swift_manager1.pool, swift_manager2.pool)
+
+    def test_upload_files_skips_existing_objects_and_reports_results(self):
+        """
+        Test whether upload_files method lists the destination prefix once, uploads
+        only the missing files as binary streams and reports per-file results.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        local_dir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(local_dir, 'dir1'))
+            with open(os.path.join(local_dir, 'file1'), 'wb') as f:
+                f.write(b'\x00\x01\x02')
+            with open(os.path.join(local_dir, 'dir1', 'file_d1'), 'wb') as f:
+                f.write(b'data')
+            uploaded = {}
+
+            def upload_obj(swift_path, contents, **kwargs):
+                uploaded[swift_path] = contents.read()
+
+            with mock.patch.object(SwiftManager, 'ls',
+                                   return_value=['storage/file1']) as ls_mock:
+                with mock.patch.object(SwiftManager, 'upload_obj',
+                                       side_effect=upload_obj):
+                    report = swift_manager.upload_files(local_dir, 'storage')
+            ls_mock.assert_called_once_with('storage')
+            self.assertEqual(uploaded, {'storage/dir1/file_d1': b'data'})
+            self.assertEqual(report['uploaded'], 1)
+            self.assertEqual(report['skipped'], 1)
+            self.assertEqual(report['failed'], 0)
+            self.assertEqual(report['bytes'], 4)
+            statuses = {d['swift_path']: d['status'] for d in report['results']}
+            self.assertEqual(statuses, {'storage/file1': 'skipped',
+                                        'storage/dir1/file_d1': 'uploaded'})
+        finally:
+            shutil.rmtree(local_dir)
+
+    def test_upload_files_reports_failed_uploads(self):
+        """
+        Test whether upload_files method keeps going when an upload fails and reports
+        the failure.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        local_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(local_dir, 'file1'), 'wb') as f:
+                f.write(b'data')
+            with mock.patch.object(SwiftManager, 'ls', return_value=[]):
+                with mock.patch.object(SwiftManager, 'upload_obj',
+                                       side_effect=ClientException('error')):
+                    report = swift_manager.upload_files(local_dir, 'storage')
+            self.assertEqual(report['failed'], 1)
+            self.assertEqual(report['results'][0]['status'], 'failed')
+        finally:
+            shutil.rmtree(local_dir)
+
+    def test_stream_obj_holds_connection_until_stream_is_consumed(self):
+        """
+        Test whether stream_obj method keeps the pooled connection checked out until
+        the object contents have been fully read.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        pool = swift_manager.pool
+        with mock.patch('core.swiftmanager.Connection') as connection_mock:
+            conn = connection_mock.return_value
+            conn.get_object.return_value = ({'content-length': '4'},
+                                             iter([b'da', b'ta']))
+            in_use = pool.get_stats()['in_use']
+            resp_headers, stream = swift_manager.stream_obj('foo/file1', chunk_size=2)
+            self.assertEqual(pool.get_stats()['in_use'], in_use + 1)
+            self.assertEqual(b''.join(stream), b'data')
+            self.assertEqual(pool.get_stats()['in_use'], in_use)
+            conn.get_object.assert_called_with('users', 'foo/file1', resp_chunk_size=2)
+
+    def test_stream_obj_discards_connection_when_stream_is_closed_early(self):
+        """
+        Test whether closing a partially read stream discards its pooled connection.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        pool = swift_manager.pool
+        with mock.patch('core.swiftmanager.Connection') as connection_mock:
+            connection_mock.return_value.get_object.return_value = ({}, mock.MagicMock())
+            discarded = pool.get_stats()['discarded']
+            resp_headers, stream = swift_manager.stream_obj('foo/file1')
+            stream.close()
+            self.assertEqual(pool.get_stats()['discarded'], discarded + 1)
+
+    def test_copy_objs_retries_transient_failures(self):
+        """
+        Test whether copy_objs method retries copies that fail with a transient error
+        and reports the totals and the objects that could not be copied.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        copy_list = [('foo/file1', 'bar/file1', 10), ('foo/file2', 'bar/file2', 20)]
+
+        def copy_obj(obj_path, dest_path):
+            if obj_path == 'foo/file2':
+                raise ClientException('not found', http_status=404)
+            if copy_obj_mock.call_count == 1:
+                raise ClientException('unavailable', http_status=503)
+
+        progress = []
+        with mock.patch('core.swiftmanager.time.sleep'):
+            with mock.patch.object(SwiftManager, 'copy_obj',
+                                   side_effect=copy_obj) as copy_obj_mock:
+                d_copy = swift_manager.copy_objs(
+                    copy_list, max_workers=1,
+                    progress_callback=lambda n, b: progress.append((n, b)))
+        self.assertEqual(d_copy['objects'], 1)
+        self.assertEqual(d_copy['bytes'], 10)
+        self.assertEqual(d_copy['failed'], ['foo/file2'])
+        self.assertEqual(copy_obj_mock.call_count, 3)
+        self.assertEqual(len(progress), 2)
+
+    def test_ls_pages_lazily_requests_pages_using_markers(self):
+        """
+        Test whether ls_pages method requests each listing page only when the previous
+        one has been consumed, continuing from the last name of the previous page.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        with mock.patch('core.swiftmanager.Connection') as connection_mock:
+            conn = connection_mock.return_value
+            conn.get_container.side_effect = [
+                ({}, [{'name': 'foo/file1'}, {'name': 'foo/file2'}]),
+                ({}, [{'name': 'foo/file3'}])]
+            pages = swift_manager.ls_pages('foo', page_size=2)
+            self.assertEqual(next(pages), ['foo/file1', 'foo/file2'])
+            self.assertEqual(conn.get_container.call_count, 1)
+            self.assertEqual(list(pages), [['foo/file3']])
+            conn.get_container.assert_called_with('users', prefix='foo',
+                                                  marker='foo/file2', limit=2,
+                                                  delimiter=None)
+
+    def test_ls_iter_lists_subdirs_with_delimiter(self):
+        """
+        Test whether ls_iter method yields the names of the subdirs when a delimiter
+        is passed.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        with mock.patch('core.swiftmanager.Connection') as connection_mock:
+            conn = connection_mock.return_value
+            conn.get_container.return_value = ({}, [{'subdir': 'foo/dir1/'},
+                                                    {'name': 'foo/file1'}])
+            names = list(swift_manager.ls_iter('foo/', delimiter='/'))
+            self.assertEqual(names, ['foo/dir1/', 'foo/file1'])
+            conn.get_container.assert_called_with('users', prefix='foo/', marker='',
+                                                  limit=10000, delimiter='/')
+
+    def test_obj_exists_caches_positive_results_until_object_is_deleted(self):
+        """
+        Test whether obj_exists method only asks swift again for an existing object
+        after it has been deleted through the manager.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        with mock.patch('core.swiftmanager.Connection') as connection_mock:
+            conn = connection_mock.return_value
+            self.assertTrue(swift_manager.obj_exists('foo/file1'))
+            self.assertTrue(swift_manager.obj_exists('foo/file1'))
+            self.assertEqual(conn.head_object.call_count, 1)
+            swift_manager.delete_obj('foo/file1')
+            conn.head_object.side_effect = ClientException('not found', http_status=404)
+            self.assertFalse(swift_manager.obj_exists('foo/file1'))
+            self.assertFalse(swift_manager.obj_exists('foo/file1'))
+            self.assertEqual(conn.head_object.call_count, 3)
+
+    def test_stat_obj_returns_listing_dictionary(self):
+        """
+        Test whether stat_obj method maps the object's HEAD response headers to a
+        swift listing dictionary.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        with mock.patch('core.swiftmanager.Connection') as connection_mock:
+            conn = connection_mock.return_value
+            conn.head_object.return_value = {
+                'content-length': '9', 'etag': '"8f9bd0cbb4a1d8fd6b84d4d1ad1d0bd9"',
+                'content-type': 'text/plain',
+                'last-modified': 'Tue, 06 Oct 2020 13:09:01 GMT'}
+            d_obj = swift_manager.stat_obj('foo/file1')
+        self.assertEqual(d_obj, {'name': 'foo/file1', 'bytes': 9,
+                                 'hash': '8f9bd0cbb4a1d8fd6b84d4d1ad1d0bd9',
+                                 'content_type': 'text/plain',
+                                 'last_modified': '2020-10-06T13:09:01'})
+
+    def test_prefetch_objs_yields_contents_in_order(self):
+        """
+        Test whether prefetch_objs method yields the contents of the objects in the
+        order of the passed paths and raises ClientException for failed downloads.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        l_contents = {'foo/file1': [b'da', b'ta1'], 'foo/file3': [b'data3']}
+
+        def stream_obj(obj_path, chunk_size=65536):
+            if obj_path not in l_contents:
+                raise ClientException('not found', http_status=404)
+            return {}, (chunk for chunk in l_contents[obj_path])
+
+        with mock.patch.object(SwiftManager, 'stream_obj', side_effect=stream_obj):
+            objs = swift_manager.prefetch_objs(['foo/file1', 'foo/file2', 'foo/file3'],
+                                               max_workers=2, buffer_chunks=1)
+            (obj_path, chunks) = next(objs)
+            self.assertEqual((obj_path, b''.join(chunks)), ('foo/file1', b'data1'))
+            (obj_path, chunks) = next(objs)
+            self.assertEqual(obj_path, 'foo/file2')
+            with self.assertRaises(ClientException):
+                list(chunks)
+            (obj_path, chunks) = next(objs)
+            self.assertEqual((obj_path, b''.join(chunks)), ('foo/file3', b'data3'))
+            self.assertIsNone(next(objs, None))
+
+    def test_prefetch_objs_reports_unexpected_stream_errors(self):
+        """
+        Test whether prefetch_objs method reports any error raised when opening an
+        object stream as a ClientException instead of blocking the consumer.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+
+        def stream_obj(obj_path, chunk_size=65536):
+            if obj_path == 'foo/file1':
+                raise KeyError('content-length')
+            return {}, (chunk for chunk in [b'data2'])
+
+        with mock.patch.object(SwiftManager, 'stream_obj', side_effect=stream_obj):
+            objs = swift_manager.prefetch_objs(['foo/file1', 'foo/file2'],
+                                               max_workers=2)
+            (obj_path, chunks) = next(objs)
+            self.assertEqual(obj_path, 'foo/file1')
+            with self.assertRaises(ClientException):
+                list(chunks)
+            (obj_path, chunks) = next(objs)
+            self.assertEqual((obj_path, b''.join(chunks)), ('foo/file2', b'data2'))
+
+    def test_delete_objs_deletes_objects_in_batches_and_retries_failures(self):
+        """
+        Test whether delete_objs method deletes the objects with bulk-delete requests
+        of at most batch_size objects and retries the transient failures.
+        """
+        swift_manager = SwiftManager('users', self.conn_params)
+        responses = [
+            ({}, b'{"Response Status": "502 Bad Gateway", "Number Deleted": 1, '
+                 b'"Errors": [["/users/foo/file2", "503 Service Unavailable"]]}'),
+            ({}, b'{"Response Status": "200 OK", "Number Deleted": 1, "Errors": []}'),
+            ({}, b'{"Response Status": "400 Bad Request", "Number Deleted": 0, '
+                 b'"Errors": [["/users/foo/file%203", "403 Forbidden"]]}')]
+        progress = []
+        with mock.patch('core.swiftmanager.time.sleep'):
+            with mock.patch('core.swiftmanager.Connection') as connection_mock:
+                conn = connection_mock.return_value
+                conn.post_account.side_effect = responses
+                d_result = swift_manager.delete_objs(
+                    iter(['foo/file1', 'foo/file2', 'foo/file 3']), batch_size=2,
+                    progress_callback=lambda n, b: progress.append((n, b)))
+                conn.post_account.assert_any_call(
+                    {'Accept': 'application/json', 'Content-Type': 'text/plain'},
+                    query_string='bulk-delete',
+                    data=b'/users/foo/file1\n/users/foo/file2\n')
+                conn.post_account.assert_called_with(
+                    {'Accept': 'application/json', 'Content-Type': 'text/plain'},
+                    query_string='bulk-delete', data=b'/users/foo/file%203\n')
+        self.assertEqual(d_result, {'objects': 2, 'batches': 2,
+                                    'failed': ['foo/file 3']})
+        self.assertEqual(progress, [(2, 1), (2, 2)])
@@ -0,0 +1,63 @@
+
+import logging
+from unittest import mock
+
+from django.test import TestCase
+
+from core.models import StorageDeletion, TaskLease
+from core.swiftmanager import SwiftManager
+from core import tasks
+
+
+class TasksTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_schedule_storage_deletion_drops_covered_paths(self):
+        """
+        Test whether schedule_storage_deletion function creates a storage deletion
+        record only for the path prefixes that are not covered by another one.
+        """
+        deletion = tasks.schedule_storage_deletion(['foo/feed_1/pl_2/',
+                                                    'foo/feed_1/',
+                                                    'bar/feed_1/'])
+        self.assertEqual(deletion.get_paths(), ['bar/feed_1/', 'foo/feed_1/'])
+        self.assertEqual(deletion.status, 'scheduled')
+
+    def test_task_delete_storage_objects(self):
+        """
+        Test whether the delete_storage_objects task deletes the objects under each
+        path prefix and records the progress.
+        """
+        deletion = StorageDeletion.objects.create(paths='foo/feed_1/\nbar/feed_1/')
+        with mock.patch.object(SwiftManager, 'ls_iter',
+                               return_value=iter(['obj'])) as ls_iter_mock:
+            with mock.patch.object(SwiftManager, 'delete_objs',
+                                   return_value={'objects': 3, 'batches': 1,
+                                                 'failed': []}) as delete_objs_mock:
+                tasks.delete_storage_objects(deletion.id)
+                ls_iter_mock.assert_any_call('foo/feed_1/')
+                ls_iter_mock.assert_any_call('bar/feed_1/')
+                self.assertEqual(delete_objs_mock.call_count, 2)
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, 'finishedSuccessfully')
+        self.assertEqual(deletion.objects_deleted, 6)
+        self.assertEqual(deletion.batches, 2)
+        self.assertEqual(deletion.attempts, 1)
+
+    def test_task_purge_expired_task_leases(self):
+        """
+        Test whether the purge_expired_task_leases task calls TaskLease.purge_expired
+        with the configured age.
+        """
+        with mock.patch.object(TaskLease, 'purge_expired',
+                               return_value=2) as purge_expired_mock:
+            with self.settings(TASK_LEASE_PURGE_AGE=60):
+                tasks.purge_expired_task_leases()
+            purge_expired_mock.assert_called_with(60)
@@ -0,0 +1,133 @@
+
+import logging
+from unittest import mock
+
+from django.http import Http404
+from django.test import TestCase, RequestFactory
+
+from core.models import TaskLease
+from core.swiftmanager import SwiftManager, ClientException
+from core.utils import get_file_download_response, skip_if_running
+
+
+class GetFileDownloadResponseTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+        self.factory = RequestFactory()
+        self.fname = mock.Mock()
+        self.fname.name = 'foo/uploads/file1.txt'
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_get_file_download_response_streams_whole_file(self):
+        """
+        Test whether get_file_download_response function streams the whole file and
+        sets the headers from the object's metadata.
+        """
+        request = self.factory.get('/')
+        resp_headers = {'content-type': 'text/plain', 'content-length': '9',
+                        'etag': 'abc123'}
+        with mock.patch.object(SwiftManager, 'stream_obj',
+                               return_value=(resp_headers,
+                                             iter([b'test ', b'file']))) as stream_mock:
+            response = get_file_download_response(request, self.fname, chunk_size=5)
+            stream_mock.assert_called_with(self.fname.name, chunk_size=5, headers={})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'test file')
+        self.assertEqual(response['Content-Length'], '9')
+        self.assertEqual(response['ETag'], '"abc123"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_get_file_download_response_honours_range_header(self):
+        """
+        Test whether get_file_download_response function forwards a single range to
+        storage and returns a 206 partial content response.
+        """
+        request = self.factory.get('/', HTTP_RANGE='bytes=5-8')
+        resp_headers = {'content-type': 'text/plain', 'content-length': '4',
+                        'content-range': 'bytes 5-8/9'}
+        with mock.patch.object(SwiftManager, 'stream_obj',
+                               return_value=(resp_headers,
+                                             iter([b'file']))) as stream_mock:
+            response = get_file_download_response(request, self.fname, chunk_size=5)
+            stream_mock.assert_called_with(self.fname.name, chunk_size=5,
+                                           headers={'Range': 'bytes=5-8'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 5-8/9')
+        self.assertEqual(b''.join(response.streaming_content), b'file')
+
+    def test_get_file_download_response_ignores_multiple_ranges(self):
+        """
+        Test whether get_file_download_response function ignores a multi-range header.
+        """
+        request = self.factory.get('/', HTTP_RANGE='bytes=0-1,5-8')
+        with mock.patch.object(SwiftManager, 'stream_obj',
+                               return_value=({}, iter([]))) as stream_mock:
+            get_file_download_response(request, self.fname, chunk_size=5)
+            stream_mock.assert_called_with(self.fname.name, chunk_size=5, headers={})
+
+    def test_get_file_download_response_unsatisfiable_range(self):
+        """
+        Test whether get_file_download_response function returns a 416 response when
+        the requested range can not be satisfied.
+        """
+        request = self.factory.get('/', HTTP_RANGE='bytes=100-')
+        with mock.patch.object(SwiftManager, 'stream_obj',
+                               side_effect=ClientException('error', http_status=416)):
+            response = get_file_download_response(request, self.fname)
+        self.assertEqual(response.status_code, 416)
+
+    def test_get_file_download_response_raises_404_for_missing_object(self):
+        """
+        Test whether get_file_download_response function raises Http404 when the
+        object is not in storage.
+        """
+        request = self.factory.get('/')
+        with mock.patch.object(SwiftManager, 'stream_obj',
+                               side_effect=ClientException('error', http_status=404)):
+            with self.assertRaises(Http404):
+                get_file_download_response(request, self.fname)
+
+
+class SkipIfRunningTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+        self.task = mock.Mock()
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_skip_if_running_skips_task_while_lease_is_held(self):
+        """
+        Test whether skip_if_running decorator skips the task while another worker
+        holds its lease and runs it (releasing the lease) otherwise.
+        """
+        f = mock.Mock(return_value='done', __name__='f', __module__='tasks')
+        wrapped = skip_if_running(f)
+        holder = TaskLease.acquire('tasks.f', 60)
+        self.assertIsNone(wrapped(self.task))
+        f.assert_not_called()
+        TaskLease.release('tasks.f', holder)
+        self.assertEqual(wrapped(self.task), 'done')
+        f.assert_called_with(self.task)
+        # the lease was released when the task ended
+        self.assertIsNotNone(TaskLease.acquire('tasks.f', 60))
+
+    def test_skip_if_running_uses_a_lease_per_task_arguments(self):
+        """
+        Test whether skip_if_running decorator allows the same task to run
+        concurrently with different arguments.
+        """
+        def f(task, x):
+            # the same task with other arguments is not blocked by this one
+            return wrapped(task, x + 1) if x == 1 else x
+        f.__module__ = 'tasks'
+        wrapped = skip_if_running(f)
+        self.assertEqual(wrapped(self.task, 1), 2)
@@ -1,5 +1,75 @@
 
+import hashlib
+import json
+import logging
 import os
+import re
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .filesystemmanager import FileSystemManager
+from .models import TaskLease
+from .swiftmanager import SwiftManager, ClientException
+
+
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r'^\s*bytes=(\d*)-(\d*)\s*$')
+
+
+def get_storage_manager():
+    """
+    Utility function to get the storage manager for the storage backend selected by
+    the STORAGE_BACKEND setting ('swift' by default or 'filesystem').
+    """
+    if getattr(settings, 'STORAGE_BACKEND', 'swift') == 'filesystem':
+        return FileSystemManager(settings.MEDIA_ROOT,
+                                 getattr(settings, 'STORAGE_FILESYSTEM_HARDLINKS', True))
+    return SwiftManager(settings.SWIFT_CONTAINER_NAME, settings.SWIFT_CONNECTION_PARAMS)
+
+
+def get_file_metadata(d_obj):
+    """
+    Utility function to get the values of the file model metadata fields (fsize,
+    checksum, content_type and last_modified) from a storage listing dictionary.
+    """
+    last_modified = None
+    if d_obj.get('last_modified'):
+        last_modified = parse_datetime(d_obj['last_modified'])
+        if last_modified is not None and timezone.is_naive(last_modified):
+            # storage reports UTC times
+            last_modified = timezone.make_aware(last_modified, timezone.utc)
+    return {'fsize': d_obj.get('bytes'),
+            'checksum': d_obj.get('hash') or '',
+            'content_type': d_obj.get('content_type') or '',
+            'last_modified': last_modified}
+
+
+def update_file_metadata(file_obj, storage_manager=None, d_obj=None):
+    """
+    Utility function to set a registered file's metadata fields from the file's
+    object in storage and save the file to the DB. Storage is not queried if the
+    object's listing dictionary <d_obj> is provided. Storage errors are logged and the
+    metadata is then left unset.
+    """
+    if d_obj is None:
+        if storage_manager is None:
+            storage_manager = get_storage_manager()
+        try:
+            d_obj = storage_manager.stat_obj(file_obj.fname.name)
+        except ClientException as e:
+            logger.error('Swift storage error, detail: %s' % str(e))
+    if d_obj is not None:
+        for (field, value) in get_file_metadata(d_obj).items():
+            setattr(file_obj, field, value)
+    file_obj.save()
+    return file_obj
 
 
 def get_file_resource_link(file_serializer, obj):
@@ -16,3 +86,89 @@ def get_file_resource_link(file_serializer, obj):
     url = url_field.get_url(obj, view, request, format)
     # return url = current url + file name
     return url + os.path.basename(obj.fname.name)
+
+
+def get_file_download_response(request, fname, chunk_size=None):
+    """
+    Utility function to get a response that streams the contents of a file from
+    storage in fixed-size chunks. A single-range HTTP 'Range' request header is
+    honoured with a 206 response, any other form of the header is ignored.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'FILE_DOWNLOAD_CHUNK_SIZE', 65536)
+    swift_path = fname.name
+    headers = {}
+    range_match = RANGE_RE.match(request.META.get('HTTP_RANGE', ''))
+    if range_match and any(range_match.groups()):
+        headers['Range'] = 'bytes=%s-%s' % range_match.groups()
+    swift_manager = get_storage_manager()
+    try:
+        resp_headers, stream = swift_manager.stream_obj(swift_path,
+                                                        chunk_size=chunk_size,
+                                                        headers=headers)
+    except ClientException as e:
+        if e.http_status == 404:
+            raise Http404('File not found in storage.')
+        if e.http_status == 416:
+            response = HttpResponse(status=416)
+            response['Accept-Ranges'] = 'bytes'
+            return response
+        raise
+    content_type = resp_headers.get('content-type', 'application/octet-stream')
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    if 'content-range' in resp_headers:
+        response.status_code = 206
+        response['Content-Range'] = resp_headers['content-range']
+    if 'content-length' in resp_headers:
+        response['Content-Length'] = resp_headers['content-length']
+    if 'etag' in resp_headers:
+        response['ETag'] = '"%s"' % resp_headers['etag'].strip('"')
+    if 'last-modified' in resp_headers:
+        response['Last-Modified'] = resp_headers['last-modified']
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def skip_if_running(f):
+    """
+    Decorator for bound celery tasks that ensures that a task (with the same
+    arguments) is only running once across all workers. The task only runs if it
+    acquires a DB lease that is kept alive by a heartbeat thread while the task runs
+    and released when it ends. The lease of a worker that crashes mid-task expires
+    after TASK_LEASE_TTL seconds.
+    """
+    task_name = f'{f.__module__}.{f.__name__}'
+
+    @wraps(f)
+    def wrapped(self, *args, **kwargs):
+        lease_name = task_name
+        if args or kwargs:
+            s_args = json.dumps([args, kwargs], sort_keys=True, default=str)
+            lease_name += ':' + hashlib.md5(s_args.encode()).hexdigest()
+        ttl = getattr(settings, 'TASK_LEASE_TTL', 60)
+        holder = TaskLease.acquire(lease_name, ttl)
+        if holder is None:
+            logger.info('task %s (%s, %s) is running on another worker, skipping',
+                        task_name, args, kwargs)
+            return None
+        stop = threading.Event()
+
+        def heartbeat():
+            try:
+                while not stop.wait(ttl / 3.0):
+                    if not TaskLease.renew(lease_name, holder, ttl):
+                        logger.warning('lease of task %s was lost while running',
+                                       task_name)
+                        break
+            finally:
+                connection.close()  # the thread's own DB connection
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            return f(self, *args, **kwargs)
+        finally:
+            stop.set()
+            thread.join()
+            TaskLease.release(lease_name, holder)
+    return wrapped
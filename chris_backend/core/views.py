@@ -1,8 +1,15 @@
 
+import json
+
 from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import ChrisInstance
+from . import storagemetrics
+from .models import ChrisInstance, StorageOperationStats
+from .permissions import IsChris
 from .serializers import ChrisInstanceSerializer
+from .swiftmanager import SwiftConnectionPool, SwiftLookupCache
 
 
 class ChrisInstanceDetail(generics.RetrieveAPIView):
@@ -12,3 +19,34 @@ class ChrisInstanceDetail(generics.RetrieveAPIView):
     serializer_class = ChrisInstanceSerializer
     queryset = ChrisInstance.objects.all()
     permission_classes = (permissions.IsAuthenticated,)
+
+
+class StorageMetricsDetail(APIView):
+    """
+    A view for the storage operations metrics aggregated across all the processes
+    together with the connection pool and lookup cache stats of this process.
+    """
+    permission_classes = (permissions.IsAuthenticated, IsChris)
+
+    def get(self, request, *args, **kwargs):
+        """
+        Overriden to return the metrics of every storage operation by caller.
+        """
+        storagemetrics.flush(force=True)
+        operations = []
+        for op_stats in StorageOperationStats.objects.all():
+            operations.append({
+                'caller': op_stats.caller,
+                'operation': op_stats.operation,
+                'calls': op_stats.calls,
+                'errors': op_stats.errors,
+                'bytes': op_stats.bytes,
+                'total_time': op_stats.total_time,
+                'mean_time': op_stats.total_time / op_stats.calls if op_stats.calls
+                else 0,
+                'latency_buckets': list(storagemetrics.LATENCY_BUCKETS) + ['+Inf'],
+                'histogram': json.loads(op_stats.histogram or '[]'),
+            })
+        return Response({'operations': operations,
+                         'connection_pools': SwiftConnectionPool.get_all_stats(),
+                         'lookup_cache': SwiftLookupCache.get_cache().get_stats()})
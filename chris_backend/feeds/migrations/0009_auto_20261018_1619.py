@@ -0,0 +1,23 @@
+# Generated by Django 2.2.12 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0008_auto_20190114_1437'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='files_count',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='files_size',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
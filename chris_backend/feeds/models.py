@@ -1,15 +1,32 @@
 
 from django.db import models
+from django.db.models import F, Q, Count, OuterRef, Subquery
 
 import django_filters
 from django_filters.rest_framework import FilterSet
 
 
+# names of the feed queryset annotations with the number of plugin instances in each
+# execution status
+JOBS_STATUS_ANNOTATIONS = {
+    'created': 'created_jobs',
+    'waitingForPrevious': 'waiting_jobs',
+    'scheduled': 'scheduled_jobs',
+    'started': 'started_jobs',
+    'registeringFiles': 'registering_jobs',
+    'finishedSuccessfully': 'finished_jobs',
+    'finishedWithError': 'errored_jobs',
+    'cancelled': 'cancelled_jobs',
+}
+
+
 class Feed(models.Model):
     creation_date = models.DateTimeField(auto_now_add=True)
     modification_date = models.DateTimeField(auto_now_add=True)
     name = models.CharField(max_length=100, blank=True, default='')
     owner = models.ManyToManyField('auth.User', related_name='feed')
+    files_count = models.BigIntegerField(default=0)
+    files_size = models.BigIntegerField(default=0)
 
     class Meta:
         ordering = ('-creation_date',)
@@ -40,6 +57,16 @@ class Feed(models.Model):
         plg_inst = self.plugin_instances.filter(plugin__meta__type='fs')[0]
         return plg_inst.owner
 
+    @classmethod
+    def add_storage_usage(cls, feed_id, nfiles, nbytes):
+        """
+        Custom class method to atomically add the passed number of files and bytes
+        (negative to subtract) to a feed's storage usage counters.
+        """
+        if nfiles or nbytes:
+            cls.objects.filter(pk=feed_id).update(files_count=F('files_count') + nfiles,
+                                                  files_size=F('files_size') + nbytes)
+
     def get_plugin_instances_status_count(self, status):
         """
         Custom method to get the number of associated plugin instances with a given
@@ -47,6 +74,27 @@ class Feed(models.Model):
         """
         return self.plugin_instances.filter(status=status).count()
 
+    @staticmethod
+    def add_jobs_status_count(queryset):
+        """
+        Custom static method to annotate a feed queryset with the number of plugin
+        instances in each execution status (in a single grouped aggregate) and the
+        username of the feed's creator, so feeds can be serialized without any
+        additional per-feed query.
+        """
+        # plugininstances.models imports this module
+        from plugininstances.models import PluginInstance
+
+        d_counts = {name: Count('plugin_instances',
+                                filter=Q(plugin_instances__status=status))
+                    for (status, name) in JOBS_STATUS_ANNOTATIONS.items()}
+        creators = PluginInstance.objects.filter(
+            feed=OuterRef('pk'), plugin__meta__type='fs').order_by().values(
+            'owner__username')[:1]
+        return queryset.annotate(creator_username=Subquery(creators),
+                                 **d_counts).select_related(
+            'note').prefetch_related('owner')
+
 
 class FeedFilter(FilterSet):
     min_id = django_filters.NumberFilter(field_name="id", lookup_expr='gte')
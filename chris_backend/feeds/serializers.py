@@ -5,7 +5,7 @@ from django.db.utils import IntegrityError
 from rest_framework import serializers
 
 from plugininstances.models import STATUS_CHOICES
-from .models import Note, Feed, Tag, Tagging, Comment
+from .models import JOBS_STATUS_ANNOTATIONS, Note, Feed, Tag, Tagging, Comment
 
 
 class NoteSerializer(serializers.HyperlinkedModelSerializer):
@@ -28,8 +28,8 @@ class TagSerializer(serializers.HyperlinkedModelSerializer):
 
 class TaggingSerializer(serializers.HyperlinkedModelSerializer):
     owner_username = serializers.ReadOnlyField(source='tag.owner.username')
-    tag_id = serializers.ReadOnlyField(source='tag.id')
-    feed_id = serializers.ReadOnlyField(source='feed.id')
+    tag_id = serializers.ReadOnlyField()
+    feed_id = serializers.ReadOnlyField()
     feed = serializers.HyperlinkedRelatedField(view_name='feed-detail', read_only=True)
     tag = serializers.HyperlinkedRelatedField(view_name='tag-detail', read_only=True)
 
@@ -100,6 +100,8 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
     finished_jobs = serializers.SerializerMethodField()
     errored_jobs = serializers.SerializerMethodField()
     cancelled_jobs = serializers.SerializerMethodField()
+    files_count = serializers.ReadOnlyField()
+    files_size = serializers.ReadOnlyField()
     note = serializers.HyperlinkedRelatedField(view_name='note-detail', read_only=True)
     tags = serializers.HyperlinkedIdentityField(view_name='feed-tag-list')
     taggings = serializers.HyperlinkedIdentityField(view_name='feed-tagging-list')
@@ -115,8 +117,8 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url', 'id', 'creation_date', 'modification_date', 'name',
                   'creator_username', 'created_jobs', 'waiting_jobs', 'scheduled_jobs',
                   'started_jobs', 'registering_jobs', 'finished_jobs', 'errored_jobs',
-                  'cancelled_jobs', 'owner', 'note', 'tags', 'taggings', 'comments',
-                  'files', 'plugin_instances')
+                  'cancelled_jobs', 'files_count', 'files_size', 'owner', 'note', 'tags',
+                  'taggings', 'comments', 'files', 'plugin_instances')
 
     def validate_name(self, name):
         """
@@ -147,6 +149,8 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         """
         Overriden to get the username of the creator of the feed.
         """
+        if hasattr(obj, 'creator_username'):
+            return obj.creator_username
         return obj.get_creator().username
 
     def get_created_jobs(self, obj):
@@ -155,7 +159,7 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         """
         if 'created' not in [status[0] for status in STATUS_CHOICES]:
             raise KeyError("Undefined plugin instance execution status: 'created'.")
-        return obj.get_plugin_instances_status_count('created')
+        return self.get_jobs_status_count(obj, 'created')
 
     def get_waiting_jobs(self, obj):
         """
@@ -164,7 +168,7 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         if 'waitingForPrevious' not in [status[0] for status in STATUS_CHOICES]:
             msg = "Undefined plugin instance execution status: 'waitingForPrevious'."
             raise KeyError(msg)
-        return obj.get_plugin_instances_status_count('waitingForPrevious')
+        return self.get_jobs_status_count(obj, 'waitingForPrevious')
 
     def get_scheduled_jobs(self, obj):
         """
@@ -172,7 +176,7 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         """
         if 'scheduled' not in [status[0] for status in STATUS_CHOICES]:
             raise KeyError("Undefined plugin instance execution status: 'scheduled'.")
-        return obj.get_plugin_instances_status_count('scheduled')
+        return self.get_jobs_status_count(obj, 'scheduled')
 
     def get_started_jobs(self, obj):
         """
@@ -180,7 +184,7 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         """
         if 'started' not in [status[0] for status in STATUS_CHOICES]:
             raise KeyError("Undefined plugin instance execution status: 'started'.")
-        return obj.get_plugin_instances_status_count('started')
+        return self.get_jobs_status_count(obj, 'started')
 
     def get_registering_jobs(self, obj):
         """
@@ -189,7 +193,7 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         if 'registeringFiles' not in [status[0] for status in STATUS_CHOICES]:
             msg = "Undefined plugin instance execution status: 'registeringFiles'."
             raise KeyError(msg)
-        return obj.get_plugin_instances_status_count('registeringFiles')
+        return self.get_jobs_status_count(obj, 'registeringFiles')
 
     def get_finished_jobs(self, obj):
         """
@@ -198,7 +202,7 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         if 'finishedSuccessfully' not in [status[0] for status in STATUS_CHOICES]:
             raise KeyError("Undefined plugin instance execution status: "
                            "'finishedSuccessfully'.")
-        return obj.get_plugin_instances_status_count('finishedSuccessfully')
+        return self.get_jobs_status_count(obj, 'finishedSuccessfully')
 
     def get_errored_jobs(self, obj):
         """
@@ -207,7 +211,7 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         if 'finishedWithError' not in [status[0] for status in STATUS_CHOICES]:
             raise KeyError("Undefined plugin instance execution status: "
                            "'finishedWithError'.")
-        return obj.get_plugin_instances_status_count('finishedWithError')
+        return self.get_jobs_status_count(obj, 'finishedWithError')
 
     def get_cancelled_jobs(self, obj):
         """
@@ -215,7 +219,17 @@ class FeedSerializer(serializers.HyperlinkedModelSerializer):
         """
         if 'cancelled' not in [status[0] for status in STATUS_CHOICES]:
             raise KeyError("Undefined plugin instance execution status: 'cancelled'.")
-        return obj.get_plugin_instances_status_count('cancelled')
+        return self.get_jobs_status_count(obj, 'cancelled')
+
+    def get_jobs_status_count(self, obj, status):
+        """
+        Custom method to get the number of plugin instances in a given status from
+        the feed's queryset annotation if available or otherwise from the DB.
+        """
+        count = getattr(obj, JOBS_STATUS_ANNOTATIONS[status], None)
+        if count is None:
+            count = obj.get_plugin_instances_status_count(status)
+        return count
 
 
 class CommentSerializer(serializers.HyperlinkedModelSerializer):
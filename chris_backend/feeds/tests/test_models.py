@@ -96,3 +96,16 @@ class FeedModelTests(TestCase):
         self.assertEqual(count, 0)
         count = feed.get_plugin_instances_status_count('cancelled')
         self.assertEqual(count, 0)
+
+    def test_add_jobs_status_count(self):
+        """
+        Test whether custom add_jobs_status_count method properly annotates a feed
+        queryset with the number of plugin instances in each status and the username
+        of the feed's creator.
+        """
+        feed = Feed.add_jobs_status_count(Feed.objects.filter(name=self.feed_name))[0]
+        self.assertEqual(feed.creator_username, self.username)
+        self.assertEqual(feed.created_jobs, 1)
+        self.assertEqual(feed.waiting_jobs, 0)
+        self.assertEqual(feed.finished_jobs, 0)
+        self.assertEqual(feed.cancelled_jobs, 0)
@@ -2,7 +2,9 @@
 import logging
 import json
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.conf import settings
@@ -162,6 +164,33 @@ class FeedListViewTests(ViewTests):
         self.assertContains(response, "Feed1")
         self.assertContains(response, "Feed2")
 
+    def test_feed_list_number_of_queries_does_not_depend_on_number_of_feeds(self):
+        self.client.login(username=self.username, password=self.password)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 2)
+        n_queries = len(queries)
+        # add more feeds and more jobs in different status to an existing feed
+        user = User.objects.get(username=self.username)
+        plugin_fs = Plugin.objects.get(meta__name="pacspull")
+        plugin_ds = Plugin.objects.get(meta__name="mri_convert")
+        for i in range(3):
+            pl_inst = PluginInstance.objects.create(
+                plugin=plugin_fs, owner=user,
+                compute_resource=plugin_fs.compute_resources.all()[0])
+        for job_status in ('started', 'finishedSuccessfully', 'cancelled'):
+            PluginInstance.objects.create(
+                plugin=plugin_ds, owner=user, previous=pl_inst, status=job_status,
+                compute_resource=plugin_ds.compute_resources.all()[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url)
+        self.assertEqual(len(queries), n_queries)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(response.data['results'][0]['created_jobs'], 1)
+        self.assertEqual(response.data['results'][0]['started_jobs'], 1)
+        self.assertEqual(response.data['results'][0]['cancelled_jobs'], 1)
+        self.assertEqual(response.data['results'][0]['creator_username'], self.username)
+
     def test_feed_list_failure_unauthenticated(self):
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
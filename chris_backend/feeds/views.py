@@ -1,9 +1,11 @@
 
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, permissions
 from rest_framework.reverse import reverse
 
 from collectionjson import services
+from core.tasks import schedule_storage_deletion
 from plugininstances.models import PluginInstance, PluginInstanceFile
 from plugininstances.serializers import PluginInstanceSerializer
 from plugininstances.serializers import PluginInstanceFileSerializer
@@ -50,8 +52,8 @@ class TagList(generics.ListCreateAPIView):
         user = self.request.user
         # if the user is chris then return all the tags in the system
         if user.username == 'chris':
-            return Tag.objects.all()
-        return Tag.objects.filter(owner=user)
+            return Tag.objects.select_related('owner')
+        return Tag.objects.filter(owner=user).select_related('owner')
 
     def perform_create(self, serializer):
         """
@@ -80,7 +82,7 @@ class TagListQuerySearch(generics.ListAPIView):
     A view for the collection of tags resulting from a query search.
     """
     serializer_class = TagSerializer
-    queryset = Tag.objects.all()
+    queryset = Tag.objects.select_related('owner')
     permission_classes = (permissions.IsAuthenticated,)
     filterset_class = TagFilter
 
@@ -128,7 +130,7 @@ class FeedTagList(generics.ListAPIView):
         Custom method to get the actual tags queryset for the feed and user.
         """
         feed = self.get_object()
-        return feed.tags.filter(owner=user)
+        return feed.tags.filter(owner=user).select_related('owner')
 
 
 class TagFeedList(generics.ListAPIView):
@@ -156,7 +158,7 @@ class TagFeedList(generics.ListAPIView):
         Custom method to get the actual feeds queryset for the tag.
         """
         tag = self.get_object()
-        return tag.feeds.all()
+        return Feed.add_jobs_status_count(tag.feeds.all())
 
 
 class FeedTaggingList(generics.ListCreateAPIView):
@@ -199,7 +201,8 @@ class FeedTaggingList(generics.ListCreateAPIView):
         Custom method to get the actual taggings queryset for the feed.
         """
         feed = self.get_object()
-        return Tagging.objects.filter(feed=feed, tag__owner=user)
+        return Tagging.objects.filter(feed=feed, tag__owner=user).select_related(
+            'tag__owner')
 
 
 class TagTaggingList(generics.ListCreateAPIView):
@@ -242,7 +245,7 @@ class TagTaggingList(generics.ListCreateAPIView):
         Custom method to get the actual taggings queryset for the tag.
         """
         tag = self.get_object()
-        return Tagging.objects.filter(tag=tag)
+        return Tagging.objects.filter(tag=tag).select_related('tag__owner')
 
 
 class TaggingDetail(generics.RetrieveDestroyAPIView):
@@ -269,8 +272,8 @@ class FeedList(generics.ListAPIView):
         user = self.request.user
         # if the user is chris then return all the feeds in the system
         if user.username == 'chris':
-            return Feed.objects.all()
-        return Feed.objects.filter(owner=user)
+            return Feed.add_jobs_status_count(Feed.objects.all())
+        return Feed.add_jobs_status_count(Feed.objects.filter(owner=user))
 
     def list(self, request, *args, **kwargs):
         """
@@ -316,15 +319,15 @@ class FeedListQuerySearch(generics.ListAPIView):
         user = self.request.user
         # if the user is chris then return all the feeds in the system
         if user.username == 'chris':
-            return Feed.objects.all()
-        return Feed.objects.filter(owner=user)
+            return Feed.add_jobs_status_count(Feed.objects.all())
+        return Feed.add_jobs_status_count(Feed.objects.filter(owner=user))
 
 
 class FeedDetail(generics.RetrieveUpdateDestroyAPIView):
     """
     A feed view.
     """
-    queryset = Feed.objects.all()
+    queryset = Feed.add_jobs_status_count(Feed.objects.all())
     serializer_class = FeedSerializer
     permission_classes = (permissions.IsAuthenticated, IsOwnerOrChris,)
 
@@ -349,6 +352,23 @@ class FeedDetail(generics.RetrieveUpdateDestroyAPIView):
             owners.append(new_owner)
             serializer.save(owner=owners)
 
+    def perform_destroy(self, instance):
+        """
+        Overriden to update the owners' storage usage and schedule the deletion of the
+        feed's files from swift storage in the background.
+        """
+        # plugin instances owned by different users write their files under their own
+        # user dir
+        usernames = instance.plugin_instances.values_list('owner__username',
+                                                          flat=True).distinct()
+        paths = ['{0}/feed_{1}/'.format(username, instance.id) for username in usernames]
+        with transaction.atomic():
+            PluginInstanceFile.remove_storage_usage(
+                PluginInstanceFile.objects.filter(plugin_inst__feed=instance))
+            super(FeedDetail, self).perform_destroy(instance)
+        if paths:
+            schedule_storage_deletion(paths)
+
     def retrieve(self, request, *args, **kwargs):
         """
         Overriden to append a collection+json template.
@@ -399,7 +419,7 @@ class CommentList(generics.ListCreateAPIView):
         Custom method to get the actual comments' queryset.
         """
         feed = self.get_object()
-        return self.filter_queryset(feed.comments.all())
+        return self.filter_queryset(feed.comments.select_related('owner'))
 
 
 class CommentListQuerySearch(generics.ListAPIView):
@@ -416,7 +436,7 @@ class CommentListQuerySearch(generics.ListAPIView):
         comments.
         """
         feed = get_object_or_404(Feed, pk=self.kwargs['pk'])
-        return feed.comments.all()
+        return feed.comments.select_related('owner')
 
 
 class CommentDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -460,7 +480,8 @@ class FeedFileList(generics.ListAPIView):
         Custom method to get the actual feed files queryset.
         """
         feed = self.get_object()
-        return PluginInstanceFile.objects.filter(plugin_inst__feed=feed)
+        return PluginInstanceFile.add_related_objects(
+            PluginInstanceFile.objects.filter(plugin_inst__feed=feed))
 
 
 class FeedPluginInstanceList(generics.ListAPIView):
@@ -486,4 +507,5 @@ class FeedPluginInstanceList(generics.ListAPIView):
         Custom method to get the actual plugin instances queryset.
         """
         feed = self.get_object()
-        return self.filter_queryset(feed.plugin_instances.all())
+        return self.filter_queryset(
+            PluginInstance.add_related_objects(feed.plugin_instances.all()))
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.12 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacsfiles', '0003_pacsfile_modality'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pacsfile',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pacsfile',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='pacsfile',
+            name='fsize',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pacsfile',
+            name='last_modified',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
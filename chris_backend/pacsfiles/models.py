@@ -14,6 +14,10 @@ class PACS(models.Model):
 class PACSFile(models.Model):
     creation_date = models.DateTimeField(auto_now_add=True)
     fname = models.FileField(max_length=512, unique=True)
+    fsize = models.BigIntegerField(null=True, blank=True, db_index=True)
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    last_modified = models.DateTimeField(null=True, blank=True)
     PatientID = models.CharField(max_length=150, db_index=True)
     PatientName = models.CharField(max_length=150, blank=True)
     PatientBirthDate = models.DateField(blank=True, null=True)
@@ -41,6 +45,7 @@ class PACSFileFilter(FilterSet):
                                                   lookup_expr='lte')
     fname = django_filters.CharFilter(field_name='fname', lookup_expr='startswith')
     fname_exact = django_filters.CharFilter(field_name='fname', lookup_expr='exact')
+    checksum = django_filters.CharFilter(field_name='checksum', lookup_expr='exact')
     PatientName = django_filters.CharFilter(field_name='PatientName',
                                             lookup_expr='icontains')
     StudyDescription = django_filters.CharFilter(field_name='StudyDescription',
@@ -57,7 +62,7 @@ class PACSFileFilter(FilterSet):
     class Meta:
         model = PACSFile
         fields = ['id', 'min_creation_date', 'max_creation_date', 'fname', 'fname_exact',
-                  'PatientID', 'PatientName', 'PatientSex', 'PatientAge',
+                  'checksum', 'PatientID', 'PatientName', 'PatientSex', 'PatientAge',
                   'min_PatientAge', 'max_PatientAge', 'PatientBirthDate',
                   'StudyInstanceUID', 'StudyDescription', 'SeriesInstanceUID',
                   'SeriesDescription', 'pacs_identifier']
@@ -1,12 +1,11 @@
 
 import logging
 
-from django.conf import settings
 from rest_framework import serializers
 
 from collectionjson.fields import ItemLinkField
-from core.utils import get_file_resource_link
-from core.swiftmanager import SwiftManager
+from core.utils import get_file_resource_link, get_storage_manager
+from core.utils import update_file_metadata
 
 from .models import PACS, PACSFile
 
@@ -25,12 +24,17 @@ class PACSFileSerializer(serializers.HyperlinkedModelSerializer):
     file_resource = ItemLinkField('get_file_link')
     path = serializers.CharField(write_only=True)
     fname = serializers.FileField(use_url=False, required=False)
+    fsize = serializers.ReadOnlyField()
+    checksum = serializers.ReadOnlyField()
+    content_type = serializers.ReadOnlyField()
+    last_modified = serializers.ReadOnlyField()
     pacs_identifier = serializers.ReadOnlyField(source='pacs.identifier')
     pacs_name = serializers.CharField(write_only=True)
 
     class Meta:
         model = PACSFile
-        fields = ('url', 'id', 'creation_date', 'fname', 'path', 'PatientID',
+        fields = ('url', 'id', 'creation_date', 'fname', 'fsize', 'checksum',
+                  'content_type', 'last_modified', 'path', 'PatientID',
                   'PatientName', 'PatientBirthDate', 'PatientAge', 'PatientSex',
                   'Modality', 'StudyInstanceUID', 'StudyDescription', 'SeriesInstanceUID',
                   'SeriesDescription', 'pacs_identifier', 'pacs_name', 'file_resource')
@@ -43,14 +47,15 @@ class PACSFileSerializer(serializers.HyperlinkedModelSerializer):
 
     def create(self, validated_data):
         """
-        Overriden to associate a Swift storage path with the newly created pacs file.
+        Overriden to associate a Swift storage path and its metadata with the newly
+        created pacs file.
         """
         # remove path as it is not part of the model and then compute fname
         path = validated_data.pop('path')
         pacs_file = super(PACSFileSerializer, self).create(validated_data)
         pacs_file.fname.name = path
-        pacs_file.save()
-        return pacs_file
+        # the object's metadata was already fetched from storage by validate_path
+        return update_file_metadata(pacs_file, d_obj=self.d_storage_obj)
 
     def validate_pacs_name(self, pacs_name):
         """
@@ -75,15 +80,13 @@ class PACSFileSerializer(serializers.HyperlinkedModelSerializer):
         if not path.startswith('SERVICES/PACS/'):
             raise serializers.ValidationError(
                 ["File path must start with 'SERVICES/PACS/'."])
-        # verify that the file is indeed already in Swift
-        swift_manager = SwiftManager(settings.SWIFT_CONTAINER_NAME,
-                                     settings.SWIFT_CONNECTION_PARAMS)
+        # verify that the file is indeed already in Swift and keep its metadata
+        swift_manager = get_storage_manager()
         try:
-            swift_path_exists = swift_manager.obj_exists(path)
+            self.d_storage_obj = swift_manager.stat_obj(path)
         except Exception as e:
-            logger.error('Swift storage error, detail: %s' % str(e))
-            raise serializers.ValidationError(["Could not find this path."])
-        if not swift_path_exists:
+            if getattr(e, 'http_status', None) != 404:
+                logger.error('Swift storage error, detail: %s' % str(e))
             raise serializers.ValidationError(["Could not find this path."])
         return path
 
@@ -10,7 +10,7 @@ from rest_framework import serializers
 
 from pacsfiles.models import PACS, PACSFile
 from pacsfiles.serializers import PACSFileSerializer
-from pacsfiles.serializers import SwiftManager
+from core.swiftmanager import SwiftManager, ClientException
 
 
 class PACSFileSerializerTests(TestCase):
@@ -44,11 +44,12 @@ class PACSFileSerializerTests(TestCase):
         pacsfiles_serializer = PACSFileSerializer()
         path = 'SERVICES/PACS/MyPACS/123456-Jorge/brain/brain_mri/file1.dcm'
 
-        with mock.patch.object(SwiftManager, 'obj_exists',
-                               return_value=False) as obj_exists_mock:
+        not_found = ClientException('Object HEAD failed', http_status=404)
+        with mock.patch.object(SwiftManager, 'stat_obj',
+                               side_effect=not_found) as stat_obj_mock:
             with self.assertRaises(serializers.ValidationError):
                 pacsfiles_serializer.validate_path(path)
-            obj_exists_mock.assert_called_with(path.strip(' ').strip('/'))
+            stat_obj_mock.assert_called_with(path.strip(' ').strip('/'))
 
     @tag('integration')
     def test_integration_validate_path_failure_does_not_exist(self):
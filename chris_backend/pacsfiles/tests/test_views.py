@@ -174,9 +174,9 @@ class PACSFileResourceViewTests(PACSFileViewTests):
         fileresource_view_inst = mock.Mock()
         fileresource_view_inst.get_object = mock.Mock(return_value=pacs_file)
         request_mock = mock.Mock()
-        with mock.patch('pacsfiles.views.Response') as response_mock:
+        with mock.patch('pacsfiles.views.get_file_download_response') as response_mock:
             views.PACSFileResource.get(fileresource_view_inst, request_mock)
-            response_mock.assert_called_with(pacs_file.fname)
+            response_mock.assert_called_with(request_mock, pacs_file.fname)
 
     @tag('integration')
     def test_integration_pacsfileresource_download_success(self):
@@ -189,7 +189,7 @@ class PACSFileResourceViewTests(PACSFileViewTests):
         self.client.login(username=self.username, password=self.password)
         response = self.client.get(self.download_url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(str(response.content, 'utf-8'), "test file")
+        self.assertEqual(str(b''.join(response.streaming_content), 'utf-8'), "test file")
 
         # delete file from Swift storage
         swift_manager.delete_obj(self.path)
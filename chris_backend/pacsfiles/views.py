@@ -1,10 +1,10 @@
 
 from rest_framework import generics, permissions
 from rest_framework.reverse import reverse
-from rest_framework.response import Response
 
 from collectionjson import services
 from core.renderers import BinaryFileRenderer
+from core.utils import get_file_download_response
 
 from .models import PACSFile, PACSFileFilter
 from .serializers import PACSFileSerializer
@@ -15,7 +15,7 @@ class PACSFileList(generics.ListCreateAPIView):
     """
     A view for the collection of PACS files.
     """
-    queryset = PACSFile.objects.all()
+    queryset = PACSFile.objects.select_related('pacs')
     serializer_class = PACSFileSerializer
     permission_classes = (permissions.IsAuthenticated, IsChrisOrReadOnly,)
 
@@ -49,7 +49,7 @@ class PACSFileListQuerySearch(generics.ListAPIView):
     A view for the collection of PACS files resulting from a query search.
     """
     serializer_class = PACSFileSerializer
-    queryset = PACSFile.objects.all()
+    queryset = PACSFile.objects.select_related('pacs')
     permission_classes = (permissions.IsAuthenticated,)
     filterset_class = PACSFileFilter
 
@@ -73,7 +73,8 @@ class PACSFileResource(generics.GenericAPIView):
 
     def get(self, request, *args, **kwargs):
         """
-        Overriden to be able to make a GET request to an actual file resource.
+        Overriden to be able to make a GET request to an actual file resource. The
+        file contents are streamed from storage and HTTP range requests are supported.
         """
         pacs_file = self.get_object()
-        return Response(pacs_file.fname)
+        return get_file_download_response(request, pacs_file.fname)
@@ -10,7 +10,7 @@ from pipelines.models import Pipeline
 from plugininstances.models import PluginInstance
 from plugininstances.serializers import PluginInstanceSerializer
 from plugininstances.serializers import PARAMETER_SERIALIZERS
-from plugininstances.tasks import cancel_plugin_instance
+from plugininstances.tasks import cancel_plugin_instances
 from plugins.fields import MemoryInt, CPUInt
 
 from .models import PipelineInstance, PipelineInstanceFilter
@@ -102,7 +102,8 @@ class PipelineInstanceList(generics.ListCreateAPIView):
         Custom method to get the actual pipeline instances' queryset.
         """
         pipeline = self.get_object()
-        return self.filter_queryset(pipeline.instances.all())
+        queryset = pipeline.instances.select_related('pipeline', 'owner')
+        return self.filter_queryset(queryset)
 
     def create_plugin_inst(self, piping, previous_inst):
         """
@@ -189,7 +190,7 @@ class AllPipelineInstanceList(generics.ListAPIView):
     A view for the collection of all pipeline instances.
     """
     serializer_class = PipelineInstanceSerializer
-    queryset = PipelineInstance.objects.all()
+    queryset = PipelineInstance.objects.select_related('pipeline', 'owner')
     permission_classes = (permissions.IsAuthenticated,)
 
     def list(self, request, *args, **kwargs):
@@ -210,7 +211,7 @@ class AllPipelineInstanceListQuerySearch(generics.ListAPIView):
     A view for the collection of pipeline instances resulting from a query search.
     """
     serializer_class = PipelineInstanceSerializer
-    queryset = PipelineInstance.objects.all()
+    queryset = PipelineInstance.objects.select_related('pipeline', 'owner')
     permission_classes = (permissions.IsAuthenticated,)
     filterset_class = PipelineInstanceFilter
 
@@ -249,11 +250,7 @@ class PipelineInstanceDetail(generics.RetrieveUpdateDestroyAPIView):
         delete the pipeline instance.
         """
         pipeline_inst = self.get_object()
-        for plg_inst in pipeline_inst.plugin_instances.all():
-            if plg_inst.status == 'started':
-                cancel_plugin_instance.delay(plg_inst.id)  # call async task
-            plg_inst.status = 'cancelled'
-            plg_inst.save()
+        cancel_plugin_instances(pipeline_inst.plugin_instances.all())
         return super(PipelineInstanceDetail, self).destroy(request, *args, **kwargs)
 
 
@@ -279,4 +276,5 @@ class PipelineInstancePluginInstanceList(generics.ListAPIView):
         the queried pipeline instance.
         """
         pipeline_inst = self.get_object()
-        return self.filter_queryset(pipeline_inst.plugin_instances.all())
+        return self.filter_queryset(
+            PluginInstance.add_related_objects(pipeline_inst.plugin_instances.all()))
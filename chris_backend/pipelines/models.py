@@ -78,7 +78,7 @@ class Pipeline(models.Model):
         Custom method to get a filtered queryset with all the pipelines that are
         accessible to a given user (not locked or otherwise own by the user).
         """
-        queryset = Pipeline.objects.all()
+        queryset = Pipeline.objects.select_related('owner')
         # if the user is chris then return all the pipelines in the queryset
         if user.username == 'chris':
             return queryset
@@ -139,7 +139,7 @@ class PipelinePluginList(generics.ListAPIView):
         Custom method to get the actual plugins queryset for the queried pipeline.
         """
         pipeline = self.get_object()
-        return pipeline.plugins.all()
+        return pipeline.plugins.select_related('meta')
 
 
 class PipelinePluginPipingList(generics.ListAPIView):
@@ -197,13 +197,17 @@ class PipelineDefaultParameterList(generics.ListAPIView):
         pipeline = self.get_object()
         queryset = []
         queryset.extend(list(DefaultPipingStrParameter.objects.filter(
-            plugin_piping__pipeline=pipeline)))
+            plugin_piping__pipeline=pipeline).select_related(
+            'plugin_piping', 'plugin_param__plugin__meta')))
         queryset.extend(list(DefaultPipingIntParameter.objects.filter(
-            plugin_piping__pipeline=pipeline)))
+            plugin_piping__pipeline=pipeline).select_related(
+            'plugin_piping', 'plugin_param__plugin__meta')))
         queryset.extend(list(DefaultPipingFloatParameter.objects.filter(
-            plugin_piping__pipeline=pipeline)))
+            plugin_piping__pipeline=pipeline).select_related(
+            'plugin_piping', 'plugin_param__plugin__meta')))
         queryset.extend(list(DefaultPipingBoolParameter.objects.filter(
-            plugin_piping__pipeline=pipeline)))
+            plugin_piping__pipeline=pipeline).select_related(
+            'plugin_piping', 'plugin_param__plugin__meta')))
         return self.filter_queryset(queryset)
 
 
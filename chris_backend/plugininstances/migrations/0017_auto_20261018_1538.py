@@ -0,0 +1,28 @@
+# Generated by Django 2.2.12 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugininstances', '0016_auto_20201006_1309'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plugininstance',
+            name='unextpath_bytes_copied',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='plugininstance',
+            name='unextpath_objects_copied',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='plugininstance',
+            name='unextpath_objects_total',
+            field=models.IntegerField(default=0),
+        ),
+    ]
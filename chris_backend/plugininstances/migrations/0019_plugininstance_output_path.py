@@ -0,0 +1,18 @@
+# Generated by Django 2.2.12 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugininstances', '0018_auto_20261018_1614'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plugininstance',
+            name='output_path',
+            field=models.CharField(blank=True, db_index=True, max_length=1024),
+        ),
+    ]
@@ -0,0 +1,39 @@
+
+from django.db import migrations
+
+
+def backfill_output_path(apps, schema_editor):
+    """
+    Compute and store the output path of the existing plugin instances. Instances are
+    processed in id order so the path of an instance's previous instance is always
+    known by the time the instance is processed.
+    """
+    PluginInstance = apps.get_model('plugininstances', 'PluginInstance')
+    d_paths = {}  # instance id -> path relative to the owner's feed dir
+    batch = []
+    instances = PluginInstance.objects.order_by('id').values_list(
+        'id', 'previous_id', 'plugin__meta__name', 'owner__username', 'feed_id')
+    for (inst_id, previous_id, plugin_name, username, feed_id) in instances.iterator():
+        path = '{0}_{1}/data'.format(plugin_name, inst_id)
+        if previous_id is not None:
+            path = d_paths[previous_id][:-len('data')] + path
+        d_paths[inst_id] = path
+        batch.append(PluginInstance(id=inst_id, output_path='{0}/feed_{1}/{2}'.format(
+            username, feed_id, path)))
+        if len(batch) >= 1000:
+            PluginInstance.objects.bulk_update(batch, ['output_path'])
+            batch = []
+    if batch:
+        PluginInstance.objects.bulk_update(batch, ['output_path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugininstances', '0019_plugininstance_output_path'),
+        ('plugins', '0043_auto_20201208_1527'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_output_path, migrations.RunPython.noop),
+    ]
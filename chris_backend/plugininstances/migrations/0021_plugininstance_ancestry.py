@@ -0,0 +1,42 @@
+# Generated by Django 2.2.12 on 2026-10-18 20:26
+
+from django.db import migrations, models
+
+
+def backfill_ancestry(apps, schema_editor):
+    """
+    Compute and store the ancestry (materialized path of ids from the root instance)
+    of the existing plugin instances. Instances are processed in id order so the
+    ancestry of an instance's previous instance is always known by then.
+    """
+    PluginInstance = apps.get_model('plugininstances', 'PluginInstance')
+    d_ancestry = {}
+    batch = []
+    instances = PluginInstance.objects.order_by('id').values_list('id', 'previous_id')
+    for (inst_id, previous_id) in instances.iterator():
+        ancestry = '/%s/' % inst_id
+        if previous_id is not None:
+            ancestry = d_ancestry[previous_id] + '%s/' % inst_id
+        d_ancestry[inst_id] = ancestry
+        batch.append(PluginInstance(id=inst_id, ancestry=ancestry))
+        if len(batch) >= 1000:
+            PluginInstance.objects.bulk_update(batch, ['ancestry'])
+            batch = []
+    if batch:
+        PluginInstance.objects.bulk_update(batch, ['ancestry'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugininstances', '0020_backfill_plugininstance_output_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plugininstance',
+            name='ancestry',
+            field=models.CharField(blank=True, db_index=True, max_length=1024),
+        ),
+        migrations.RunPython(backfill_ancestry, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.12 on 2026-10-18 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plugininstances', '0021_plugininstance_ancestry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plugininstance',
+            name='next_status_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='plugininstance',
+            index=models.Index(fields=['status', 'next_status_check_at'], name='plugininsta_status_fc81a4_idx'),
+        ),
+    ]
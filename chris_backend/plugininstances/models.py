@@ -1,21 +1,26 @@
 
 import logging
+import os
 import time
+from datetime import timedelta
 
-from django.db import models
-from django.db.utils import IntegrityError
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 import django_filters
 from django_filters.rest_framework import FilterSet
 from swiftclient.exceptions import ClientException
 
-from core.swiftmanager import SwiftManager
+from core.utils import get_storage_manager, get_file_metadata
 from feeds.models import Feed
 from plugins.models import ComputeResource, Plugin, PluginParameter
 from plugins.fields import CPUField, MemoryField
 from plugins.fields import MemoryInt, CPUInt
 from pipelineinstances.models import PipelineInstance
+from users.models import UserStorageUsage
 
 if settings.DEBUG:
     import pdb
@@ -36,6 +41,9 @@ STATUS_CHOICES = [("created",               "Default initial"),
                   ("finishedWithError",     "Finished with error"),
                   ("cancelled",             "Cancelled")]
 
+# statuses from which a plugin instance can not change anymore
+TERMINAL_STATUSES = ('finishedSuccessfully', 'finishedWithError', 'cancelled')
+
 
 class PluginInstance(models.Model):
     title = models.CharField(max_length=100, blank=True)
@@ -60,9 +68,16 @@ class PluginInstance(models.Model):
     memory_limit = MemoryField(null=True)
     number_of_workers = models.IntegerField(null=True)
     gpu_limit = models.IntegerField(null=True)
+    unextpath_objects_total = models.IntegerField(default=0)
+    unextpath_objects_copied = models.IntegerField(default=0)
+    unextpath_bytes_copied = models.BigIntegerField(default=0)
+    output_path = models.CharField(max_length=1024, blank=True, db_index=True)
+    ancestry = models.CharField(max_length=1024, blank=True, db_index=True)
+    next_status_check_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ('-start_date',)
+        indexes = [models.Index(fields=['status', 'next_status_check_at'])]
 
     def __str__(self):
         return self.title
@@ -70,7 +85,9 @@ class PluginInstance(models.Model):
     def save(self, *args, **kwargs):
         """
         Overriden to save a new feed to the DB the first time 'fs' instances are saved.
-        For 'ds' instances the feed of the previous instance is assigned.
+        For 'ds' instances the feed of the previous instance is assigned. A new instance
+        is not saved if its output path or ancestry don't fit in their DB columns (this
+        caps the depth of a plugin instance tree).
         """
         if not hasattr(self, 'feed'):
             if self.plugin.meta.type == 'fs':
@@ -78,7 +95,27 @@ class PluginInstance(models.Model):
             if self.plugin.meta.type == 'ds':
                 self.feed = self.previous.feed
         self._set_compute_defaults()
-        super(PluginInstance, self).save(*args, **kwargs)
+        with transaction.atomic():
+            super(PluginInstance, self).save(*args, **kwargs)
+            if not self.output_path and (self.previous or
+                                         self.plugin.meta.type == 'fs'):
+                # the output path and ancestry include the instance id so they can
+                # only be computed once the instance has been saved for the first time
+                d_paths = {'output_path': self.get_output_path(),
+                           'ancestry': '/%s/' % self.id}
+                if self.previous:
+                    d_paths['ancestry'] = self.previous.ancestry + '%s/' % self.id
+                for (field_name, value) in d_paths.items():
+                    max_length = self._meta.get_field(field_name).max_length
+                    if len(value) > max_length:
+                        # the new instance's row is rolled back
+                        raise ValidationError(
+                            'The plugin instance tree is too deep, the %s of a new '
+                            'plugin instance can not exceed %s characters.' % (
+                                field_name.replace('_', ' '), max_length))
+                self.output_path = d_paths['output_path']
+                self.ancestry = d_paths['ancestry']
+                PluginInstance.objects.filter(pk=self.pk).update(**d_paths)
 
     def _save_feed(self):
         """
@@ -104,45 +141,108 @@ class PluginInstance(models.Model):
         if not self.gpu_limit:
             self.gpu_limit = self.plugin.min_gpu_limit
 
+    @staticmethod
+    def cancel_instances(queryset):
+        """
+        Custom method to cancel the plugin instances in the passed queryset that are
+        not in a terminal status with a single conditional UPDATE. Returns the list of
+        ids of the instances that were in 'started' status (whose remote execution
+        must also be cancelled).
+        """
+        with transaction.atomic():
+            # lock the started instances so they can not change status before the
+            # update
+            started_ids = list(queryset.filter(status='started').select_for_update(
+            ).values_list('id', flat=True))
+            queryset.exclude(status__in=TERMINAL_STATUSES).update(status='cancelled')
+        return started_ids
+
+    @staticmethod
+    def schedule_waiting_instances(queryset):
+        """
+        Custom method to move the plugin instances in the passed queryset that are in
+        'waitingForPrevious' status to 'scheduled' status with a single conditional
+        UPDATE. Returns the list of ids of the instances that were scheduled (whose app
+        must be run), so concurrent callers never schedule the same instance twice.
+        """
+        with transaction.atomic():
+            waiting_ids = list(queryset.filter(
+                status='waitingForPrevious').select_for_update().values_list('id',
+                                                                              flat=True))
+            PluginInstance.objects.filter(
+                pk__in=waiting_ids, status='waitingForPrevious').update(status='scheduled')
+        return waiting_ids
+
+    @staticmethod
+    def add_related_objects(queryset):
+        """
+        Custom method to join the passed plugin instance queryset with the related
+        objects that are serialized along with every plugin instance, so they are not
+        fetched with a separate query per instance. Long related columns that are not
+        serialized are deferred.
+        """
+        return queryset.select_related(
+            'owner', 'compute_resource', 'plugin__meta', 'pipeline_inst__pipeline'
+        ).defer('plugin__dock_image', 'plugin__selfpath', 'plugin__description',
+                'plugin__meta__title', 'plugin__meta__documentation',
+                'pipeline_inst__description', 'pipeline_inst__pipeline__description')
+
     def get_root_instance(self):
         """
         Custom method to return the root plugin instance for this plugin instance.
         """
-        current = self
-        while not current.plugin.meta.type == 'fs':
-            current = current.previous
-        return current
+        return PluginInstance.objects.get(pk=self.get_ancestor_ids()[0])
+
+    def get_ancestor_ids(self):
+        """
+        Custom method to get the list of ids of the plugin instances in the path from
+        the root instance to this plugin instance (both included) from its ancestry.
+        """
+        return [int(inst_id) for inst_id in self.ancestry.strip('/').split('/')]
+
+    def get_ancestor_instances(self):
+        """
+        Custom method to return a queryset with all the plugin instances that are an
+        ancestor of this plugin instance (including itself).
+        """
+        return PluginInstance.objects.filter(pk__in=self.get_ancestor_ids())
 
     def get_descendant_instances(self):
         """
-        Custom method to return all the plugin instances that are a descendant of this
-        plugin instance.
+        Custom method to return a queryset with all the plugin instances that are a
+        descendant of this plugin instance (including itself) in tree order (every
+        instance before its descendants). It is a single query on the indexed ancestry
+        column.
         """
-        descendant_instances = []
-        queue = [self]
-        while len(queue) > 0:
-            visited = queue.pop()
-            queue.extend(list(visited.next.all()))
-            descendant_instances.append(visited)
-        return descendant_instances
+        return PluginInstance.objects.filter(
+            ancestry__startswith=self.ancestry).order_by('ancestry')
 
     def get_output_path(self):
         """
         Custom method to get the output directory for files generated by
-        the plugin instance object.
+        the plugin instance object. The path is stored in the output_path field when
+        the instance is first saved so this only needs to be called to compute it.
         """
         # 'fs' plugins will output files to:
         # SWIFT_CONTAINER_NAME/<username>/feed_<id>/plugin_name_plugin_inst_<id>/data
         # 'ds' plugins will output files to:
         # SWIFT_CONTAINER_NAME/<username>/feed_<id>/...
         #/previous_plugin_name_plugin_inst_<id>/plugin_name_plugin_inst_<id>/data
+        if self.output_path:
+            return self.output_path
         current = self
         path = '/{0}_{1}/data'.format(current.plugin.meta.name, current.id)
         while not current.plugin.meta.type == 'fs':
             current = current.previous
+            if current.output_path:
+                # the stored path of an ancestor already includes the rest of the
+                # chain but it must be moved under this instance's owner dir
+                ancestors_path = os.path.dirname(current.output_path.split('/', 2)[2])
+                path = '/' + ancestors_path + path
+                break
             path = '/{0}_{1}'.format(current.plugin.meta.name, current.id) + path
         username = self.owner.username
-        output_path = '{0}/feed_{1}'.format(username, current.feed.id) + path
+        output_path = '{0}/feed_{1}'.format(username, self.feed_id) + path
         return output_path
 
     def get_parameter_instances(self):
@@ -151,12 +251,10 @@ class PluginInstance(models.Model):
         instance regardless of their type.
         """
         parameter_instances = []
-        parameter_instances.extend(list(self.unextpath_param.all()))
-        parameter_instances.extend(list(self.path_param.all()))
-        parameter_instances.extend(list(self.string_param.all()))
-        parameter_instances.extend(list(self.integer_param.all()))
-        parameter_instances.extend(list(self.float_param.all()))
-        parameter_instances.extend(list(self.boolean_param.all()))
+        for related_name in ('unextpath_param', 'path_param', 'string_param',
+                             'integer_param', 'float_param', 'boolean_param'):
+            queryset = getattr(self, related_name).select_related('plugin_param')
+            parameter_instances.extend(list(queryset))
         return parameter_instances
 
     def register_output_files(self, **kwargs):
@@ -174,65 +272,191 @@ class PluginInstance(models.Model):
         #     pass
         # pudb.set_trace()
 
-        d_swiftstate    = kwargs['swiftState'] if 'swiftState' in kwargs else {}
-        swift_manager   = SwiftManager(settings.SWIFT_CONTAINER_NAME,
-                                       settings.SWIFT_CONNECTION_PARAMS)
-        output_path     = self.get_output_path()
+        swift_manager   = get_storage_manager()
+        output_path     = self.output_path
 
-        # the following gets the full list of objects in the swift storage
-        # with prefix of <output_path>. Since there is a lag in consistency
-        # of swift state from different clients, we poll here using the
-        # information returned from pfcon that indicates how many files
+        # Waiting for swift to consistently list the objects pushed by a remote
+        # service is done beforehand (without blocking a worker) by the
+        # register_plugin_instance_output_files task.
 
-        l_objCurrentlyReportedBySwift = []
+        b_status = True
+        file_count = 0
+        d_register = {'registered': 0, 'elapsed': 0, 'rows_per_sec': 0}
         try:
-            l_objCurrentlyReportedBySwift = swift_manager.ls(output_path)
+            d_register = self._bulk_register_output_files(
+                swift_manager.ls_iter(output_path, details=True))
+            file_count = d_register['total']
         except ClientException as e:
             logger.error('Swift storage error, detail: %s' % str(e))
-
-        if 'd_swift_ls' in d_swiftstate.keys():
-            # This conditional processes the case where a remote process has
-            # returned data that has been pushed into swift by ancillary services
-            l_objPutIntoSwift           = d_swiftstate['d_swift_ls']['lsList']
-        else:
-            # This conditional addressed the case where an internal CUBE
-            # process and *not* a remote execution pushed data into swift
-            l_objPutIntoSwift           = l_objCurrentlyReportedBySwift
-
-        maxWaitPoll     = 20
-        waitPoll        = 0
-        while (waitPoll < maxWaitPoll) and not all(obj in l_objCurrentlyReportedBySwift
-                                                   for obj in l_objPutIntoSwift):
-            time.sleep(0.2)
-            waitPoll += 1
-            try:
-                l_objCurrentlyReportedBySwift = swift_manager.ls(output_path)
-            except ClientException as e:
-                logger.error('Swift storage error, detail: %s' % str(e))
-
-        b_status = False
-        if all(obj in l_objCurrentlyReportedBySwift for obj in l_objPutIntoSwift):
-            b_status = True
-
-        file_count = 0
-        for obj_name in l_objCurrentlyReportedBySwift:
-            logger.info('Registering  -->%s<--', obj_name)
-            plg_inst_file = PluginInstanceFile(plugin_inst=self)
-            plg_inst_file.fname.name = obj_name
-            try:
-                plg_inst_file.save()
-            except IntegrityError:  # avoid re-register a file already registered
-                logger.info('-->%s<-- already registered', obj_name)
-            file_count += 1
+            b_status = False
 
         return {
             'status':       b_status,
-            'l_object':     l_objCurrentlyReportedBySwift,
             'total':        file_count,
-            'outputPath':   output_path,
-            'pollLoop':     waitPoll
+            'registered':   d_register['registered'],
+            'rowsPerSec':   d_register['rows_per_sec'],
+            'outputPath':   output_path
         }
 
+    def _bulk_register_output_files(self, ld_obj):
+        """
+        Internal method to register the objects in the passed iterable of storage
+        listing dictionaries as files of the plugin instance (together with their
+        size, checksum, content type and last modified time). The names already
+        registered are fetched with a single query and the rest are inserted with
+        batched bulk INSERTs. Every batch is committed in its own short transaction
+        so the storage listing is never consumed while a transaction is open. Only
+        the rows actually inserted (not the ones ignored because a concurrent or
+        previous registration already inserted them) are counted and added to the
+        storage usage counters.
+        """
+        batch_size = getattr(settings, 'REGISTER_OUTPUT_FILES_BATCH_SIZE', 1000)
+        start = time.monotonic()
+        total = 0
+        registered = 0
+        nbytes = 0
+
+        def insert(batch):
+            with transaction.atomic():
+                # read within the transaction so that (on MySQL's default repeatable
+                # read isolation) the rows committed by a concurrent registration
+                # afterwards are not visible when counting the inserted rows
+                batch_files = self.files.filter(fname__in=[f.fname for f in batch])
+                s_existing = set(batch_files.values_list('fname', flat=True))
+                # conflicts are ignored to avoid re-registering a registered file
+                PluginInstanceFile.objects.bulk_create(batch, ignore_conflicts=True)
+                # the rows that became visible in this transaction are the ones
+                # inserted
+                s_inserted = set(batch_files.values_list('fname', flat=True))
+                s_inserted -= s_existing
+                inserted_bytes = sum(f.fsize or 0 for f in batch
+                                     if f.fname in s_inserted)
+                # the storage usage counters are incremented within the same
+                # transaction by the rows actually inserted so they never drift from
+                # the real usage
+                Feed.add_storage_usage(self.feed_id, len(s_inserted), inserted_bytes)
+                UserStorageUsage.add_storage_usage(self.owner_id, len(s_inserted),
+                                                   inserted_bytes)
+            return len(s_inserted), inserted_bytes
+
+        batch = []
+        # the names registered so far are only used to skip them early, every batch
+        # is checked again when it is inserted
+        s_registered = set(self.files.values_list('fname', flat=True))
+        for d_obj in ld_obj:
+            total += 1
+            if d_obj['name'] in s_registered:
+                continue
+            s_registered.add(d_obj['name'])
+            plg_inst_file = PluginInstanceFile(plugin_inst=self,
+                                               fname=d_obj['name'],
+                                               **get_file_metadata(d_obj))
+            batch.append(plg_inst_file)
+            if len(batch) >= batch_size:
+                (count, size) = insert(batch)
+                registered += count
+                nbytes += size
+                batch = []
+        if batch:
+            (count, size) = insert(batch)
+            registered += count
+            nbytes += size
+        elapsed = time.monotonic() - start
+        rows_per_sec = registered / elapsed if elapsed else 0
+        logger.info('Registered %s new files out of %s for plugin instance %s in %.3fs '
+                    '(%.1f rows/sec)', registered, total, self.id, elapsed,
+                    rows_per_sec)
+        return {'total': total, 'registered': registered, 'elapsed': elapsed,
+                'rows_per_sec': rows_per_sec}
+
+    def get_output_objects_count(self, swift_manager=None):
+        """
+        Custom method to get the number of objects currently reported by storage under
+        the plugin instance's output path (0 if storage could not be listed).
+        """
+        if swift_manager is None:
+            swift_manager = get_storage_manager()
+        count = 0
+        try:
+            for l_page in swift_manager.ls_pages(self.output_path):
+                count += len(l_page)
+        except ClientException as e:
+            logger.error('Swift storage error, detail: %s' % str(e))
+            return 0
+        return count
+
+    @staticmethod
+    def get_output_files_wait_delay(attempt):
+        """
+        Custom method to get the time in seconds to wait before the passed attempt to
+        check again for output objects not yet reported by storage (exponential
+        backoff).
+        """
+        initial = getattr(settings, 'REGISTER_OUTPUT_FILES_WAIT_INITIAL_DELAY', 0.2)
+        maximum = getattr(settings, 'REGISTER_OUTPUT_FILES_WAIT_MAX_DELAY', 5)
+        return min(initial * 2 ** attempt, maximum)
+
+    def get_expected_run_time(self):
+        """
+        Custom method to get the expected run time in seconds of this plugin
+        instance's app as the average run time of the most recent instances of the
+        same plugin that finished successfully. Returns None if there is no history.
+        The run times are measured from the instances' start_date, which is set when
+        they are created, so they are biased upwards by the time the jobs spent
+        waiting for previous instances and queued in the remote compute scheduler.
+        This errs on the side of polling later, not sooner.
+        """
+        n = getattr(settings, 'PLUGIN_INSTANCE_RUN_TIME_HISTORY_SIZE', 10)
+        l_dates = PluginInstance.objects.filter(
+            plugin_id=self.plugin_id, status='finishedSuccessfully').order_by(
+            '-end_date').values_list('start_date', 'end_date')[:n]
+        l_run_times = [(end - start).total_seconds() for (start, end) in l_dates]
+        if not l_run_times:
+            return None
+        return sum(l_run_times) / len(l_run_times)
+
+    def get_next_status_check_delay(self, expected_run_time=None):
+        """
+        Custom method to get the time in seconds to wait before checking again the
+        execution status of this plugin instance's app. The remote service is polled
+        sparingly until the expected run time has elapsed and after that with an
+        exponential backoff (the delay grows with the time already waited).
+        """
+        minimum = getattr(settings, 'PLUGIN_INSTANCE_STATUS_CHECK_MIN_DELAY', 10)
+        maximum = getattr(settings, 'PLUGIN_INSTANCE_STATUS_CHECK_MAX_DELAY', 300)
+        factor = getattr(settings, 'PLUGIN_INSTANCE_STATUS_CHECK_BACKOFF_FACTOR', 0.5)
+        elapsed = (timezone.now() - self.start_date).total_seconds()
+        expected_run_time = expected_run_time or 0
+        if elapsed < expected_run_time:
+            delay = expected_run_time - elapsed
+        else:
+            delay = (elapsed - expected_run_time) * factor
+        return min(max(delay, minimum), maximum)
+
+    def set_next_status_check(self, expected_run_time=None):
+        """
+        Custom method to set the time of the next check of the execution status of
+        this plugin instance's app from its expected run time. The expected run time
+        is computed from the plugin's history if not provided.
+        """
+        if expected_run_time is None:
+            expected_run_time = self.get_expected_run_time()
+        delay = self.get_next_status_check_delay(expected_run_time)
+        self.next_status_check_at = timezone.now() + timedelta(seconds=delay)
+        return self.next_status_check_at
+
+    @staticmethod
+    def get_due_status_check_instances(queryset=None):
+        """
+        Custom method to filter the plugin instances in 'started' status whose app's
+        execution status is due to be checked (on the status index).
+        """
+        if queryset is None:
+            queryset = PluginInstance.objects.all()
+        lookup = Q(next_status_check_at__isnull=True) | Q(
+            next_status_check_at__lte=timezone.now())
+        return queryset.filter(status='started').filter(lookup)
+
 
 class PluginInstanceFilter(FilterSet):
     min_start_date = django_filters.DateFilter(field_name='start_date', lookup_expr='gte')
@@ -264,24 +488,24 @@ class PluginInstanceFilter(FilterSet):
     def filter_by_root_id(self, queryset, name, value):
         """
         Custom method to return the plugin instances in a queryset with a common root
-        plugin instance.
+        plugin instance, in tree order.
         """
-        filtered_queryset = []
-        root_queryset = queryset.filter(pk=value)
-        # check whether the root id value is in the DB
-        if not root_queryset.exists():
-            return root_queryset
-        queue = [root_queryset[0]]
-        while len(queue) > 0:
-            visited = queue.pop()
-            queue.extend(list(visited.next.all()))
-            filtered_queryset.append(visited)
-        return filtered_queryset
+        # the root's ancestry is fetched first so the prefix is a literal and the
+        # LIKE 'prefix%' lookup can use the index on the ancestry column
+        ancestry = PluginInstance.objects.filter(pk=value).values_list(
+            'ancestry', flat=True).first()
+        if not ancestry:
+            return queryset.none()
+        return queryset.filter(ancestry__startswith=ancestry).order_by('ancestry')
 
 
 class PluginInstanceFile(models.Model):
     creation_date = models.DateTimeField(auto_now_add=True)
     fname = models.FileField(max_length=1024, unique=True)
+    fsize = models.BigIntegerField(null=True, blank=True, db_index=True)
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    last_modified = models.DateTimeField(null=True, blank=True)
     plugin_inst = models.ForeignKey(PluginInstance, db_index=True,
                                     on_delete=models.CASCADE, related_name='files')
 
@@ -291,6 +515,34 @@ class PluginInstanceFile(models.Model):
     def __str__(self):
         return self.fname.name
 
+    @staticmethod
+    def add_related_objects(queryset):
+        """
+        Custom method to join the passed plugin instance file queryset with the plugin
+        instances that are serialized along with every file, so they are not fetched
+        with a separate query per file. Long plugin instance columns are deferred.
+        """
+        return queryset.select_related('plugin_inst').defer('plugin_inst__summary',
+                                                            'plugin_inst__raw')
+
+    @staticmethod
+    def remove_storage_usage(files):
+        """
+        Custom method to subtract the passed queryset of plugin instance files from
+        the storage usage counters of their feeds and owners. It must be called before
+        the files are deleted and within the same transaction.
+        """
+        # the default ordering must be cleared to properly group the files
+        files = files.order_by()
+        for d in files.values('plugin_inst__feed_id').annotate(nfiles=Count('id'),
+                                                               nbytes=Sum('fsize')):
+            Feed.add_storage_usage(d['plugin_inst__feed_id'], -d['nfiles'],
+                                   -(d['nbytes'] or 0))
+        for d in files.values('plugin_inst__owner_id').annotate(nfiles=Count('id'),
+                                                                nbytes=Sum('fsize')):
+            UserStorageUsage.add_storage_usage(d['plugin_inst__owner_id'],
+                                               -d['nfiles'], -(d['nbytes'] or 0))
+
 
 class PluginInstanceFileFilter(FilterSet):
     min_creation_date = django_filters.DateFilter(field_name='creation_date',
@@ -303,11 +555,12 @@ class PluginInstanceFileFilter(FilterSet):
                                                lookup_expr='exact')
     fname = django_filters.CharFilter(field_name='fname', lookup_expr='startswith')
     fname_exact = django_filters.CharFilter(field_name='fname', lookup_expr='exact')
+    checksum = django_filters.CharFilter(field_name='checksum', lookup_expr='exact')
 
     class Meta:
         model = PluginInstanceFile
         fields = ['id', 'min_creation_date', 'max_creation_date', 'plugin_inst_id',
-                  'feed_id', 'fname', 'fname_exact']
+                  'feed_id', 'fname', 'fname_exact', 'checksum']
 
 
 class StrParameter(models.Model):
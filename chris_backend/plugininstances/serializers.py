@@ -3,13 +3,11 @@ import logging
 import pathlib
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.conf import settings
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 
 from collectionjson.fields import ItemLinkField
-from core.utils import get_file_resource_link
-from core.swiftmanager import SwiftManager
+from core.utils import get_file_resource_link, get_storage_manager
 from plugins.models import TYPES
 from feeds.models import Feed
 
@@ -24,15 +22,18 @@ logger = logging.getLogger(__name__)
 class PluginInstanceSerializer(serializers.HyperlinkedModelSerializer):
     compute_resource_name = serializers.CharField(max_length=100, required=False,
                                                   source='compute_resource.name')
-    previous_id = serializers.ReadOnlyField(source='previous.id')
-    plugin_id = serializers.ReadOnlyField(source='plugin.id')
+    previous_id = serializers.ReadOnlyField()
+    plugin_id = serializers.ReadOnlyField()
     plugin_name = serializers.ReadOnlyField(source='plugin.meta.name')
     plugin_version = serializers.ReadOnlyField(source='plugin.version')
     pipeline_id = serializers.ReadOnlyField(source='pipeline_inst.pipeline.id')
     pipeline_name = serializers.ReadOnlyField(source='pipeline_inst.pipeline.name')
-    pipeline_inst_id = serializers.ReadOnlyField(source='pipeline_inst.id')
-    feed_id = serializers.ReadOnlyField(source='feed.id')
+    pipeline_inst_id = serializers.ReadOnlyField()
+    feed_id = serializers.ReadOnlyField()
     owner_username = serializers.ReadOnlyField(source='owner.username')
+    unextpath_objects_total = serializers.ReadOnlyField()
+    unextpath_objects_copied = serializers.ReadOnlyField()
+    unextpath_bytes_copied = serializers.ReadOnlyField()
     previous = serializers.HyperlinkedRelatedField(view_name='plugininstance-detail',
                                                    read_only=True)
     descendants = serializers.HyperlinkedIdentityField(
@@ -57,7 +58,9 @@ class PluginInstanceSerializer(serializers.HyperlinkedModelSerializer):
                   'start_date', 'end_date', 'status', 'summary', 'raw',
                   'owner_username', 'previous', 'feed', 'plugin', 'descendants',
                   'files', 'parameters', 'compute_resource', 'cpu_limit',
-                  'memory_limit', 'number_of_workers', 'gpu_limit')
+                  'memory_limit', 'number_of_workers', 'gpu_limit',
+                  'unextpath_objects_total', 'unextpath_objects_copied',
+                  'unextpath_bytes_copied')
 
     def validate_previous(self, previous_id):
         """
@@ -164,12 +167,17 @@ class PluginInstanceFileSerializer(serializers.HyperlinkedModelSerializer):
                                                       read_only=True)
     file_resource = ItemLinkField('get_file_link')
     fname = serializers.FileField(use_url=False)
-    feed_id = serializers.ReadOnlyField(source='plugin_inst.feed.id')
-    plugin_inst_id = serializers.ReadOnlyField(source='plugin_inst.id')
+    feed_id = serializers.ReadOnlyField(source='plugin_inst.feed_id')
+    plugin_inst_id = serializers.ReadOnlyField()
+    fsize = serializers.ReadOnlyField()
+    checksum = serializers.ReadOnlyField()
+    content_type = serializers.ReadOnlyField()
+    last_modified = serializers.ReadOnlyField()
 
     class Meta:
         model = PluginInstanceFile
-        fields = ('url', 'id', 'creation_date', 'fname', 'feed_id', 'plugin_inst_id',
+        fields = ('url', 'id', 'creation_date', 'fname', 'fsize', 'checksum',
+                  'content_type', 'last_modified', 'feed_id', 'plugin_inst_id',
                   'file_resource', 'plugin_inst')
 
     def get_file_link(self, obj):
@@ -240,8 +248,7 @@ def validate_paths(user, string):
     Custom function to check that a user is allowed to access the provided object storage
     paths.
     """
-    swift_manager = SwiftManager(settings.SWIFT_CONTAINER_NAME,
-                                 settings.SWIFT_CONNECTION_PARAMS)
+    swift_manager = get_storage_manager()
     path_list = [s.strip() for s in string.split(',')]
     for path in path_list:
         path_parts = pathlib.Path(path).parts
@@ -295,7 +302,7 @@ class PathParameterSerializer(serializers.HyperlinkedModelSerializer):
         """
         Overriden to get the request user as a keyword argument at object creation.
         """
-        self.user = kwargs.pop('user')
+        self.user = kwargs.pop('user', None)
         super(PathParameterSerializer, self).__init__(*args, **kwargs)
 
     def validate_value(self, value):
@@ -324,7 +331,7 @@ class UnextpathParameterSerializer(serializers.HyperlinkedModelSerializer):
         """
         Overriden to get the request user as a keyword argument at object creation.
         """
-        self.user = kwargs.pop('user')
+        self.user = kwargs.pop('user', None)
         super(UnextpathParameterSerializer, self).__init__(*args, **kwargs)
 
     def validate_value(self, value):
@@ -47,14 +47,18 @@ import json
 import zlib, base64
 import zipfile
 
+from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 
 import pfurl
+import requests
+import yaml
 import time
 import json
 
-from core.swiftmanager import SwiftManager, ClientException
+from core.swiftmanager import ClientException
+from core.utils import get_storage_manager
 
 if settings.DEBUG:
     import pdb
@@ -68,10 +72,18 @@ logger = logging.getLogger(__name__)
 
 class PluginInstanceManager(object):
 
-    def __init__(self, plugin_instance):
+    def __init__(self, plugin_instance, http_session=None, expected_run_times=None):
 
         self.c_plugin_inst = plugin_instance
 
+        # optional requests session whose pooled connections are reused to talk to
+        # the remote service (eg. when checking the status of many jobs in a row)
+        self.http_session = http_session
+
+        # optional dict of expected run times keyed by plugin id that can be shared
+        # between managers so the plugin's run time history is only queried once
+        self.expected_run_times = expected_run_times
+
         # hardcode mounting points for the input and outputdir in the app's container!
         self.str_app_container_inputdir     = '/share/incoming'
         self.str_app_container_outputdir    = '/share/outgoing'
@@ -82,8 +94,28 @@ class PluginInstanceManager(object):
         # local data dir to store zip files before transmitting to the remote
         self.data_dir = os.path.join(os.path.expanduser("~"), 'data')
 
-        self.swift_manager = SwiftManager(settings.SWIFT_CONTAINER_NAME,
-                                          settings.SWIFT_CONNECTION_PARAMS)
+        self._swift_manager = None
+
+    @property
+    def swift_manager(self):
+        """
+        Storage manager lazily created on first use as checking the execution status
+        of an app doesn't require access to storage.
+        """
+        if self._swift_manager is None:
+            self._swift_manager = get_storage_manager()
+        return self._swift_manager
+
+    @staticmethod
+    def create_http_session():
+        """
+        Custom static method to create a requests session whose pooled HTTP
+        connections can be shared by several managers talking to the same remote
+        service.
+        """
+        session = requests.Session()
+        session.headers.update({'Mode': 'control'})
+        return session
 
     def run_plugin_instance_app(self):
         """
@@ -125,14 +157,14 @@ class PluginInstanceManager(object):
             if param.action == 'store_false' and not value:
                 app_args.append(param.flag)
 
-        str_outputdir = self.c_plugin_inst.get_output_path()
+        str_outputdir = self.c_plugin_inst.output_path
 
         # handle parameters of type 'unextpath'
         self.handle_app_unextpath_parameters(unextpath_parameters_dict)
 
         if self.c_plugin_inst.previous:
             # WARNING: 'ds' plugins can also have 'path' parameters!
-            str_inputdir = self.c_plugin_inst.previous.get_output_path()
+            str_inputdir = self.c_plugin_inst.previous.output_path
         elif len(path_parameters_dict):
             # WARNING: Inputdir assumed to only be one of the 'path' parameters!
             path_list = next(iter(path_parameters_dict.values())).split(',')
@@ -230,36 +262,77 @@ class PluginInstanceManager(object):
         }
         self.call_app_service(d_msg)
         self.c_plugin_inst.status = 'started'
+        self.c_plugin_inst.set_next_status_check()
         self.c_plugin_inst.save()
 
     def handle_app_unextpath_parameters(self, unextpath_parameters_dict):
         """
-        Handle parameters of type 'unextpath' passed to the plugin instance app.
+        Handle parameters of type 'unextpath' passed to the plugin instance app. The
+        objects are copied concurrently to the output dir and the copy progress is
+        recorded on the plugin instance.
         """
-        outputdir = self.c_plugin_inst.get_output_path()
-        nobjects = 0
+        outputdir = self.c_plugin_inst.output_path
+        max_workers = getattr(settings, 'UNEXTPATH_COPY_MAX_WORKERS', 8)
+        retries = getattr(settings, 'UNEXTPATH_COPY_RETRIES', 3)
+        d_total = {'listed': 0, 'objects': 0, 'bytes': 0, 'failed': 0}
+        last_update = time.monotonic()
+
+        def report_progress(nobjects, nbytes):
+            nonlocal last_update
+            if time.monotonic() - last_update >= 1:
+                self.save_unextpath_copy_progress(d_total['listed'],
+                                                  d_total['objects'] + nobjects,
+                                                  d_total['bytes'] + nbytes)
+                last_update = time.monotonic()
+
         for param_name in unextpath_parameters_dict:
             # each parameter value is a string of one or more paths separated by comma
             path_list = unextpath_parameters_dict[param_name].split(',')
             for path in path_list:
-                obj_list = []
                 try:
-                    obj_list = self.swift_manager.ls(path)
+                    # the listing is consumed page by page and each page is copied
+                    # before the next one is requested
+                    for ld_obj in self.swift_manager.ls_pages(path, details=True):
+                        copy_list = []
+                        for d_obj in ld_obj:
+                            obj = d_obj['name']
+                            obj_output_path = obj.replace(path.rstrip('/'), outputdir, 1)
+                            if not obj_output_path.startswith(outputdir + '/'):
+                                obj_output_path = outputdir + '/' + obj.split('/')[-1]
+                            copy_list.append((obj, obj_output_path, d_obj['bytes']))
+                        d_total['listed'] += len(copy_list)
+                        self.save_unextpath_copy_progress(d_total['listed'],
+                                                          d_total['objects'],
+                                                          d_total['bytes'])
+                        d_copy = self.swift_manager.copy_objs(
+                            copy_list, max_workers=max_workers, retries=retries,
+                            progress_callback=report_progress)
+                        d_total['objects'] += d_copy['objects']
+                        d_total['bytes'] += d_copy['bytes']
+                        d_total['failed'] += len(d_copy['failed'])
                 except ClientException as e:
                     logger.error('Swift storage error, detail: %s' % str(e))
-                for obj in obj_list:
-                    obj_output_path = obj.replace(path.rstrip('/'), outputdir, 1)
-                    if not obj_output_path.startswith(outputdir + '/'):
-                        obj_output_path = outputdir + '/' + obj.split('/')[-1]
-                    try:
-                        self.swift_manager.copy_obj(obj, obj_output_path)
-                    except ClientException as e:
-                        logger.error('Swift storage error, detail: %s' % str(e))
-                    else:
-                        nobjects += 1
+        if not d_total['listed']:
+            return
+        self.save_unextpath_copy_progress(d_total['listed'], d_total['objects'],
+                                          d_total['bytes'])
+        logger.info('Copied %s objects (%s bytes) for unextpath parameters of %s, '
+                    '%s failed', d_total['objects'], d_total['bytes'], self.str_job_id,
+                    d_total['failed'])
         #swiftState = {'d_swiftstore': {'filesPushed': nobjects}}
         #self.c_plugin_inst.register_output_files(swiftState=swiftState)
 
+    def save_unextpath_copy_progress(self, total, nobjects, nbytes):
+        """
+        Save the progress of the copy of the objects for 'unextpath' parameters.
+        """
+        self.c_plugin_inst.unextpath_objects_total = total
+        self.c_plugin_inst.unextpath_objects_copied = nobjects
+        self.c_plugin_inst.unextpath_bytes_copied = nbytes
+        self.c_plugin_inst.save(update_fields=['unextpath_objects_total',
+                                               'unextpath_objects_copied',
+                                               'unextpath_bytes_copied'])
+
     def check_plugin_instance_app_exec_status(self):
         """
         Check a plugin instance's app execution status. It connects to the remote
@@ -280,6 +353,12 @@ class PluginInstanceManager(object):
                 }
             }
             d_response = self.call_app_service(d_msg)
+            if not isinstance(d_response, dict):
+                logger.error('Could not get the remote status of job %s, response: %s',
+                             self.str_job_id, d_response)
+                self.c_plugin_inst.set_next_status_check(self.get_expected_run_time())
+                self.c_plugin_inst.save(update_fields=['next_status_check_at'])
+                return self.c_plugin_inst.status
             l_status = d_response['jobOperationSummary']['compute']['return']['l_status']
             logger.info('Current job remote status = %s', l_status)
             logger.info('Current job DB status     = %s', self.c_plugin_inst.status)
@@ -293,17 +372,12 @@ class PluginInstanceManager(object):
                 # collisions on `register_output_files()` and better informs the FE
                 self.c_plugin_inst.status = 'registeringFiles'
                 self.c_plugin_inst.save()
-                d = self.c_plugin_inst.register_output_files(swiftState=d_swiftState)
-                # Once the `register_output_files` is done, we can set
-                # the proper finall state
-                if d['status']:
-                    self.c_plugin_inst.status = 'finishedSuccessfully'
-                else:
-                    self.c_plugin_inst.status = 'finishedWithError'
-                logger.info("Saving job DB status as '%s'", self.c_plugin_inst.status)
-                self.c_plugin_inst.end_date = timezone.now()
-                logger.info("Saving job DB end_date as '%s'", self.c_plugin_inst.end_date)
-                self.c_plugin_inst.save()
+                # The files are registered by a separate task that waits (without
+                # blocking this one) until swift consistently lists the pushed objects
+                l_objPutIntoSwift = []
+                if 'd_swift_ls' in d_swiftState:
+                    l_objPutIntoSwift = d_swiftState['d_swift_ls']['lsList']
+                self.schedule_output_files_registration(len(set(l_objPutIntoSwift)))
 
             # Some possible error handling...
             if 'finishedWithError' in l_status:
@@ -312,9 +386,84 @@ class PluginInstanceManager(object):
                 self.c_plugin_inst.end_date = timezone.now()
                 logger.info("Saving job DB end_date as '%s'", self.c_plugin_inst.end_date)
                 self.c_plugin_inst.save()
+                self.schedule_waiting_children_update()
+                self.delete_exec_status_check_marker()
                 self.handle_app_remote_error()
+
+            if self.c_plugin_inst.status == 'started':
+                # the job is still running so back off before checking it again
+                self.c_plugin_inst.set_next_status_check(self.get_expected_run_time())
+                self.c_plugin_inst.save(update_fields=['next_status_check_at'])
         return self.c_plugin_inst.status
 
+    def get_expected_run_time(self):
+        """
+        Get the expected run time of the plugin instance's app (0 if the plugin has
+        no run time history). The value is cached in the shared expected run times
+        dict when the manager was given one.
+        """
+        if self.expected_run_times is None:
+            return self.c_plugin_inst.get_expected_run_time() or 0
+        plugin_id = self.c_plugin_inst.plugin_id
+        if plugin_id not in self.expected_run_times:
+            run_time = self.c_plugin_inst.get_expected_run_time() or 0
+            self.expected_run_times[plugin_id] = run_time
+        return self.expected_run_times[plugin_id]
+
+    def schedule_output_files_registration(self, nobjects):
+        """
+        Schedule the registration of the plugin instance's output files once the
+        current DB transaction is committed. <nobjects> is the number of objects that
+        the remote service reported as pushed into swift.
+        """
+        # imported here as the tasks module depends on this module
+        from plugininstances.tasks import register_plugin_instance_output_files
+
+        plg_inst_id = self.c_plugin_inst.id
+        transaction.on_commit(lambda: register_plugin_instance_output_files.delay(
+            plg_inst_id, nobjects))
+
+    def finish_output_files_registration(self, b_consistent):
+        """
+        Register the plugin instance's output files and set its final DB status.
+        <b_consistent> tells whether all the objects reported as pushed by the remote
+        service were listed by swift before the wait deadline.
+        """
+        d = self.c_plugin_inst.register_output_files()
+        if d['status'] and b_consistent:
+            self.c_plugin_inst.status = 'finishedSuccessfully'
+        else:
+            self.c_plugin_inst.status = 'finishedWithError'
+        logger.info("Saving job DB status as '%s'", self.c_plugin_inst.status)
+        self.c_plugin_inst.end_date = timezone.now()
+        logger.info("Saving job DB end_date as '%s'", self.c_plugin_inst.end_date)
+        self.c_plugin_inst.save()
+        self.schedule_waiting_children_update()
+        self.delete_exec_status_check_marker()
+        return self.c_plugin_inst.status
+
+    def schedule_waiting_children_update(self):
+        """
+        Schedule or cancel the plugin instance's children that are waiting for it
+        once the current DB transaction (that saved its terminal status) is committed.
+        """
+        # imported here as the tasks module depends on this module
+        from plugininstances.tasks import update_waiting_children_plugin_instances
+
+        plg_inst_id = self.c_plugin_inst.id
+        transaction.on_commit(
+            lambda: update_waiting_children_plugin_instances(plg_inst_id))
+
+    def delete_exec_status_check_marker(self):
+        """
+        Delete the marker used to coalesce the checks of the plugin instance's app
+        execution status now that the instance has reached a terminal status.
+        """
+        # imported here as the tasks module depends on this module
+        from plugininstances.tasks import delete_exec_status_check_markers
+
+        delete_exec_status_check_markers([self.c_plugin_inst.id])
+
     def cancel_plugin_instance_app_exec(self):
         """
         Cancel a plugin instance's app execution. It connects to the remote service
@@ -327,6 +476,8 @@ class PluginInstanceManager(object):
         This method sends the JSON 'msg' argument to the remote service.
         """
         remote_url = self.c_plugin_inst.compute_resource.compute_url
+        if self.http_session is not None:
+            return self.call_app_service_with_session(d_msg, remote_url)
         serviceCall = pfurl.Pfurl(
             msg                     = json.dumps(d_msg),
             http                    = remote_url,
@@ -366,6 +517,50 @@ class PluginInstanceManager(object):
             logging.error('fatal error in talking to pfcon service')
         return d_response
 
+    def call_app_service_with_session(self, d_msg, remote_url):
+        """
+        Send the JSON 'msg' argument to the remote service as a control message
+        (same wire format as pfurl) through the pooled connections of the manager's
+        requests session. The response is parsed like pfurl does and a dictionary is
+        returned on success, otherwise the response (or error) string.
+        """
+        logger.info('comms sent to pfcon service at -->%s<-- (pooled)', remote_url)
+        logger.info('message sent: %s', json.dumps(d_msg, indent=4))
+        timeout = getattr(settings, 'COMPUTE_RESOURCE_REQUEST_TIMEOUT', 30)
+        try:
+            r = self.http_session.post(remote_url, data=json.dumps({'payload': d_msg}),
+                                       timeout=timeout)
+            d_response = self.parse_app_service_response(r.text)
+        except requests.RequestException as e:
+            d_response = str(e)
+        if isinstance(d_response, dict):
+            logger.info('looks like we got a successful response from pfcon service')
+            logger.info('response from pfcon: %s', json.dumps(d_response, indent=4))
+        else:
+            logger.info('looks like we got an UNSUCCESSFUL response from pfcon service')
+            logger.info('response from pfcon: -->%s<--', d_response)
+            logger.error('fatal error in talking to pfcon service')
+        return d_response
+
+    @staticmethod
+    def parse_app_service_response(str_response):
+        """
+        Custom static method to parse a raw response from the remote service the same
+        way pfurl does with 'b_httpResponseBodyParse' (the body after the embedded
+        HTTP headers is YAML-loaded). Returns the parsed object (a dictionary on
+        success) or the raw response string if it can not be parsed.
+        """
+        try:
+            str_body = str_response.split('\r\n\r\n')[1]
+            d_body = yaml.load(str_body, Loader=yaml.FullLoader)
+            str_body = json.dumps(d_body)
+        except Exception:
+            str_body = str_response
+        try:
+            return json.loads(str_body)
+        except ValueError:
+            return str_response
+
     def manage_app_service_fsplugin_empty_inputdir(self):
         """
         This method is responsible for managing the 'inputdir' in the case of
@@ -423,10 +618,13 @@ class PluginInstanceManager(object):
         except Exception:
             logger.info('Compute logs not currently available.')
 
-        # update plugin instance with status info
-        self.c_plugin_inst.summary = json.dumps(d_response['jobOperationSummary'])
-        self.c_plugin_inst.raw = self.json_zipToStr(d_response['jobOperation'])
-        self.c_plugin_inst.save()
+        # update plugin instance with status info only if it has changed
+        summary = json.dumps(d_response['jobOperationSummary'])
+        raw = self.json_zipToStr(d_response['jobOperation'])
+        if summary != self.c_plugin_inst.summary or raw != self.c_plugin_inst.raw:
+            self.c_plugin_inst.summary = summary
+            self.c_plugin_inst.raw = raw
+            self.c_plugin_inst.save(update_fields=['summary', 'raw'])
 
         str_responseStatus = ""
         for str_action in ['pushPath', 'compute', 'pullPath', 'swiftPut']:
@@ -484,7 +682,10 @@ class PluginInstanceManager(object):
     def create_zip_file(self, swift_paths):
         """
         Create job zip file ready for transmission to the remote from a list of swift
-        storage paths (prefixes).
+        storage paths (prefixes). Files that can not be downloaded at all are skipped
+        but if a download fails after its zip member was started then the whole zip
+        file is discarded, the plugin instance is marked as 'finishedWithError' and
+        None is returned. Otherwise the path of the zip file is returned.
         """
         if not os.path.exists(self.data_dir):
             try:
@@ -494,23 +695,64 @@ class PluginInstanceManager(object):
                 logger.error(msg)
 
         zipfile_path = os.path.join(self.data_dir, self.str_job_id + '.zip')
+        # already compressed contents are stored as they are instead of deflated again
+        stored_exts = tuple(getattr(settings, 'JOB_ZIP_STORED_EXTENSIONS',
+                                    ('.dcm', '.gz', '.nii.gz', '.zip', '.bz2', '.xz')))
+        max_workers = getattr(settings, 'JOB_ZIP_MAX_WORKERS', 4)
+        b_truncated = False
         with zipfile.ZipFile(zipfile_path, 'w', zipfile.ZIP_DEFLATED) as job_data_zip:
             for swift_path in swift_paths:
-                l_ls = []
+                obj_paths = self.swift_manager.ls_iter(swift_path)
                 try:
-                    l_ls = self.swift_manager.ls(swift_path)
+                    for obj_path, chunks in self.swift_manager.prefetch_objs(
+                            obj_paths, max_workers=max_workers):
+                        try:
+                            first_chunk = next(chunks, b'')
+                        except ClientException as e:
+                            # nothing has been written to the zip file for this file yet
+                            msg = 'Downloading of file %s from swift storage for %s ' \
+                                  'job failed, detail: %s' % (obj_path, self.str_job_id,
+                                                              str(e))
+                            logger.error(msg)
+                            continue
+                        zip_info = zipfile.ZipInfo(obj_path, time.localtime()[:6])
+                        zip_info.external_attr = 0o600 << 16
+                        if obj_path.lower().endswith(stored_exts):
+                            zip_info.compress_type = zipfile.ZIP_STORED
+                        else:
+                            zip_info.compress_type = zipfile.ZIP_DEFLATED
+                        with job_data_zip.open(zip_info, 'w', force_zip64=True) as f:
+                            f.write(first_chunk)
+                            try:
+                                for chunk in chunks:
+                                    f.write(chunk)
+                            except ClientException as e:
+                                msg = 'Downloading of file %s from swift storage for ' \
+                                      '%s job failed, detail: %s' % (obj_path,
+                                                                     self.str_job_id,
+                                                                     str(e))
+                                logger.error(msg)
+                                b_truncated = True
+                        if b_truncated:
+                            break
                 except ClientException as e:
                     msg = 'Listing of swift storage files in %s failed, detail: %s' % (
                     swift_path, str(e))
                     logger.error(msg)
-                for obj_path in l_ls:
-                    try:
-                        contents = self.swift_manager.download_obj(obj_path)
-                    except ClientException as e:
-                        msg = 'Downloading of file %s from swift storage for %s job ' \
-                              'failed, detail: %s' % (obj_path, self.str_job_id, str(e))
-                        logger.error(msg)
-                    job_data_zip.writestr(obj_path, contents)
+                if b_truncated:
+                    break
+
+        if b_truncated:
+            # the zip file has a truncated member so the job can not run on its data
+            os.remove(zipfile_path)
+            self.c_plugin_inst.status = 'finishedWithError'
+            logger.info("Saving job DB status as '%s'", self.c_plugin_inst.status)
+            self.c_plugin_inst.end_date = timezone.now()
+            self.c_plugin_inst.save()
+            self.schedule_waiting_children_update()
+            self.delete_exec_status_check_marker()
+            return None
+        return zipfile_path
 
     @staticmethod
     def json_zipToStr(json_data):
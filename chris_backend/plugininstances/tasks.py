@@ -1,37 +1,54 @@
 
 import logging
-from functools import wraps
+import time
 
+from django.conf import settings
 from django.db.models import Q
 
-from celery import shared_task
+from celery import group, shared_task
 
-from .models import PluginInstance
+from core.models import TaskLease
+from core.utils import skip_if_running
+
+from .models import PluginInstance, TERMINAL_STATUSES
 from .services.manager import PluginInstanceManager
 
 
 logger = logging.getLogger(__name__)
 
 
-def skip_if_running(f):
+def cancel_plugin_instances(queryset):
     """
-    This decorator is supposed to ensure that a task is only running once across all
-    workers.
-    https://stackoverflow.com/questions/20894771/celery-beat-limit-to-single-task-instance-at-a-time
+    Cancel the plugin instances in the passed queryset that are not in a terminal
+    status with a single conditional UPDATE and enqueue in a single batch the
+    cancellation of the remote execution of those that were in 'started' status.
     """
-    task_name = f'{f.__module__}.{f.__name__}'
-    @wraps(f)
-    def wrapped(self, *args, **kwargs):
-        workers = self.app.control.inspect().active()
-        for worker, tasks in workers.items():
-            for task in tasks:
-                if (task_name == task['name'] and tuple(args) == tuple(task['args']) and
-                        kwargs == task['kwargs'] and self.request.id != task['id']):
-                    logger.info('task %s (%s, %s) is running on %s, skipping',
-                                task_name, args, kwargs, worker)
-                    return None
-        return f(self, *args, **kwargs)
-    return wrapped
+    started_ids = PluginInstance.cancel_instances(queryset)
+    if started_ids:
+        delete_exec_status_check_markers(started_ids)
+        group(cancel_plugin_instance.s(plg_inst_id)
+              for plg_inst_id in started_ids).apply_async()
+    return started_ids
+
+
+def update_waiting_children_plugin_instances(plg_inst_id):
+    """
+    Schedule or cancel the plugin instances in 'waitingForPrevious' DB status whose
+    previous plugin instance has just reached a terminal DB status. Children of an
+    instance in 'finishedSuccessfully' status are run right away (in a single batch)
+    while the waiting descendants of an instance in 'finishedWithError' or
+    'cancelled' status are cancelled with a single UPDATE.
+    """
+    plugin_inst = PluginInstance.objects.get(pk=plg_inst_id)
+    if plugin_inst.status == 'finishedSuccessfully':
+        scheduled_ids = PluginInstance.schedule_waiting_instances(
+            PluginInstance.objects.filter(previous_id=plg_inst_id))
+        if scheduled_ids:
+            group(run_plugin_instance.s(inst_id)
+                  for inst_id in scheduled_ids).apply_async()
+    elif plugin_inst.status in ('finishedWithError', 'cancelled'):
+        plugin_inst.get_descendant_instances().filter(
+            status='waitingForPrevious').update(status='cancelled')
 
 
 @shared_task
@@ -45,14 +62,98 @@ def run_plugin_instance(plg_inst_id):
     plg_inst_manager.run_plugin_instance_app()
 
 
+def get_exec_status_check_marker_name(plg_inst_id):
+    """
+    Return the name of the lease that marks a pending (or recently done) check of
+    the execution status of the app corresponding to this plugin instance.
+    """
+    return 'check_plugin_instance_exec_status:%s' % plg_inst_id
+
+
+def delete_exec_status_check_markers(plg_inst_ids):
+    """
+    Delete the status check markers of the passed plugin instances as they are no
+    longer needed once the instances have reached a terminal status.
+    """
+    names = [get_exec_status_check_marker_name(inst_id) for inst_id in plg_inst_ids]
+    TaskLease.objects.filter(name__in=names).delete()
+
+
+def schedule_plugin_instance_exec_status_check(plg_inst_id):
+    """
+    Enqueue a check of the execution status of the app corresponding to this plugin
+    instance unless one is already pending or was done less than
+    PLUGIN_INSTANCE_STATUS_CHECK_COALESCE_WINDOW seconds ago, so concurrent readers
+    share a single check. Returns True if a new check was enqueued.
+    """
+    pending_ttl = getattr(settings, 'PLUGIN_INSTANCE_STATUS_CHECK_PENDING_TTL', 60)
+    marker = TaskLease.acquire(get_exec_status_check_marker_name(plg_inst_id),
+                               pending_ttl)
+    if marker is None:
+        return False
+    check_plugin_instance_exec_status.delay(plg_inst_id, marker)  # call async task
+    return True
+
+
 @shared_task
-def check_plugin_instance_exec_status(plg_inst_id):
+def check_plugin_instance_exec_status(plg_inst_id, status_check_marker=None):
+    """
+    Check the execution status of the app corresponding to this plugin instance. If
+    the check was coalesced through a marker then the marker is kept for the
+    coalescing window after the check or removed if the app is no longer running
+    (markers are also removed on every other terminal transition and the expired
+    ones left behind are purged periodically).
+    """
+    status = None
+    try:
+        plugin_inst = PluginInstance.objects.get(pk=plg_inst_id)
+        plg_inst_manager = PluginInstanceManager(plugin_inst)
+        status = plg_inst_manager.check_plugin_instance_app_exec_status()
+    finally:
+        if status_check_marker is not None:
+            if status in TERMINAL_STATUSES:
+                delete_exec_status_check_markers([plg_inst_id])
+            else:
+                window = getattr(settings,
+                                 'PLUGIN_INSTANCE_STATUS_CHECK_COALESCE_WINDOW', 5)
+                TaskLease.renew(get_exec_status_check_marker_name(plg_inst_id),
+                                status_check_marker, window)
+
+
+@shared_task(bind=True, max_retries=None)
+def register_plugin_instance_output_files(self, plg_inst_id, nobjects=0, deadline=None):
     """
-    Check the execution status of the app corresponding to this plugin instance.
+    Register the output files of a plugin instance in 'registeringFiles' DB status
+    once swift lists at least the number of objects that the remote service reported
+    as pushed (<nobjects>). Until then the task is retried with exponential backoff up
+    to a deadline (seconds since the epoch). Only counts are passed in the task
+    messages, the objects under the output path are counted again on every attempt.
     """
     plugin_inst = PluginInstance.objects.get(pk=plg_inst_id)
+    if plugin_inst.status != 'registeringFiles':
+        return
+    if deadline is None:
+        deadline = time.time() + getattr(settings,
+                                         'REGISTER_OUTPUT_FILES_WAIT_DEADLINE', 30)
+    nmissing = 0
+    if nobjects:
+        nmissing = max(nobjects - plugin_inst.get_output_objects_count(), 0)
+    remaining = deadline - time.time()
+    if nmissing and remaining > 0:
+        countdown = min(plugin_inst.get_output_files_wait_delay(self.request.retries),
+                        remaining)
+        logger.info('%s output objects of plugin instance %s not yet listed by swift, '
+                    'checking again in %.1fs', nmissing, plg_inst_id, countdown)
+        raise self.retry(args=(plg_inst_id, nobjects, deadline), countdown=countdown)
+    if nmissing:
+        logger.error('%s output objects of plugin instance %s were not listed by swift '
+                     'before the deadline', nmissing, plg_inst_id)
+        if getattr(settings, 'STORAGE_BACKEND', 'swift') == 'filesystem':
+            logger.error("The 'filesystem' storage backend is in use but pfcon pushes "
+                         "the output files of plugin instance %s into swift",
+                         plg_inst_id)
     plg_inst_manager = PluginInstanceManager(plugin_inst)
-    plg_inst_manager.check_plugin_instance_app_exec_status()
+    plg_inst_manager.finish_output_files_registration(not nmissing)
 
 
 @shared_task
@@ -70,25 +171,58 @@ def cancel_plugin_instance(plg_inst_id):
 def run_waiting_for_previous_plugin_instances(self):  # task is passed info about itself
     """
     Run the app corresponding to all plugin instances in 'waitingForPrevious' DB status
-    and whom previous plugin instance is in 'finishedSuccessfully' DB status.
+    and whom previous plugin instance is in 'finishedSuccessfully' DB status. Waiting
+    instances are normally run as soon as their previous instance finishes so this
+    periodic task is only a safety net.
     """
     instances = PluginInstance.objects.filter(status='waitingForPrevious',
                                               previous__status='finishedSuccessfully')
-    for plg_inst in instances:
-        plg_inst.status = 'scheduled'
-        plg_inst.save()
-        run_plugin_instance.delay(plg_inst.id)  # call async task
+    # same conditional UPDATE as update_waiting_children_plugin_instances so only one
+    # of them can move a waiting instance to 'scheduled' and enqueue its run
+    for plg_inst_id in PluginInstance.schedule_waiting_instances(instances):
+        run_plugin_instance.delay(plg_inst_id)  # call async task
+
+
+@shared_task(bind=True)
+@skip_if_running
+def check_compute_resource_plugin_instances_exec_status(self, compute_resource_id):
+    """
+    Check the execution status of the apps corresponding to the plugin instances with
+    'started' DB status that run on the passed compute resource and whose next status
+    check is due. The remote service is still queried with one sequential status
+    request per plugin instance (pfcon has no batch status endpoint) but all the
+    requests reuse a single pool of HTTP connections. The expected run time used to
+    schedule the next checks is computed only once per plugin.
+    """
+    instances = PluginInstance.get_due_status_check_instances(
+        PluginInstance.objects.filter(compute_resource_id=compute_resource_id)
+    ).select_related('compute_resource')
+    expected_run_times = {}
+    with PluginInstanceManager.create_http_session() as session:
+        for plg_inst in instances:
+            plg_inst_manager = PluginInstanceManager(
+                plg_inst, http_session=session, expected_run_times=expected_run_times)
+            try:
+                plg_inst_manager.check_plugin_instance_app_exec_status()
+            except Exception as e:
+                logger.error('Error while checking the execution status of plugin '
+                             'instance %s, detail: %s', plg_inst.id, str(e))
 
 
 @shared_task
 def check_started_plugin_instances_exec_status():
     """
-    Check the execution status of the apps corresponding to all the plugin instances
-    with 'started' DB status.
+    Check the execution status of the apps corresponding to the plugin instances with
+    'started' DB status whose next status check is due by enqueuing in a single batch
+    one task per compute resource.
     """
-    instances = PluginInstance.objects.filter(status='started')
-    for plg_inst in instances:
-        check_plugin_instance_exec_status.delay(plg_inst.id)  # call async task
+    instances = PluginInstance.get_due_status_check_instances().filter(
+        compute_resource__isnull=False)
+    compute_resource_ids = list(instances.order_by().values_list(
+        'compute_resource_id', flat=True).distinct())
+    if compute_resource_ids:
+        group(check_compute_resource_plugin_instances_exec_status.s(cr_id)
+              for cr_id in compute_resource_ids).apply_async()
 
 
 @shared_task
@@ -96,13 +230,12 @@ def cancel_waiting_for_previous_plugin_instances():
     """
     Cancel the app corresponding to all plugin instances in 'waitingForPrevious' DB
     status when their previous plugin instance is in either 'finishedWithError' or
-    'cancelled' DB status.
+    'cancelled' DB status. Waiting instances are normally cancelled as soon as their
+    previous instance fails so this periodic task is only a safety net.
     """
     lookup = Q(previous__status='finishedWithError') | Q(previous__status='cancelled')
     instances = PluginInstance.objects.filter(status='waitingForPrevious').filter(lookup)
-    for plg_inst in instances:
-        plg_inst.status = 'cancelled'
-        plg_inst.save()
+    instances.update(status='cancelled')
 
 
 @shared_task  # toy task for testing celery stuff
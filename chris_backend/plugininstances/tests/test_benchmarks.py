@@ -0,0 +1,102 @@
+
+import logging
+import sys
+import time
+
+from django.test import TestCase, tag
+from django.contrib.auth.models import User
+from django.conf import settings
+
+from plugins.models import PluginMeta, Plugin, ComputeResource
+from plugininstances.models import PluginInstance, PluginInstanceFilter
+
+
+COMPUTE_RESOURCE_URL = settings.COMPUTE_RESOURCE_URL
+
+
+@tag('benchmark')
+class PluginInstanceTreeBenchmarkTests(TestCase):
+    """
+    Benchmark the queries on large trees of plugin instances.
+    """
+    # number of plugin instances in the benchmark feed
+    nnodes = 5000
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+
+        user = User.objects.create_user(username='foo', password='foo-pass')
+        (compute_resource, tf) = ComputeResource.objects.get_or_create(
+            name="host", compute_url=COMPUTE_RESOURCE_URL)
+        (pl_meta, tf) = PluginMeta.objects.get_or_create(name='pacspull', type='fs')
+        (plugin_fs, tf) = Plugin.objects.get_or_create(meta=pl_meta, version='0.1')
+        plugin_fs.compute_resources.set([compute_resource])
+        (pl_meta, tf) = PluginMeta.objects.get_or_create(name='mri_convert', type='ds')
+        (plugin_ds, tf) = Plugin.objects.get_or_create(meta=pl_meta, version='0.1')
+        plugin_ds.compute_resources.set([compute_resource])
+        self.root = PluginInstance.objects.create(plugin=plugin_fs, owner=user,
+                                                  compute_resource=compute_resource)
+
+        # build a binary tree below the root instance with bulk inserts, the ids are
+        # explicitly set so the ancestry can be computed before inserting
+        d_ancestry = {1: self.root.ancestry}
+        first_id = self.root.id
+        instances = []
+        for i in range(2, self.nnodes + 1):
+            inst_id = first_id + i - 1
+            previous_id = first_id + i // 2 - 1
+            d_ancestry[i] = d_ancestry[i // 2] + '%s/' % inst_id
+            instances.append(PluginInstance(
+                id=inst_id, previous_id=previous_id, plugin=plugin_ds, owner=user,
+                feed=self.root.feed, compute_resource=compute_resource,
+                cpu_limit=self.root.cpu_limit, memory_limit=self.root.memory_limit,
+                number_of_workers=1, gpu_limit=0, ancestry=d_ancestry[i]))
+        PluginInstance.objects.bulk_create(instances, batch_size=500)
+        # an instance in the middle of the tree
+        self.node = PluginInstance.objects.get(pk=first_id + 1)
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def benchmark(self, name, f):
+        """
+        Run the passed function, assert it makes a single DB query and report its
+        elapsed time.
+        """
+        start = time.monotonic()
+        with self.assertNumQueries(1):
+            result = f()
+        elapsed = time.monotonic() - start
+        sys.stderr.write('\n%s (%s nodes): %s rows in %.1fms ' % (
+            name, self.nnodes, len(result), elapsed * 1000))
+        return result
+
+    def test_get_descendant_instances(self):
+        descendants = self.benchmark(
+            'get_descendant_instances',
+            lambda: list(self.root.get_descendant_instances()))
+        self.assertEqual(len(descendants), self.nnodes)
+        # every instance comes before its descendants
+        self.assertEqual(descendants[0], self.root)
+        descendants = self.benchmark(
+            'get_descendant_instances (subtree)',
+            lambda: list(self.node.get_descendant_instances()))
+        # the left subtree of the binary tree (heap indexes starting with 0b10)
+        self.assertEqual(len(descendants), len([i for i in range(2, self.nnodes + 1)
+                                                if bin(i).startswith('0b10')]))
+
+    def test_filter_by_root_id(self):
+        filter = PluginInstanceFilter()
+        filtered = self.benchmark(
+            'filter_by_root_id',
+            lambda: list(filter.filter_by_root_id(PluginInstance.objects.all(), '',
+                                                  self.root.id)))
+        self.assertEqual(len(filtered), self.nnodes)
+
+    def test_get_ancestor_instances(self):
+        leaf = PluginInstance.objects.get(pk=self.root.id + self.nnodes - 1)
+        ancestors = self.benchmark('get_ancestor_instances',
+                                   lambda: list(leaf.get_ancestor_instances()))
+        self.assertEqual(len(ancestors), self.nnodes.bit_length())
@@ -1,23 +1,46 @@
 
 import logging
 import os
+import json
 import io
+import shutil
+import tempfile
 import time
+import zipfile
 from unittest import mock
 
 from django.test import TestCase, tag
 from django.contrib.auth.models import User
 from django.conf import settings
 
-from core.swiftmanager import SwiftManager
+from core.swiftmanager import SwiftManager, ClientException
 from plugins.models import PluginMeta, Plugin
 from plugins.models import PluginParameter
 from plugininstances.models import PluginInstance, PathParameter, ComputeResource
 from plugininstances.services.manager import PluginInstanceManager
+from plugininstances.tasks import register_plugin_instance_output_files
 
 
 COMPUTE_RESOURCE_URL = settings.COMPUTE_RESOURCE_URL
 
+# status response recorded from pfcon (the HTTP headers are embedded in the body)
+PFCON_RAW_STATUS_RESPONSE = (
+    'HTTP/1.1 200 OK\r\n'
+    'Content-Type: application/json\r\n'
+    'Server: pfcon\r\n'
+    '\r\n'
+    '{"action": "status", "status": true, '
+    '"jobOperation": {"info": {"compute": {"return": {"status": true, '
+    '"l_status": ["started"]}}}}, '
+    '"jobOperationSummary": {'
+    '"pushPath": {"status": true}, '
+    '"compute": {"submit": {"status": true}, '
+    '"return": {"status": true, "l_status": ["started"], '
+    '"l_logs": ["running mri_convert\\n"]}}, '
+    '"pullPath": {"status": false}, '
+    '"swiftPut": {"status": false}}}\n'
+)
+
 
 class PluginInstanceManagerTests(TestCase):
     
@@ -104,6 +127,180 @@ class PluginInstanceManagerTests(TestCase):
             self.assertEqual(pl_inst.status, 'started')
             call_app_service_mock.assert_called_once()
 
+    def test_mananger_can_call_app_service_through_http_session(self):
+        """
+        Test whether the manager sends control messages to the remote service through
+        the pooled connections of a shared HTTP session.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        (pl_inst, tf) = PluginInstance.objects.get_or_create(
+            plugin=plugin, owner=user,
+            compute_resource=plugin.compute_resources.all()[0])
+        session = mock.Mock()
+        session.post.return_value.text = json.dumps({'status': True})
+        with mock.patch('plugininstances.services.manager.pfurl.Pfurl') as pfurl_mock:
+            plg_inst_manager = PluginInstanceManager(pl_inst, http_session=session)
+            d_msg = {'action': 'status', 'meta': {'remote': {'key': 'chris-jid-1'}}}
+            d_response = plg_inst_manager.call_app_service(d_msg)
+            self.assertEqual(d_response, {'status': True})
+            pfurl_mock.assert_not_called()
+        session.post.assert_called_once_with(COMPUTE_RESOURCE_URL,
+                                             data=json.dumps({'payload': d_msg}),
+                                             timeout=mock.ANY)
+        self.assertEqual(PluginInstanceManager.create_http_session().headers['Mode'],
+                         'control')
+
+    def test_mananger_parses_raw_app_service_response_like_pfurl(self):
+        """
+        Test whether the manager parses a raw pfcon response received through a
+        shared HTTP session (HTTP headers embedded in the body) like pfurl does and
+        keeps the job started without failing when the response can't be parsed.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        (pl_inst, tf) = PluginInstance.objects.get_or_create(
+            plugin=plugin, owner=user, status='started',
+            compute_resource=plugin.compute_resources.all()[0])
+        session = mock.Mock()
+        session.post.return_value.text = PFCON_RAW_STATUS_RESPONSE
+        plg_inst_manager = PluginInstanceManager(pl_inst, http_session=session)
+        with mock.patch.object(PluginInstanceManager, 'handle_app_remote_error'):
+            status = plg_inst_manager.check_plugin_instance_app_exec_status()
+        self.assertEqual(status, 'started')
+        pl_inst.refresh_from_db()
+        self.assertEqual(json.loads(pl_inst.summary)['compute']['return']['l_status'],
+                         ['started'])
+
+        session.post.return_value.text = '<html>502 Bad Gateway</html>'
+        status = plg_inst_manager.check_plugin_instance_app_exec_status()
+        self.assertEqual(status, 'started')
+        self.assertIsNotNone(pl_inst.next_status_check_at)
+
+    def test_mananger_updates_waiting_children_when_registration_finishes(self):
+        """
+        Test whether the manager schedules the update of the waiting children of a
+        plugin instance on commit once its output files registration finishes.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        (pl_inst, tf) = PluginInstance.objects.get_or_create(
+            plugin=plugin, owner=user,
+            compute_resource=plugin.compute_resources.all()[0])
+        plg_inst_manager = PluginInstanceManager(pl_inst)
+        with mock.patch.object(PluginInstance, 'register_output_files',
+                               return_value={'status': True}), \
+                mock.patch('plugininstances.services.manager.transaction.on_commit'
+                           ) as on_commit_mock, \
+                mock.patch('plugininstances.tasks.'
+                           'update_waiting_children_plugin_instances') as update_mock:
+            status = plg_inst_manager.finish_output_files_registration(True)
+            self.assertEqual(status, 'finishedSuccessfully')
+            on_commit_mock.assert_called_once()
+            update_mock.assert_not_called()
+            # run the on_commit hook
+            on_commit_mock.call_args[0][0]()
+            update_mock.assert_called_with(pl_inst.id)
+
+    def test_mananger_can_copy_unextpath_parameter_objects(self):
+        """
+        Test whether the manager copies all the objects under the paths of 'unextpath'
+        parameters into the plugin instance's output dir and records the progress.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        (pl_inst, tf) = PluginInstance.objects.get_or_create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        outputdir = pl_inst.get_output_path()
+        ld_obj = [{'name': 'foo/uploads/dir/file1.txt', 'bytes': 10},
+                  {'name': 'foo/uploads/dir/file2.txt', 'bytes': 20}]
+        plg_inst_manager = PluginInstanceManager(pl_inst)
+        with mock.patch.object(SwiftManager, 'ls_pages',
+                               return_value=[ld_obj]) as ls_pages_mock:
+            with mock.patch.object(SwiftManager, 'copy_obj',
+                                   return_value=None) as copy_obj_mock:
+                plg_inst_manager.handle_app_unextpath_parameters(
+                    {'dir': 'foo/uploads/dir'})
+                ls_pages_mock.assert_called_with('foo/uploads/dir', details=True)
+                self.assertEqual(copy_obj_mock.call_count, 2)
+                copy_obj_mock.assert_any_call('foo/uploads/dir/file1.txt',
+                                              outputdir + '/file1.txt')
+        pl_inst.refresh_from_db()
+        self.assertEqual(pl_inst.unextpath_objects_total, 2)
+        self.assertEqual(pl_inst.unextpath_objects_copied, 2)
+        self.assertEqual(pl_inst.unextpath_bytes_copied, 30)
+
+    def test_mananger_can_create_zip_file(self):
+        """
+        Test whether the manager creates the job zip file with the contents of the
+        objects under the passed swift paths storing already compressed files as they
+        are.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        (pl_inst, tf) = PluginInstance.objects.get_or_create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        plg_inst_manager = PluginInstanceManager(pl_inst)
+        plg_inst_manager.data_dir = tempfile.mkdtemp()
+        d_contents = {'foo/uploads/file1.txt': [b'text ', b'file'],
+                      'foo/uploads/file2.nii.gz': [b'compressed']}
+
+        def stream_obj(obj_path, chunk_size=65536):
+            return {}, (chunk for chunk in d_contents[obj_path])
+
+        try:
+            with mock.patch.object(SwiftManager, 'ls_iter',
+                                   return_value=iter(sorted(d_contents))):
+                with mock.patch.object(SwiftManager, 'stream_obj',
+                                       side_effect=stream_obj):
+                    plg_inst_manager.create_zip_file(['foo/uploads'])
+            zipfile_path = os.path.join(plg_inst_manager.data_dir,
+                                        plg_inst_manager.str_job_id + '.zip')
+            with zipfile.ZipFile(zipfile_path) as job_data_zip:
+                self.assertEqual(job_data_zip.read('foo/uploads/file1.txt'),
+                                 b'text file')
+                self.assertEqual(job_data_zip.read('foo/uploads/file2.nii.gz'),
+                                 b'compressed')
+                self.assertEqual(
+                    job_data_zip.getinfo('foo/uploads/file1.txt').compress_type,
+                    zipfile.ZIP_DEFLATED)
+                self.assertEqual(
+                    job_data_zip.getinfo('foo/uploads/file2.nii.gz').compress_type,
+                    zipfile.ZIP_STORED)
+        finally:
+            shutil.rmtree(plg_inst_manager.data_dir)
+
+    def test_mananger_discards_zip_file_with_truncated_member(self):
+        """
+        Test whether the manager discards the job zip file and marks the plugin
+        instance as errored when a download fails after its zip member was started.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        (pl_inst, tf) = PluginInstance.objects.get_or_create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        plg_inst_manager = PluginInstanceManager(pl_inst)
+        plg_inst_manager.data_dir = tempfile.mkdtemp()
+
+        def chunks():
+            yield b'text '
+            raise ClientException('connection reset')
+
+        try:
+            with mock.patch.object(SwiftManager, 'ls_iter',
+                                   return_value=iter(['foo/uploads/file1.txt'])):
+                with mock.patch.object(SwiftManager, 'stream_obj',
+                                       return_value=({}, chunks())):
+                    with mock.patch.object(PluginInstanceManager,
+                                           'schedule_waiting_children_update'):
+                        zipfile_path = plg_inst_manager.create_zip_file(['foo/uploads'])
+            self.assertIsNone(zipfile_path)
+            self.assertEqual(os.listdir(plg_inst_manager.data_dir), [])
+            pl_inst.refresh_from_db()
+            self.assertEqual(pl_inst.status, 'finishedWithError')
+        finally:
+            shutil.rmtree(plg_inst_manager.data_dir)
+
     @tag('integration')
     def test_integration_mananger_can_run_registered_plugin_app(self):
         """
@@ -222,6 +419,12 @@ class PluginInstanceManagerTests(TestCase):
         time.sleep(10)
         while b_checkAgain:
             str_responseStatus = plg_inst_manager.check_plugin_instance_app_exec_status()
+            if str_responseStatus == 'registeringFiles':
+                # the on_commit hook that schedules the registration task is never
+                # run within a test case so the task is run synchronously here
+                register_plugin_instance_output_files.apply(args=(pl_inst.id,))
+                pl_inst.refresh_from_db()
+                str_responseStatus = pl_inst.status
             if str_responseStatus == 'finishedSuccessfully':
                 b_checkAgain = False
             elif currentLoop < maxLoopTries:
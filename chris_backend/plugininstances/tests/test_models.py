@@ -2,11 +2,15 @@
 import logging
 import os
 import io
+from datetime import timedelta
 from unittest import mock
 
+from django.db import connection
 from django.test import TestCase, tag
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 from feeds.models import Feed
 from plugins.models import PluginMeta, Plugin
@@ -14,7 +18,7 @@ from plugins.models import ComputeResource
 from plugins.models import PluginParameter, DefaultStrParameter
 from plugininstances.models import PluginInstance, PluginInstanceFile
 from plugininstances.models import PluginInstanceFilter
-from plugininstances.models import SwiftManager
+from core.swiftmanager import SwiftManager
 
 
 COMPUTE_RESOURCE_URL = settings.COMPUTE_RESOURCE_URL
@@ -106,6 +110,24 @@ class PluginInstanceModelTests(ModelTests):
         # the new 'ds' plugin instance shouldn't create a new feed
         self.assertEqual(Feed.objects.count(), 1)
 
+    def test_save_raises_validation_error_if_plugin_instance_tree_is_too_deep(self):
+        """
+        Test whether overriden save method raises a ValidationError and doesn't leave a
+        new 'ds' plugin instance in the DB when its ancestry doesn't fit in its column.
+        """
+        # create a 'fs' plugin instance
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        plg_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        plg_inst.ancestry = '/' + '1/' * 512
+        plugin = Plugin.objects.get(meta__name=self.plugin_ds_name)
+        with self.assertRaises(ValidationError):
+            PluginInstance.objects.create(
+                plugin=plugin, owner=user, previous=plg_inst,
+                compute_resource=plugin.compute_resources.all()[0])
+        self.assertEqual(PluginInstance.objects.count(), 1)
+
     def test_get_root_instance(self):
         """
         Test whether custom get_root_instance method returns the root 'fs' plugin 
@@ -151,6 +173,60 @@ class PluginInstanceModelTests(ModelTests):
         self.assertEqual(decend_instances[1], plg_inst1)
         self.assertEqual(decend_instances[2], plg_inst2)
 
+    def test_cancel_instances(self):
+        """
+        Test whether custom cancel_instances method cancels the plugin instances in a
+        queryset that are not in a terminal status and returns the started ones.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        plg_inst_root = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        plugin = Plugin.objects.get(meta__name=self.plugin_ds_name)
+        d_instances = {}
+        for status in ('started', 'finishedSuccessfully', 'waitingForPrevious'):
+            d_instances[status] = PluginInstance.objects.create(
+                plugin=plugin, owner=user, previous=plg_inst_root, status=status,
+                compute_resource=plugin.compute_resources.all()[0])
+        PluginInstance.objects.filter(pk=plg_inst_root.id).update(
+            status='finishedWithError')
+
+        started_ids = PluginInstance.cancel_instances(
+            plg_inst_root.get_descendant_instances())
+        self.assertEqual(started_ids, [d_instances['started'].id])
+        statuses = dict(plg_inst_root.get_descendant_instances().values_list('id',
+                                                                             'status'))
+        self.assertEqual(statuses, {plg_inst_root.id: 'finishedWithError',
+                                    d_instances['started'].id: 'cancelled',
+                                    d_instances['finishedSuccessfully'].id:
+                                        'finishedSuccessfully',
+                                    d_instances['waitingForPrevious'].id: 'cancelled'})
+
+    def test_schedule_waiting_instances(self):
+        """
+        Test whether custom schedule_waiting_instances method schedules the plugin
+        instances in a queryset that are waiting for their previous instance and
+        returns their ids only once.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        plg_inst_root = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        plugin = Plugin.objects.get(meta__name=self.plugin_ds_name)
+        d_instances = {}
+        for status in ('started', 'waitingForPrevious'):
+            d_instances[status] = PluginInstance.objects.create(
+                plugin=plugin, owner=user, previous=plg_inst_root, status=status,
+                compute_resource=plugin.compute_resources.all()[0])
+        queryset = PluginInstance.objects.filter(previous=plg_inst_root)
+
+        scheduled_ids = PluginInstance.schedule_waiting_instances(queryset)
+        self.assertEqual(scheduled_ids, [d_instances['waitingForPrevious'].id])
+        self.assertEqual(dict(queryset.values_list('id', 'status')),
+                         {d_instances['started'].id: 'started',
+                          d_instances['waitingForPrevious'].id: 'scheduled'})
+        self.assertEqual(PluginInstance.schedule_waiting_instances(queryset), [])
+
     def test_get_output_path(self):
         """
         Test whether custom get_output_path method returns appropriate output paths
@@ -185,6 +261,35 @@ class PluginInstanceModelTests(ModelTests):
                                                             pl_inst_ds.id))
         self.assertEqual(pl_inst_ds.get_output_path(), ds_output_path)
 
+    def test_save_stores_output_path(self):
+        """
+        Test whether overriden save method stores the output path of a new plugin
+        instance without walking the whole chain of previous instances.
+        """
+        user = User.objects.get(username=self.username)
+        plugin_fs = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        pl_inst_fs = PluginInstance.objects.create(
+            plugin=plugin_fs, owner=user,
+            compute_resource=plugin_fs.compute_resources.all()[0])
+        plugin_ds = Plugin.objects.get(meta__name=self.plugin_ds_name)
+        pl_inst_ds1 = PluginInstance.objects.create(
+            plugin=plugin_ds, owner=user, previous=pl_inst_fs,
+            compute_resource=plugin_ds.compute_resources.all()[0])
+        # a 'ds' instance owned by another user outputs files under its own user dir
+        other = User.objects.create_user(username='bar', password='bar-pass')
+        pl_inst_ds1 = PluginInstance.objects.get(pk=pl_inst_ds1.id)
+        # the 4 queries plus the savepoint and its release
+        with self.assertNumQueries(6):
+            pl_inst_ds2 = PluginInstance.objects.create(
+                plugin=plugin_ds, owner=other, previous=pl_inst_ds1,
+                compute_resource=plugin_ds.compute_resources.all()[0])
+        output_path = 'bar/feed_{0}/{1}_{2}/{3}_{4}/{3}_{5}/data'.format(
+            pl_inst_fs.feed.id, self.plugin_fs_name, pl_inst_fs.id, self.plugin_ds_name,
+            pl_inst_ds1.id, pl_inst_ds2.id)
+        self.assertEqual(pl_inst_ds2.output_path, output_path)
+        self.assertEqual(PluginInstance.objects.get(pk=pl_inst_ds2.id).output_path,
+                         output_path)
+
     def test_register_output_files(self):
         """
         Test whether custom register_output_files method properly registers a plugin's
@@ -196,16 +301,226 @@ class PluginInstanceModelTests(ModelTests):
         pl_inst = PluginInstance.objects.create(
             plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
         output_path = pl_inst.get_output_path()
-        object_list = [output_path + '/file1.txt']
+        object_list = [{'name': output_path + '/file1.txt', 'bytes': 9,
+                        'hash': '8f9bd0cbb4a1d8fd6b84d4d1ad1d0bd9',
+                        'content_type': 'text/plain',
+                        'last_modified': '2020-10-06T13:09:01.123456'}]
 
-        with mock.patch.object(SwiftManager, 'ls', return_value=object_list) as ls_mock:
+        with mock.patch.object(SwiftManager, 'ls_iter',
+                               return_value=iter(object_list)) as ls_iter_mock:
             pl_inst.register_output_files(
                 swiftState={'d_swiftstore': {'filesPushed': 1}}
             )
-            ls_mock.assert_called_with(output_path)
+            ls_iter_mock.assert_called_with(output_path, details=True)
             self.assertEqual(PluginInstanceFile.objects.count(), 1)
             plg_inst_file = PluginInstanceFile.objects.get(plugin_inst=pl_inst)
             self.assertEqual(plg_inst_file.fname.name, output_path + '/file1.txt')
+            self.assertEqual(plg_inst_file.fsize, 9)
+            self.assertEqual(plg_inst_file.checksum, '8f9bd0cbb4a1d8fd6b84d4d1ad1d0bd9')
+            self.assertEqual(plg_inst_file.content_type, 'text/plain')
+            self.assertEqual(plg_inst_file.last_modified.year, 2020)
+
+    def test_register_output_files_skips_already_registered_files(self):
+        """
+        Test whether custom register_output_files method only registers the output
+        files that are not registered yet.
+        """
+        # create an 'fs' plugin instance
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        pl_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        output_path = pl_inst.get_output_path()
+        PluginInstanceFile.objects.create(plugin_inst=pl_inst,
+                                          fname=output_path + '/file1.txt')
+        object_list = [{'name': output_path + '/file%s.txt' % i, 'bytes': 9}
+                       for i in range(1, 4)]
+
+        with self.settings(REGISTER_OUTPUT_FILES_BATCH_SIZE=1):
+            with mock.patch.object(SwiftManager, 'ls_iter',
+                                   return_value=iter(object_list)):
+                d = pl_inst.register_output_files(
+                    swiftState={'d_swiftstore': {'filesPushed': 3}})
+        self.assertEqual(d['total'], 3)
+        self.assertEqual(d['registered'], 2)
+        self.assertEqual(PluginInstanceFile.objects.count(), 3)
+        # only the newly registered files are added to the storage usage counters
+        feed = Feed.objects.get(pk=pl_inst.feed.id)
+        self.assertEqual((feed.files_count, feed.files_size), (2, 18))
+        self.assertEqual((user.storage_usage.files_count, user.storage_usage.files_size),
+                         (2, 18))
+
+    def test_register_output_files_only_counts_inserted_files(self):
+        """
+        Test whether custom register_output_files method doesn't count the files that
+        were registered by a concurrent registration after the registered names were
+        fetched (their INSERT is ignored).
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        pl_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        output_path = pl_inst.get_output_path()
+
+        def ls_iter(*args, **kwargs):
+            yield {'name': output_path + '/file1.txt', 'bytes': 9}
+            # a concurrent registration inserts file2.txt at this point
+            PluginInstanceFile.objects.create(plugin_inst=pl_inst,
+                                              fname=output_path + '/file2.txt')
+            yield {'name': output_path + '/file2.txt', 'bytes': 9}
+
+        with mock.patch.object(SwiftManager, 'ls_iter', side_effect=ls_iter):
+            d = pl_inst.register_output_files(
+                swiftState={'d_swiftstore': {'filesPushed': 2}})
+        self.assertEqual(d['total'], 2)
+        self.assertEqual(d['registered'], 1)
+        self.assertEqual(PluginInstanceFile.objects.count(), 2)
+        # the ignored file is not added to the storage usage counters
+        feed = Feed.objects.get(pk=pl_inst.feed.id)
+        self.assertEqual((feed.files_count, feed.files_size), (1, 9))
+        user.storage_usage.refresh_from_db()
+        self.assertEqual((user.storage_usage.files_count, user.storage_usage.files_size),
+                         (1, 9))
+
+    def test_register_output_files_lists_storage_outside_transactions(self):
+        """
+        Test whether custom register_output_files method consumes the storage listing
+        outside any transaction and commits every batch in its own transaction.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        pl_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        output_path = pl_inst.get_output_path()
+        # the test case itself runs within transactions
+        ntransactions = len(connection.savepoint_ids)
+        l_ntransactions = []
+        l_files_count = []
+
+        def ls_iter(*args, **kwargs):
+            for i in range(3):
+                l_ntransactions.append(len(connection.savepoint_ids))
+                l_files_count.append(Feed.objects.get(pk=pl_inst.feed.id).files_count)
+                yield {'name': output_path + '/file%s.txt' % i, 'bytes': 9}
+
+        with self.settings(REGISTER_OUTPUT_FILES_BATCH_SIZE=2):
+            with mock.patch.object(SwiftManager, 'ls_iter', side_effect=ls_iter):
+                d = pl_inst.register_output_files(
+                    swiftState={'d_swiftstore': {'filesPushed': 3}})
+        self.assertEqual(d['registered'], 3)
+        self.assertEqual(l_ntransactions, [ntransactions] * 3)
+        # the first batch is counted before the listing goes on
+        self.assertEqual(l_files_count, [0, 0, 2])
+
+    def test_remove_storage_usage(self):
+        """
+        Test whether custom remove_storage_usage method subtracts the passed files from
+        their feed's and owner's storage usage counters.
+        """
+        # create an 'fs' plugin instance
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        pl_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        output_path = pl_inst.get_output_path()
+        object_list = [{'name': output_path + '/file%s.txt' % i, 'bytes': 10 * i}
+                       for i in range(1, 4)]
+        with mock.patch.object(SwiftManager, 'ls_iter', return_value=iter(object_list)):
+            pl_inst.register_output_files()
+
+        PluginInstanceFile.remove_storage_usage(
+            pl_inst.files.filter(fname__in=[output_path + '/file1.txt',
+                                            output_path + '/file3.txt']))
+        feed = Feed.objects.get(pk=pl_inst.feed.id)
+        self.assertEqual((feed.files_count, feed.files_size), (1, 20))
+        user.storage_usage.refresh_from_db()
+        self.assertEqual((user.storage_usage.files_count, user.storage_usage.files_size),
+                         (1, 20))
+
+    def test_get_output_objects_count(self):
+        """
+        Test whether custom get_output_objects_count method counts the objects listed
+        under the plugin instance's output path.
+        """
+        # create an 'fs' plugin instance
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        pl_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        output_path = pl_inst.get_output_path()
+        pages = [[output_path + '/file2.txt', output_path + '/file3.txt'],
+                 [output_path + '/file4.txt']]
+
+        with mock.patch.object(SwiftManager, 'ls_pages',
+                               return_value=iter(pages)) as ls_pages_mock:
+            self.assertEqual(pl_inst.get_output_objects_count(), 3)
+            ls_pages_mock.assert_called_with(output_path)
+
+    def test_get_expected_run_time(self):
+        """
+        Test whether custom get_expected_run_time method returns the average run time
+        of the instances of the same plugin that finished successfully.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        pl_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        self.assertIsNone(pl_inst.get_expected_run_time())
+        now = timezone.now()
+        for (status, run_time) in (('finishedSuccessfully', 100),
+                                   ('finishedSuccessfully', 200),
+                                   ('finishedWithError', 5)):
+            inst = PluginInstance.objects.create(
+                plugin=plugin, owner=user, status=status,
+                compute_resource=plugin.compute_resources.all()[0])
+            PluginInstance.objects.filter(pk=inst.id).update(
+                start_date=now - timedelta(seconds=run_time), end_date=now)
+        self.assertEqual(pl_inst.get_expected_run_time(), 150)
+
+    def test_get_next_status_check_delay(self):
+        """
+        Test whether custom get_next_status_check_delay method waits for the expected
+        run time and backs off exponentially afterwards within the configured bounds.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        pl_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        with self.settings(PLUGIN_INSTANCE_STATUS_CHECK_MIN_DELAY=10,
+                           PLUGIN_INSTANCE_STATUS_CHECK_MAX_DELAY=300,
+                           PLUGIN_INSTANCE_STATUS_CHECK_BACKOFF_FACTOR=0.5):
+            pl_inst.start_date = timezone.now() - timedelta(seconds=100)
+            self.assertAlmostEqual(pl_inst.get_next_status_check_delay(), 50, places=0)
+            self.assertAlmostEqual(pl_inst.get_next_status_check_delay(160), 60,
+                                   places=0)
+            self.assertAlmostEqual(pl_inst.get_next_status_check_delay(105), 10,
+                                   places=0)
+            pl_inst.start_date = timezone.now() - timedelta(seconds=2)
+            self.assertEqual(pl_inst.get_next_status_check_delay(), 10)
+            pl_inst.start_date = timezone.now() - timedelta(hours=12)
+            self.assertEqual(pl_inst.get_next_status_check_delay(), 300)
+
+    def test_get_due_status_check_instances(self):
+        """
+        Test whether custom get_due_status_check_instances method only returns the
+        started instances whose next status check is due.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        d_instances = {}
+        for (name, status, next_check) in (
+                ('never_checked', 'started', None),
+                ('due', 'started', timezone.now() - timedelta(seconds=1)),
+                ('not_due', 'started', timezone.now() + timedelta(seconds=60)),
+                ('finished', 'finishedSuccessfully', None)):
+            d_instances[name] = PluginInstance.objects.create(
+                plugin=plugin, owner=user, status=status,
+                next_status_check_at=next_check,
+                compute_resource=plugin.compute_resources.all()[0])
+        due_ids = set(PluginInstance.get_due_status_check_instances().values_list(
+            'id', flat=True))
+        self.assertEqual(due_ids, {d_instances['never_checked'].id,
+                                   d_instances['due'].id})
 
     @tag('integration')
     def test_integration_register_output_files(self):
@@ -268,3 +583,17 @@ class PluginInstanceFilterModelTests(ModelTests):
         self.assertEqual(len(filtered_queryset), 2)
         self.assertEqual(filtered_queryset[0], plg_inst1)
         self.assertEqual(filtered_queryset[1], plg_inst2)
+
+    def test_filter_by_root_id_returns_empty_queryset_if_root_does_not_exist(self):
+        """
+        Test whether custom filter_by_root_id method returns an empty queryset when the
+        root plugin instance doesn't exist.
+        """
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name=self.plugin_fs_name)
+        plg_inst = PluginInstance.objects.create(
+            plugin=plugin, owner=user, compute_resource=plugin.compute_resources.all()[0])
+        queryset = PluginInstance.objects.all()
+        filter = PluginInstanceFilter()
+        filtered_queryset = filter.filter_by_root_id(queryset, "", plg_inst.id + 1)
+        self.assertEqual(len(filtered_queryset), 0)
@@ -9,7 +9,7 @@ from rest_framework import serializers
 
 from plugins.models import PluginMeta, Plugin, PluginParameter, ComputeResource
 from plugininstances.models import PluginInstance
-from plugininstances.serializers import SwiftManager
+from core.swiftmanager import SwiftManager
 from plugininstances.serializers import PluginInstanceSerializer
 from plugininstances.serializers import (PathParameterSerializer,
                                          UnextpathParameterSerializer)
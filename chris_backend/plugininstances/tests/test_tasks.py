@@ -1,10 +1,14 @@
 
 import logging
+from datetime import timedelta
 from unittest import mock, skip
 
 from django.test import TestCase, tag
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.utils import timezone
+
+from celery.exceptions import Retry
 
 from plugins.models import PluginMeta, Plugin, ComputeResource
 from plugininstances.models import PluginInstance
@@ -77,10 +81,157 @@ class PluginInstanceTasksTests(TasksTests):
             check_exec_status_mock.assert_called_with()
 
     def test_task_check_started_plugin_instances_exec_status(self):
-        with mock.patch.object(tasks.check_plugin_instance_exec_status, 'delay',
-                               return_value=None) as delay_mock:
-            tasks.check_started_plugin_instances_exec_status()
-
-            # check that the check_plugin_instance_exec_status task was called with appropriate args
-            delay_mock.assert_called_with(self.plg_inst.id)
+        user = User.objects.get(username=self.username)
+        PluginInstance.objects.create(plugin=self.plg_inst.plugin, owner=user,
+                                      compute_resource=self.compute_resource,
+                                      status='started')
+        with mock.patch.object(tasks, 'group') as group_mock:
+            with mock.patch.object(
+                    tasks.check_compute_resource_plugin_instances_exec_status,
+                    's') as s_mock:
+                tasks.check_started_plugin_instances_exec_status()
+                list(group_mock.call_args[0][0])
+
+            # check that a single task was enqueued for the compute resource
+            s_mock.assert_called_once_with(self.compute_resource.id)
+            group_mock.return_value.apply_async.assert_called_once_with()
             self.assertEqual(self.plg_inst.status, 'started')
+
+    def test_task_check_started_plugin_instances_exec_status_skips_not_due(self):
+        self.plg_inst.next_status_check_at = timezone.now() + timedelta(seconds=60)
+        self.plg_inst.save()
+        with mock.patch.object(tasks, 'group') as group_mock:
+            tasks.check_started_plugin_instances_exec_status()
+            group_mock.assert_not_called()
+
+    def test_task_check_compute_resource_plugin_instances_exec_status_backs_off(self):
+        with mock.patch.object(tasks.PluginInstanceManager, 'call_app_service',
+                               ) as call_mock:
+            with mock.patch.object(tasks.PluginInstanceManager,
+                                   'serialize_app_response_status', return_value=''):
+                d_response = {'jobOperationSummary': {'compute': {'return': {
+                    'l_status': ['started']}}}}
+                call_mock.return_value = d_response
+                tasks.check_compute_resource_plugin_instances_exec_status(
+                    self.compute_resource.id)
+                # the job is not checked again before its next status check is due
+                tasks.check_compute_resource_plugin_instances_exec_status(
+                    self.compute_resource.id)
+                call_mock.assert_called_once()
+        self.plg_inst.refresh_from_db()
+        self.assertEqual(self.plg_inst.status, 'started')
+        self.assertGreater(self.plg_inst.next_status_check_at, timezone.now())
+
+    def test_task_check_compute_resource_plugin_instances_exec_status_run_time(self):
+        user = User.objects.get(username=self.username)
+        PluginInstance.objects.create(plugin=self.plg_inst.plugin, owner=user,
+                                      compute_resource=self.compute_resource,
+                                      status='started')
+        d_response = {'jobOperationSummary': {'compute': {'return': {
+            'l_status': ['started']}}}}
+        with mock.patch.object(tasks.PluginInstanceManager, 'call_app_service',
+                               return_value=d_response), \
+                mock.patch.object(tasks.PluginInstanceManager,
+                                  'serialize_app_response_status', return_value=''), \
+                mock.patch.object(PluginInstance, 'get_expected_run_time',
+                                  return_value=None) as run_time_mock:
+            tasks.check_compute_resource_plugin_instances_exec_status(
+                self.compute_resource.id)
+            # the plugin's run time history is only queried once for both instances
+            run_time_mock.assert_called_once_with()
+
+    def test_task_check_compute_resource_plugin_instances_exec_status(self):
+        with mock.patch.object(tasks.PluginInstanceManager,
+                               'check_plugin_instance_app_exec_status',
+                               side_effect=[ValueError('oops'), None]) as check_mock:
+            with mock.patch.object(tasks.PluginInstanceManager, 'create_http_session',
+                                   return_value=mock.MagicMock()) as session_mock:
+                user = User.objects.get(username=self.username)
+                PluginInstance.objects.create(plugin=self.plg_inst.plugin, owner=user,
+                                              compute_resource=self.compute_resource,
+                                              status='started')
+                tasks.check_compute_resource_plugin_instances_exec_status(
+                    self.compute_resource.id)
+
+                # a single HTTP session is shared and an error doesn't stop the loop
+                session_mock.assert_called_once_with()
+                self.assertEqual(check_mock.call_count, 2)
+
+    def test_task_register_plugin_instance_output_files_retries_while_missing(self):
+        self.plg_inst.status = 'registeringFiles'
+        self.plg_inst.save()
+        with mock.patch.object(PluginInstance, 'get_output_objects_count',
+                               return_value=1) as count_mock:
+            with mock.patch.object(tasks.register_plugin_instance_output_files,
+                                   'retry', side_effect=Retry()) as retry_mock:
+                with self.assertRaises(Retry):
+                    tasks.register_plugin_instance_output_files(self.plg_inst.id, 2,
+                                                                1e12)
+                count_mock.assert_called_with()
+                # only the number of objects is passed to the retried task
+                retry_mock.assert_called_with(args=(self.plg_inst.id, 2, 1e12),
+                                              countdown=0.2)
+
+    def test_task_register_plugin_instance_output_files_finishes_registration(self):
+        self.plg_inst.status = 'registeringFiles'
+        self.plg_inst.save()
+        with mock.patch.object(PluginInstance, 'get_output_objects_count',
+                               return_value=1):
+            with mock.patch.object(tasks.PluginInstanceManager,
+                                   'finish_output_files_registration',
+                                   return_value=None) as finish_mock:
+                # the deadline has already passed
+                tasks.register_plugin_instance_output_files(self.plg_inst.id, 2, 0)
+                finish_mock.assert_called_with(False)
+                tasks.register_plugin_instance_output_files(self.plg_inst.id, 1, 0)
+                finish_mock.assert_called_with(True)
+
+    def test_update_waiting_children_plugin_instances_runs_children(self):
+        user = User.objects.get(username=self.username)
+        plugin_ds = Plugin.objects.get(meta__name="mri_convert")
+        child = PluginInstance.objects.create(plugin=plugin_ds, owner=user,
+                                              previous=self.plg_inst,
+                                              compute_resource=self.compute_resource,
+                                              status='waitingForPrevious')
+        PluginInstance.objects.filter(pk=self.plg_inst.id).update(
+            status='finishedSuccessfully')
+        with mock.patch.object(tasks, 'group') as group_mock:
+            with mock.patch.object(tasks.run_plugin_instance, 's') as s_mock:
+                tasks.update_waiting_children_plugin_instances(self.plg_inst.id)
+                list(group_mock.call_args[0][0])
+
+            # the children are run right away in a single batch
+            s_mock.assert_called_once_with(child.id)
+            group_mock.return_value.apply_async.assert_called_once_with()
+        child.refresh_from_db()
+        self.assertEqual(child.status, 'scheduled')
+
+    def test_update_waiting_children_plugin_instances_cancels_descendants(self):
+        user = User.objects.get(username=self.username)
+        plugin_ds = Plugin.objects.get(meta__name="mri_convert")
+        child = PluginInstance.objects.create(plugin=plugin_ds, owner=user,
+                                              previous=self.plg_inst,
+                                              compute_resource=self.compute_resource,
+                                              status='waitingForPrevious')
+        grandchild = PluginInstance.objects.create(
+            plugin=plugin_ds, owner=user, previous=child,
+            compute_resource=self.compute_resource, status='waitingForPrevious')
+        PluginInstance.objects.filter(pk=self.plg_inst.id).update(
+            status='finishedWithError')
+        with mock.patch.object(tasks, 'group') as group_mock:
+            tasks.update_waiting_children_plugin_instances(self.plg_inst.id)
+            group_mock.assert_not_called()
+        child.refresh_from_db()
+        grandchild.refresh_from_db()
+        self.assertEqual(child.status, 'cancelled')
+        self.assertEqual(grandchild.status, 'cancelled')
+
+    def test_cancel_plugin_instances(self):
+        with mock.patch.object(tasks, 'group') as group_mock:
+            started_ids = tasks.cancel_plugin_instances(
+                PluginInstance.objects.filter(pk=self.plg_inst.id))
+            self.assertEqual(started_ids, [self.plg_inst.id])
+            # the remote cancellation tasks are enqueued in a single batch
+            group_mock.return_value.apply_async.assert_called_once_with()
+        self.plg_inst.refresh_from_db()
+        self.assertEqual(self.plg_inst.status, 'cancelled')
@@ -15,12 +15,13 @@ from celery.contrib.testing.worker import start_worker
 
 from core.celery import app as celery_app
 from core.celery import task_routes
+from core.models import StorageDeletion, TaskLease
 from core.swiftmanager import SwiftManager
 from plugins.models import PluginMeta, Plugin, PluginParameter, ComputeResource
 from plugininstances.models import PluginInstance, PluginInstanceFile
 from plugininstances.models import PathParameter, FloatParameter
 from plugininstances.services.manager import PluginInstanceManager
-from plugininstances import views
+from plugininstances import views, tasks
 
 
 COMPUTE_RESOURCE_URL = settings.COMPUTE_RESOURCE_URL
@@ -307,7 +308,7 @@ class PluginInstanceDetailViewTests(TasksViewTests):
     def test_plugin_instance_detail_success(self):
         self.pl_inst.status = 'started'
         self.pl_inst.save()
-        with mock.patch.object(views.check_plugin_instance_exec_status, 'delay',
+        with mock.patch.object(tasks.check_plugin_instance_exec_status, 'delay',
                                return_value=None) as delay_mock:
             # make API request
             self.client.login(username=self.username, password=self.password)
@@ -315,7 +316,60 @@ class PluginInstanceDetailViewTests(TasksViewTests):
             self.assertContains(response, "pacspull")
             self.assertEqual(response.data['status'], 'started')
             # check that the check_plugin_instance_exec_status task was called with appropriate args
-            delay_mock.assert_called_with(self.pl_inst.id)
+            delay_mock.assert_called_with(self.pl_inst.id, mock.ANY)
+
+    def test_plugin_instance_detail_marker_is_deleted_when_polled_job_finishes(self):
+        self.pl_inst.status = 'started'
+        self.pl_inst.save()
+        with mock.patch.object(tasks.check_plugin_instance_exec_status, 'delay',
+                               return_value=None):
+            self.client.login(username=self.username, password=self.password)
+            self.client.get(self.read_update_delete_url)
+        marker_name = tasks.get_exec_status_check_marker_name(self.pl_inst.id)
+        self.assertTrue(TaskLease.objects.filter(name=marker_name).exists())
+
+        # the job finishes through the per compute resource poller instead
+        d_response = {'jobOperationSummary': {'compute': {'return': {
+            'l_status': ['finishedWithError']}}}}
+        with mock.patch.object(tasks.PluginInstanceManager, 'call_app_service',
+                               return_value=d_response), \
+                mock.patch.object(tasks.PluginInstanceManager,
+                                  'serialize_app_response_status', return_value=''), \
+                mock.patch.object(tasks.PluginInstanceManager,
+                                  'handle_app_remote_error'):
+            tasks.check_compute_resource_plugin_instances_exec_status(
+                self.pl_inst.compute_resource.id)
+        self.pl_inst.refresh_from_db()
+        self.assertEqual(self.pl_inst.status, 'finishedWithError')
+        self.assertFalse(TaskLease.objects.filter(name=marker_name).exists())
+
+    def test_plugin_instance_detail_coalesces_exec_status_checks(self):
+        self.pl_inst.status = 'started'
+        self.pl_inst.save()
+        with mock.patch.object(tasks.check_plugin_instance_exec_status, 'delay',
+                               return_value=None) as delay_mock:
+            self.client.login(username=self.username, password=self.password)
+            self.client.get(self.read_update_delete_url)
+            self.client.get(self.read_update_delete_url)
+            # a single check is pending for the plugin instance
+            delay_mock.assert_called_once()
+            marker = delay_mock.call_args[0][1]
+
+            # once the check is done readers keep sharing it for the coalescing window
+            with mock.patch.object(tasks.PluginInstanceManager,
+                                   'check_plugin_instance_app_exec_status',
+                                   return_value='started'):
+                tasks.check_plugin_instance_exec_status(self.pl_inst.id, marker)
+            self.client.get(self.read_update_delete_url)
+            delay_mock.assert_called_once()
+
+            # the marker is removed when the app is no longer running
+            with mock.patch.object(tasks.PluginInstanceManager,
+                                   'check_plugin_instance_app_exec_status',
+                                   return_value='finishedSuccessfully'):
+                tasks.check_plugin_instance_exec_status(self.pl_inst.id, marker)
+            self.client.get(self.read_update_delete_url)
+            self.assertEqual(delay_mock.call_count, 2)
 
     @tag('integration', 'error-pman')
     def test_integration_plugin_instance_detail_success(self):
@@ -476,6 +530,22 @@ class PluginInstanceDetailViewTests(TasksViewTests):
         response = self.client.delete(self.read_update_delete_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(PluginInstance.objects.count(), 0)
+        self.assertEqual(StorageDeletion.objects.count(), 1)
+        deletion = StorageDeletion.objects.get()
+        self.assertTrue(deletion.paths.startswith(
+            '{0}/feed_{1}/'.format(self.username, self.pl_inst.feed.id)))
+
+    def test_plugin_instance_delete_skips_empty_output_path(self):
+        # a legacy instance without a stored output path must not yield a '/' prefix
+        PluginInstance.objects.filter(pk=self.pl_inst.id).update(output_path='')
+        self.client.login(username=self.username, password=self.password)
+        response = self.client.delete(self.read_update_delete_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(PluginInstance.objects.count(), 0)
+        # only the prefixes of the descendants with a stored output path are deleted
+        for path in StorageDeletion.objects.get().paths.split('\n'):
+            self.assertTrue(path.startswith(
+                '{0}/feed_{1}/'.format(self.username, self.pl_inst.feed.id)))
 
     def test_plugin_instance_delete_failure_unauthenticated(self):
         response = self.client.delete(self.read_update_delete_url)
@@ -572,6 +642,21 @@ class PluginInstanceDescendantListViewTests(ViewTests):
         self.assertContains(response, "mri_info")
         self.assertContains(response, "mri_surf")
 
+    def test_plugin_instance_descendant_list_number_of_queries_is_constant(self):
+        self.client.login(username=self.username, password=self.password)
+        with self.assertNumQueries(5):
+            self.client.get(self.list_url)
+        user = User.objects.get(username=self.username)
+        plugin = Plugin.objects.get(meta__name="mri_convert")
+        fs_inst = PluginInstance.objects.get(plugin__meta__name="pacspull")
+        for i in range(5):
+            PluginInstance.objects.create(
+                plugin=plugin, owner=user, previous=fs_inst,
+                compute_resource=plugin.compute_resources.all()[0])
+        with self.assertNumQueries(5):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 9)
+
     def test_plugin_instance_descendant_list_failure_unauthenticated(self):
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -733,6 +818,16 @@ class AllPluginInstanceFileListViewTests(PluginInstanceFileViewTests):
         response = self.client.get(self.list_url)
         self.assertContains(response, "test_file.txt")
 
+    def test_all_plugin_instance_file_list_number_of_queries_is_constant(self):
+        self.client.login(username=self.username, password=self.password)
+        for i in range(5):
+            PluginInstanceFile.objects.create(plugin_inst=self.plg_inst,
+                                              fname='test_file%s.txt' % i)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(response.data['results'][0]['feed_id'], self.plg_inst.feed.id)
+
     def test_all_plugin_instance_file_list_failure_unauthenticated(self):
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -835,9 +930,9 @@ class FileResourceViewTests(PluginInstanceFileViewTests):
         fileresource_view_inst = mock.Mock()
         fileresource_view_inst.get_object = mock.Mock(return_value=plg_inst_file)
         request_mock = mock.Mock()
-        with mock.patch('plugininstances.views.Response') as response_mock:
+        with mock.patch('plugininstances.views.get_file_download_response') as response_mock:
             views.FileResource.get(fileresource_view_inst, request_mock)
-            response_mock.assert_called_with(plg_inst_file.fname)
+            response_mock.assert_called_with(request_mock, plg_inst_file.fname)
 
     @tag('integration')
     def test_integration_fileresource_download_success(self):
@@ -851,7 +946,7 @@ class FileResourceViewTests(PluginInstanceFileViewTests):
         self.client.login(username=self.username, password=self.password)
         response = self.client.get(self.download_url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(str(response.content, 'utf-8'), "test file")
+        self.assertEqual(str(b''.join(response.streaming_content), 'utf-8'), "test file")
 
         # delete file from Swift storage
         swift_manager.delete_obj('/tests/file1.txt')
@@ -1,12 +1,19 @@
 
+import logging
+import os
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import generics
 from rest_framework import permissions
-from rest_framework.reverse import reverse
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.serializers import ValidationError
 
 from collectionjson import services
 from core.renderers import BinaryFileRenderer
+from core.tasks import schedule_storage_deletion
+from core.utils import get_file_download_response
 from plugins.models import Plugin
 
 from .models import PluginInstance, PluginInstanceFilter
@@ -17,8 +24,11 @@ from .serializers import PARAMETER_SERIALIZERS
 from .serializers import GenericParameterSerializer
 from .serializers import PluginInstanceSerializer, PluginInstanceFileSerializer
 from .permissions import IsRelatedFeedOwnerOrChris, IsOwnerOrChrisOrReadOnly
-from .tasks import (run_plugin_instance, check_plugin_instance_exec_status,
-                    cancel_plugin_instance)
+from .tasks import (run_plugin_instance, schedule_plugin_instance_exec_status_check,
+                    cancel_plugin_instances)
+
+
+logger = logging.getLogger(__name__)
 
 
 class PluginInstanceList(generics.ListCreateAPIView):
@@ -77,8 +87,11 @@ class PluginInstanceList(generics.ListCreateAPIView):
             compute_resource = plugin.compute_resources.all()[0]
         else:
             compute_resource = plugin.compute_resources.get(name=cr_data['name'])
-        plg_inst = serializer.save(owner=user, plugin=plugin, previous=previous,
-                                   compute_resource=compute_resource)
+        try:
+            plg_inst = serializer.save(owner=user, plugin=plugin, previous=previous,
+                                       compute_resource=compute_resource)
+        except DjangoValidationError as e:
+            raise ValidationError({'previous_id': e.messages})
         for param, param_serializer in parameter_serializers:
             param_serializer.save(plugin_inst=plg_inst, plugin_param=param)
 
@@ -124,7 +137,8 @@ class PluginInstanceList(generics.ListCreateAPIView):
         Custom method to get the actual plugin instances' queryset.
         """
         plugin = self.get_object()
-        return self.filter_queryset(plugin.instances.all())
+        return self.filter_queryset(
+            PluginInstance.add_related_objects(plugin.instances.all()))
 
 
 class AllPluginInstanceList(generics.ListAPIView):
@@ -132,7 +146,7 @@ class AllPluginInstanceList(generics.ListAPIView):
     A view for the collection of all plugin instances.
     """
     serializer_class = PluginInstanceSerializer
-    queryset = PluginInstance.objects.all()
+    queryset = PluginInstance.add_related_objects(PluginInstance.objects.all())
     permission_classes = (permissions.IsAuthenticated,)
 
     def list(self, request, *args, **kwargs):
@@ -153,7 +167,7 @@ class AllPluginInstanceListQuerySearch(generics.ListAPIView):
     A view for the collection of plugin instances resulting from a query search.
     """
     serializer_class = PluginInstanceSerializer
-    queryset = PluginInstance.objects.all()
+    queryset = PluginInstance.add_related_objects(PluginInstance.objects.all())
     permission_classes = (permissions.IsAuthenticated,)
     filterset_class = PluginInstanceFilter
 
@@ -172,9 +186,10 @@ class PluginInstanceDetail(generics.RetrieveUpdateDestroyAPIView):
         """
         plg_inst = self.get_object()
         if plg_inst.status == 'started':
-            # check execution status of plugin's app
-            check_plugin_instance_exec_status.delay(plg_inst.id)  # call async task
-        response = super(PluginInstanceDetail, self).retrieve(request, *args, **kwargs)
+            # check execution status of plugin's app (coalesced with other readers)
+            schedule_plugin_instance_exec_status_check(plg_inst.id)
+        serializer = self.get_serializer(plg_inst)
+        response = Response(serializer.data)
         template_data = {'title': '', 'status': ''}
         return services.append_collection_template(response, template_data)
 
@@ -198,12 +213,7 @@ class PluginInstanceDetail(generics.RetrieveUpdateDestroyAPIView):
         """
         if 'status' in self.request.data:
             instance = self.get_object()
-            descendants = instance.get_descendant_instances()
-            if instance.status == 'started':
-                cancel_plugin_instance.delay(instance.id)  # call async task
-            for plg_inst in descendants:
-                plg_inst.status = 'cancelled'
-                plg_inst.save()
+            cancel_plugin_instances(instance.get_descendant_instances())
 
         super(PluginInstanceDetail, self).perform_update(serializer)
 
@@ -211,15 +221,32 @@ class PluginInstanceDetail(generics.RetrieveUpdateDestroyAPIView):
         """
         Overriden to cancel the plugin instance execution before deleting it. All the
         descendant instances are also cancelled before they are deleted by the DB CASCADE.
+        The deletion of their files from swift storage is scheduled in the background
+        and their feeds' and owners' storage usage is updated.
         """
         instance = self.get_object()
         descendants = instance.get_descendant_instances()
-        if instance.status == 'started':
-            cancel_plugin_instance.delay(instance.id)  # call async task
-        for plg_inst in descendants:
-            plg_inst.status = 'cancelled'
-            plg_inst.save()
-        return super(PluginInstanceDetail, self).destroy(request, *args, **kwargs)
+        cancel_plugin_instances(descendants)
+        # descendants owned by other users write their files under their own user dir
+        paths = []
+        for (inst_id, output_path, username, feed_id) in descendants.values_list(
+                'id', 'output_path', 'owner__username', 'feed_id'):
+            path = os.path.dirname(output_path) + '/' if output_path else ''
+            # never schedule the deletion of anything outside the instance's feed dir
+            # (eg. the '/' prefix of a legacy instance without a stored output path)
+            if not path.startswith('{0}/feed_{1}/'.format(username, feed_id)):
+                logger.error("Deletion of storage prefix '%s' of plugin instance %s "
+                             "skipped as it is not within its feed's dir", path,
+                             inst_id)
+                continue
+            paths.append(path)
+        with transaction.atomic():
+            PluginInstanceFile.remove_storage_usage(
+                PluginInstanceFile.objects.filter(plugin_inst__in=descendants))
+            response = super(PluginInstanceDetail, self).destroy(request, *args,
+                                                                 **kwargs)
+        schedule_storage_deletion(paths)
+        return response
 
 
 class PluginInstanceDescendantList(generics.ListAPIView):
@@ -243,7 +270,8 @@ class PluginInstanceDescendantList(generics.ListAPIView):
         Custom method to get the actual descendants queryset.
         """
         instance = self.get_object()
-        return self.filter_queryset(instance.get_descendant_instances())
+        return self.filter_queryset(
+            PluginInstance.add_related_objects(instance.get_descendant_instances()))
 
 
 class PluginInstanceFileList(generics.ListAPIView):
@@ -274,7 +302,8 @@ class PluginInstanceFileList(generics.ListAPIView):
         Custom method to get the actual files queryset.
         """
         instance = self.get_object()
-        return self.filter_queryset(instance.files.all())
+        return self.filter_queryset(
+            PluginInstanceFile.add_related_objects(instance.files.all()))
 
 
 class AllPluginInstanceFileList(generics.ListAPIView):
@@ -302,8 +331,10 @@ class AllPluginInstanceFileList(generics.ListAPIView):
         user = self.request.user
         # if the user is chris then return all the files in the system
         if user.username == 'chris':
-            return PluginInstanceFile.objects.all()
-        return PluginInstanceFile.objects.filter(plugin_inst__feed__owner=user)
+            queryset = PluginInstanceFile.objects.all()
+        else:
+            queryset = PluginInstanceFile.objects.filter(plugin_inst__feed__owner=user)
+        return PluginInstanceFile.add_related_objects(queryset)
 
 
 class AllPluginInstanceFileListQuerySearch(generics.ListAPIView):
@@ -323,8 +354,10 @@ class AllPluginInstanceFileListQuerySearch(generics.ListAPIView):
         user = self.request.user
         # if the user is chris then return all the files in the system
         if user.username == 'chris':
-            return PluginInstanceFile.objects.all()
-        return PluginInstanceFile.objects.filter(plugin_inst__feed__owner=user)
+            queryset = PluginInstanceFile.objects.all()
+        else:
+            queryset = PluginInstanceFile.objects.filter(plugin_inst__feed__owner=user)
+        return PluginInstanceFile.add_related_objects(queryset)
 
 
 class PluginInstanceFileDetail(generics.RetrieveAPIView):
@@ -346,10 +379,11 @@ class FileResource(generics.GenericAPIView):
 
     def get(self, request, *args, **kwargs):
         """
-        Overriden to be able to make a GET request to an actual file resource.
+        Overriden to be able to make a GET request to an actual file resource. The
+        file contents are streamed from storage and HTTP range requests are supported.
         """
         plg_inst_file = self.get_object()
-        return Response(plg_inst_file.fname)
+        return get_file_download_response(request, plg_inst_file.fname)
 
 
 class PluginInstanceParameterList(generics.ListAPIView):
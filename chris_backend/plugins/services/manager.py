@@ -25,6 +25,7 @@ from plugins.models import PluginMeta, Plugin
 from plugins.serializers import ComputeResourceSerializer
 from plugins.serializers import (PluginMetaSerializer, PluginSerializer,
                                  PluginParameterSerializer, DEFAULT_PARAMETER_SERIALIZERS)
+from plugininstances.tasks import cancel_plugin_instances
 
 
 class PluginManager(object):
@@ -227,8 +228,7 @@ class PluginManager(object):
             plugin = Plugin.objects.get(id=id)
         except Plugin.DoesNotExist:
             raise NameError("Couldn't find plugin with id '%s'" % id)
-        for plg_inst in plugin.instances.all():
-            plg_inst.cancel()
+        cancel_plugin_instances(plugin.instances.all())
         if plugin.meta.plugins.count() == 1:
             plugin.meta.delete()  # the cascade deletes the plugin too
         else:
@@ -125,7 +125,7 @@ class PluginList(generics.ListAPIView):
     A view for the collection of plugins.
     """
     serializer_class = PluginSerializer
-    queryset = Plugin.objects.all()
+    queryset = Plugin.objects.select_related('meta')
     permission_classes = (permissions.IsAuthenticated,)
 
     def list(self, request, *args, **kwargs):
@@ -148,7 +148,7 @@ class PluginListQuerySearch(generics.ListAPIView):
     A view for the collection of plugins resulting from a query search.
     """
     serializer_class = PluginSerializer
-    queryset = Plugin.objects.all()
+    queryset = Plugin.objects.select_related('meta')
     permission_classes = (permissions.IsAuthenticated,)
     filterset_class = PluginFilter
 
@@ -186,7 +186,7 @@ class PluginDetail(generics.RetrieveAPIView):
     A plugin view.
     """
     serializer_class = PluginSerializer
-    queryset = Plugin.objects.all()
+    queryset = Plugin.objects.select_related('meta')
     permission_classes = (permissions.IsAuthenticated,)
 
 
@@ -215,7 +215,9 @@ class PluginParameterList(generics.ListAPIView):
         Custom method to get the actual plugin parameters' queryset.
         """
         plugin = self.get_object()
-        return self.filter_queryset(plugin.parameters.all())
+        queryset = plugin.parameters.select_related('string_default', 'integer_default',
+                                                    'float_default', 'boolean_default')
+        return self.filter_queryset(queryset)
 
 
 class PluginParameterDetail(generics.RetrieveAPIView):
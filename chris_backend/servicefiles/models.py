@@ -17,6 +17,10 @@ class Service(models.Model):
 class ServiceFile(models.Model):
     creation_date = models.DateTimeField(auto_now_add=True)
     fname = models.FileField(max_length=512, unique=True)
+    fsize = models.BigIntegerField(null=True, blank=True, db_index=True)
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    last_modified = models.DateTimeField(null=True, blank=True)
     service = models.ForeignKey(Service, db_index=True, on_delete=models.CASCADE)
 
     class Meta:
@@ -33,6 +37,7 @@ class ServiceFileFilter(FilterSet):
                                                   lookup_expr='lte')
     fname = django_filters.CharFilter(field_name='fname', lookup_expr='startswith')
     fname_exact = django_filters.CharFilter(field_name='fname', lookup_expr='exact')
+    checksum = django_filters.CharFilter(field_name='checksum', lookup_expr='exact')
     service_identifier = django_filters.CharFilter(field_name='service__identifier',
                                                    lookup_expr='exact')
     service_id = django_filters.CharFilter(field_name='service_id', lookup_expr='exact')
@@ -40,4 +45,4 @@ class ServiceFileFilter(FilterSet):
     class Meta:
         model = ServiceFile
         fields = ['id', 'min_creation_date', 'max_creation_date', 'fname', 'fname_exact',
-                  'service_identifier', 'service_id']
+                  'checksum', 'service_identifier', 'service_id']
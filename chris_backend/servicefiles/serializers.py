@@ -1,12 +1,11 @@
 
 import logging
 
-from django.conf import settings
 from rest_framework import serializers
 
 from collectionjson.fields import ItemLinkField
-from core.utils import get_file_resource_link
-from core.swiftmanager import SwiftManager
+from core.utils import get_file_resource_link, get_storage_manager
+from core.utils import update_file_metadata
 
 from .models import Service, ServiceFile
 from .models import REGISTERED_SERVICES
@@ -26,12 +25,17 @@ class ServiceFileSerializer(serializers.HyperlinkedModelSerializer):
     file_resource = ItemLinkField('get_file_link')
     path = serializers.CharField(write_only=True)
     fname = serializers.FileField(use_url=False, required=False)
+    fsize = serializers.ReadOnlyField()
+    checksum = serializers.ReadOnlyField()
+    content_type = serializers.ReadOnlyField()
+    last_modified = serializers.ReadOnlyField()
     service_identifier = serializers.ReadOnlyField(source='service.identifier')
     service_name = serializers.CharField(write_only=True)
 
     class Meta:
         model = ServiceFile
-        fields = ('url', 'id', 'creation_date', 'fname', 'path', 'service_identifier',
+        fields = ('url', 'id', 'creation_date', 'fname', 'fsize', 'checksum',
+                  'content_type', 'last_modified', 'path', 'service_identifier',
                   'service_name', 'file_resource')
 
     def get_file_link(self, obj):
@@ -42,14 +46,15 @@ class ServiceFileSerializer(serializers.HyperlinkedModelSerializer):
 
     def create(self, validated_data):
         """
-        Overriden to associate a Swift storage path with the newly created pacs file.
+        Overriden to associate a Swift storage path and its metadata with the newly
+        created service file.
         """
         # remove path as it is not part of the model and compute fname
         path = validated_data.pop('path')
         service_file = super(ServiceFileSerializer, self).create(validated_data)
         service_file.fname.name = path
-        service_file.save()
-        return service_file
+        # the object's metadata was already fetched from storage by validate
+        return update_file_metadata(service_file, d_obj=self.d_storage_obj)
 
     def validate_service_name(self, service_name):
         """
@@ -85,15 +90,13 @@ class ServiceFileSerializer(serializers.HyperlinkedModelSerializer):
         if not path.startswith(prefix):
             error_msg = "File path must start with '%s'." % prefix
             raise serializers.ValidationError([error_msg])
-        # verify that the file is indeed already in Swift
-        swift_manager = SwiftManager(settings.SWIFT_CONTAINER_NAME,
-                                     settings.SWIFT_CONNECTION_PARAMS)
+        # verify that the file is indeed already in Swift and keep its metadata
+        swift_manager = get_storage_manager()
         try:
-            swift_path_exists = swift_manager.obj_exists(path)
+            self.d_storage_obj = swift_manager.stat_obj(path)
         except Exception as e:
-            logger.error('Swift storage error, detail: %s' % str(e))
-            raise serializers.ValidationError({'path': ["Could not find this path."]})
-        if not swift_path_exists:
+            if getattr(e, 'http_status', None) != 404:
+                logger.error('Swift storage error, detail: %s' % str(e))
             raise serializers.ValidationError({'path': ["Could not find this path."]})
         # verify that the file has not already been registered
         try:
@@ -10,7 +10,7 @@ from rest_framework import serializers
 
 from servicefiles.models import Service, ServiceFile
 from servicefiles.serializers import ServiceFileSerializer
-from servicefiles.serializers import SwiftManager
+from core.swiftmanager import SwiftManager, ClientException
 
 
 class ServiceFileSerializerTests(TestCase):
@@ -52,13 +52,28 @@ class ServiceFileSerializerTests(TestCase):
         path = 'SERVICES/MyService/123456-crazy/brain_crazy_study/brain_crazy_mri/file1.dcm'
         data = {'service_name': 'MyService', 'path': path}
         servicefiles_serializer = ServiceFileSerializer()
-        with mock.patch.object(SwiftManager, 'obj_exists',
-                               return_value=True) as obj_exists_mock:
+        with mock.patch.object(SwiftManager, 'stat_obj',
+                               return_value={'bytes': 10}) as stat_obj_mock:
             new_data = servicefiles_serializer.validate(data)
             self.assertIn('service', new_data)
             self.assertNotIn('service_name', new_data)
             self.assertEqual(new_data.get('path'), path.strip(' ').strip('/'))
-            obj_exists_mock.assert_called_with(new_data.get('path'))
+            stat_obj_mock.assert_called_with(new_data.get('path'))
+
+    def test_create_reuses_the_object_metadata_fetched_by_validate(self):
+        """
+        Test whether overriden create method sets the file's metadata from the storage
+        object fetched by validate instead of querying storage again.
+        """
+        path = 'SERVICES/MyService/123456-crazy/brain_crazy_study/brain_crazy_mri/file1.dcm'
+        data = {'service_name': 'MyService', 'path': path}
+        servicefiles_serializer = ServiceFileSerializer()
+        with mock.patch.object(SwiftManager, 'stat_obj',
+                               return_value={'bytes': 10}) as stat_obj_mock:
+            validated_data = servicefiles_serializer.validate(data)
+            service_file = servicefiles_serializer.create(validated_data)
+            stat_obj_mock.assert_called_once_with(path)
+        self.assertEqual(service_file.fsize, 10)
 
     def test_validate_failure_path_does_not_start_with_SERVICES_PACS(self):
         """
@@ -79,11 +94,12 @@ class ServiceFileSerializerTests(TestCase):
         path = 'SERVICES/MyService/123456-crazy/brain_crazy_study/brain_crazy_mri/file1.dcm'
         data = {'service_name': 'MyService', 'path': path}
         servicefiles_serializer = ServiceFileSerializer()
-        with mock.patch.object(SwiftManager, 'obj_exists',
-                               return_value=False) as obj_exists_mock:
+        not_found = ClientException('Object HEAD failed', http_status=404)
+        with mock.patch.object(SwiftManager, 'stat_obj',
+                               side_effect=not_found) as stat_obj_mock:
             with self.assertRaises(serializers.ValidationError):
                 servicefiles_serializer.validate(data)
-            obj_exists_mock.assert_called_with(path.strip(' ').strip('/'))
+            stat_obj_mock.assert_called_with(path.strip(' ').strip('/'))
 
     @tag('integration')
     def test_integration_validate_path_failure_does_not_exist(self):
@@ -164,9 +164,9 @@ class ServiceFileResourceViewTests(ServiceFileViewTests):
         fileresource_view_inst = mock.Mock()
         fileresource_view_inst.get_object = mock.Mock(return_value=service_file)
         request_mock = mock.Mock()
-        with mock.patch('servicefiles.views.Response') as response_mock:
+        with mock.patch('servicefiles.views.get_file_download_response') as response_mock:
             views.ServiceFileResource.get(fileresource_view_inst, request_mock)
-            response_mock.assert_called_with(service_file.fname)
+            response_mock.assert_called_with(request_mock, service_file.fname)
 
     @tag('integration')
     def test_integration_servicefileresource_download_success(self):
@@ -179,7 +179,7 @@ class ServiceFileResourceViewTests(ServiceFileViewTests):
         self.client.login(username=self.username, password=self.password)
         response = self.client.get(self.download_url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(str(response.content, 'utf-8'), "test file")
+        self.assertEqual(str(b''.join(response.streaming_content), 'utf-8'), "test file")
 
         # delete file from Swift storage
         swift_manager.delete_obj(self.path)
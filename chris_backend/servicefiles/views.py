@@ -1,10 +1,10 @@
 
 from rest_framework import generics, permissions
 from rest_framework.reverse import reverse
-from rest_framework.response import Response
 
 from collectionjson import services
 from core.renderers import BinaryFileRenderer
+from core.utils import get_file_download_response
 
 from .models import ServiceFile, ServiceFileFilter
 from .serializers import ServiceFileSerializer
@@ -15,7 +15,7 @@ class ServiceFileList(generics.ListCreateAPIView):
     """
     A view for the collection of PACS files.
     """
-    queryset = ServiceFile.objects.all()
+    queryset = ServiceFile.objects.select_related('service')
     serializer_class = ServiceFileSerializer
     permission_classes = (permissions.IsAuthenticated, IsChrisOrReadOnly,)
 
@@ -45,7 +45,7 @@ class ServiceFileListQuerySearch(generics.ListAPIView):
     A view for the collection of Service files resulting from a query search.
     """
     serializer_class = ServiceFileSerializer
-    queryset = ServiceFile.objects.all()
+    queryset = ServiceFile.objects.select_related('service')
     permission_classes = (permissions.IsAuthenticated,)
     filterset_class = ServiceFileFilter
 
@@ -69,7 +69,8 @@ class ServiceFileResource(generics.GenericAPIView):
 
     def get(self, request, *args, **kwargs):
         """
-        Overriden to be able to make a GET request to an actual file resource.
+        Overriden to be able to make a GET request to an actual file resource. The
+        file contents are streamed from storage and HTTP range requests are supported.
         """
         service_file = self.get_object()
-        return Response(service_file.fname)
+        return get_file_download_response(request, service_file.fname)
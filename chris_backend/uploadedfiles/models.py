@@ -13,6 +13,10 @@ def uploaded_file_path(instance, filename):
 class UploadedFile(models.Model):
     creation_date = models.DateTimeField(auto_now_add=True)
     fname = models.FileField(max_length=512, upload_to=uploaded_file_path, unique=True)
+    fsize = models.BigIntegerField(null=True, blank=True, db_index=True)
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    last_modified = models.DateTimeField(null=True, blank=True)
     owner = models.ForeignKey('auth.User', on_delete=models.CASCADE)
 
     class Meta:
@@ -29,10 +33,11 @@ class UploadedFileFilter(FilterSet):
                                                  lookup_expr='lte')
     fname = django_filters.CharFilter(field_name='fname', lookup_expr='startswith')
     fname_exact = django_filters.CharFilter(field_name='fname', lookup_expr='exact')
+    checksum = django_filters.CharFilter(field_name='checksum', lookup_expr='exact')
     owner_username = django_filters.CharFilter(field_name='owner__username',
                                                lookup_expr='exact')
 
     class Meta:
         model = UploadedFile
         fields = ['id', 'min_creation_date', 'max_creation_date', 'fname', 'fname_exact',
-                  'owner_username']
+                  'checksum', 'owner_username']
@@ -1,8 +1,10 @@
 
+from django.db import transaction
 from rest_framework import serializers
 
 from collectionjson.fields import ItemLinkField
-from core.utils import get_file_resource_link
+from core.utils import get_file_resource_link, update_file_metadata
+from users.models import UserStorageUsage
 
 from .models import UploadedFile
 
@@ -12,11 +14,27 @@ class UploadedFileSerializer(serializers.HyperlinkedModelSerializer):
     file_resource = ItemLinkField('get_file_link')
     fname = serializers.FileField(use_url=False)
     upload_path = serializers.CharField(write_only=True)
+    fsize = serializers.ReadOnlyField()
+    checksum = serializers.ReadOnlyField()
+    content_type = serializers.ReadOnlyField()
+    last_modified = serializers.ReadOnlyField()
 
     class Meta:
         model = UploadedFile
-        fields = ('url', 'id', 'creation_date', 'upload_path', 'fname', 'file_resource',
-                  'owner')
+        fields = ('url', 'id', 'creation_date', 'upload_path', 'fname', 'fsize',
+                  'checksum', 'content_type', 'last_modified', 'file_resource', 'owner')
+
+    def create(self, validated_data):
+        """
+        Overriden to save the metadata of the uploaded file reported by storage and
+        update the owner's storage usage.
+        """
+        with transaction.atomic():
+            uploaded_file = super(UploadedFileSerializer, self).create(validated_data)
+            update_file_metadata(uploaded_file)
+            UserStorageUsage.add_storage_usage(uploaded_file.owner_id, 1,
+                                               uploaded_file.fsize or 0)
+        return uploaded_file
 
     def get_file_link(self, obj):
         """
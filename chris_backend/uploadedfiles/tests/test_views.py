@@ -135,7 +135,7 @@ class UploadedFileDetailViewTests(UploadedFileViewTests):
     def test_uploadedfile_delete_success(self):
         self.client.login(username=self.username, password=self.password)
         swift_path = self.uploadedfile.fname.name
-        mocked_method = 'uploadedfiles.views.SwiftManager.delete_obj'
+        mocked_method = 'core.swiftmanager.SwiftManager.delete_obj'
         with mock.patch(mocked_method) as delete_obj_mock:
             response = self.client.delete(self.read_update_delete_url)
             delete_obj_mock.assert_called_with(swift_path)
@@ -170,9 +170,9 @@ class UploadedFileResourceViewTests(UploadedFileViewTests):
         fileresource_view_inst = mock.Mock()
         fileresource_view_inst.get_object = mock.Mock(return_value=uploadedfile)
         request_mock = mock.Mock()
-        with mock.patch('uploadedfiles.views.Response') as response_mock:
+        with mock.patch('uploadedfiles.views.get_file_download_response') as response_mock:
             views.UploadedFileResource.get(fileresource_view_inst, request_mock)
-            response_mock.assert_called_with(uploadedfile.fname)
+            response_mock.assert_called_with(request_mock, uploadedfile.fname)
 
     @tag('integration')
     def test_integration_uploadedfileresource_download_success(self):
@@ -186,7 +186,25 @@ class UploadedFileResourceViewTests(UploadedFileViewTests):
         self.client.login(username=self.username, password=self.password)
         response = self.client.get(self.download_url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(str(response.content, 'utf-8'), "test file")
+        self.assertEqual(str(b''.join(response.streaming_content), 'utf-8'), "test file")
+
+        # delete file from Swift storage
+        swift_manager.delete_obj(upload_path)
+
+    @tag('integration')
+    def test_integration_uploadedfileresource_download_range_success(self):
+        swift_manager = SwiftManager(settings.SWIFT_CONTAINER_NAME,
+                                     settings.SWIFT_CONNECTION_PARAMS)
+        # upload file to Swift storage
+        upload_path = "{}/uploads/file1.txt".format(self.username)
+        with io.StringIO("test file") as file1:
+            swift_manager.upload_obj(upload_path, file1.read(), content_type='text/plain')
+
+        self.client.login(username=self.username, password=self.password)
+        response = self.client.get(self.download_url, HTTP_RANGE='bytes=5-8')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 5-8/9')
+        self.assertEqual(b''.join(response.streaming_content), b"file")
 
         # delete file from Swift storage
         swift_manager.delete_obj(upload_path)
@@ -1,14 +1,14 @@
 
 import logging
 
-from django.conf import settings
+from django.db import transaction
 from rest_framework import generics, permissions
 from rest_framework.reverse import reverse
-from rest_framework.response import Response
 
 from collectionjson import services
 from core.renderers import BinaryFileRenderer
-from core.swiftmanager import SwiftManager
+from core.utils import get_file_download_response, get_storage_manager
+from users.models import UserStorageUsage
 
 from .models import UploadedFile, UploadedFileFilter
 from .serializers import UploadedFileSerializer
@@ -92,8 +92,7 @@ class UploadedFileDetail(generics.RetrieveUpdateDestroyAPIView):
         user_file = self.get_object()
         old_swift_path = user_file.fname.name
         serializer.save()
-        swift_manager = SwiftManager(settings.SWIFT_CONTAINER_NAME,
-                                     settings.SWIFT_CONNECTION_PARAMS)
+        swift_manager = get_storage_manager()
         try:
             swift_manager.delete_obj(old_swift_path)
         except Exception as e:
@@ -101,12 +100,15 @@ class UploadedFileDetail(generics.RetrieveUpdateDestroyAPIView):
 
     def perform_destroy(self, instance):
         """
-        Overriden to delete the file from swift storage.
+        Overriden to update the owner's storage usage and delete the file from swift
+        storage.
         """
         swift_path = instance.fname.name
-        instance.delete()
-        swift_manager = SwiftManager(settings.SWIFT_CONTAINER_NAME,
-                                     settings.SWIFT_CONNECTION_PARAMS)
+        with transaction.atomic():
+            UserStorageUsage.add_storage_usage(instance.owner_id, -1,
+                                               -(instance.fsize or 0))
+            instance.delete()
+        swift_manager = get_storage_manager()
         try:
             swift_manager.delete_obj(swift_path)
         except Exception as e:
@@ -123,7 +125,8 @@ class UploadedFileResource(generics.GenericAPIView):
 
     def get(self, request, *args, **kwargs):
         """
-        Overriden to be able to make a GET request to an actual file resource.
+        Overriden to be able to make a GET request to an actual file resource. The
+        file contents are streamed from storage and HTTP range requests are supported.
         """
         user_file = self.get_object()
-        return Response(user_file.fname)
+        return get_file_download_response(request, user_file.fname)
@@ -0,0 +1,55 @@
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from core.utils import get_storage_manager, update_file_metadata
+from feeds.models import Feed
+from plugininstances.models import PluginInstanceFile
+from uploadedfiles.models import UploadedFile
+from users.models import UserStorageUsage
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the storage usage counters of feeds and users from the registered ' \
+           'files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fetch-metadata', action='store_true',
+                            help='fetch from storage the metadata of the registered '
+                                 'files without a size before rebuilding the counters')
+
+    def handle(self, *args, **options):
+        if options['fetch_metadata']:
+            storage_manager = get_storage_manager()
+            nfiles = 0
+            for model in (PluginInstanceFile, UploadedFile):
+                for file_obj in model.objects.filter(fsize__isnull=True).iterator():
+                    update_file_metadata(file_obj, storage_manager)
+                    nfiles += 1
+            self.stdout.write('Fetched metadata of %s files' % nfiles)
+
+        plg_inst_files = PluginInstanceFile.objects.order_by()
+        d_users = {}
+        with transaction.atomic():
+            Feed.objects.update(files_count=0, files_size=0)
+            for d in plg_inst_files.values('plugin_inst__feed_id').annotate(
+                    nfiles=Count('id'), nbytes=Sum('fsize')):
+                Feed.objects.filter(pk=d['plugin_inst__feed_id']).update(
+                    files_count=d['nfiles'], files_size=d['nbytes'] or 0)
+            for d in plg_inst_files.values('plugin_inst__owner_id').annotate(
+                    nfiles=Count('id'), nbytes=Sum('fsize')):
+                d_users[d['plugin_inst__owner_id']] = [d['nfiles'], d['nbytes'] or 0]
+            for d in UploadedFile.objects.order_by().values('owner_id').annotate(
+                    nfiles=Count('id'), nbytes=Sum('fsize')):
+                totals = d_users.setdefault(d['owner_id'], [0, 0])
+                totals[0] += d['nfiles']
+                totals[1] += d['nbytes'] or 0
+            UserStorageUsage.objects.exclude(user_id__in=d_users.keys()).update(
+                files_count=0, files_size=0)
+            for (user_id, (nfiles, nbytes)) in d_users.items():
+                UserStorageUsage.objects.update_or_create(
+                    user_id=user_id, defaults={'files_count': nfiles,
+                                               'files_size': nbytes})
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt storage usage counters of %s users' % len(d_users)))
@@ -1,3 +1,38 @@
-from django.db import models
 
-# Create your models here.
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+
+
+class UserStorageUsage(models.Model):
+    """
+    Model class that keeps the running totals of the number of files and bytes in
+    storage that belong to a user (uploaded files and plugin instance output files).
+    """
+    user = models.OneToOneField('auth.User', on_delete=models.CASCADE,
+                                related_name='storage_usage')
+    files_count = models.BigIntegerField(default=0)
+    files_size = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return self.user.username
+
+    @classmethod
+    def add_storage_usage(cls, user_id, nfiles, nbytes):
+        """
+        Custom class method to atomically add the passed number of files and bytes
+        (negative to subtract) to a user's storage usage counters.
+        """
+        if not nfiles and not nbytes:
+            return
+        updated = cls.objects.filter(user_id=user_id).update(
+            files_count=F('files_count') + nfiles, files_size=F('files_size') + nbytes)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user_id=user_id, files_count=nfiles,
+                                       files_size=nbytes)
+            except IntegrityError:
+                # the counters were concurrently created
+                cls.objects.filter(user_id=user_id).update(
+                    files_count=F('files_count') + nfiles,
+                    files_size=F('files_size') + nbytes)
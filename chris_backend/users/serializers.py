@@ -1,15 +1,18 @@
 
 import logging
 import io
+import hashlib
 
 from django.contrib.auth.models import User
-from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
-from core.swiftmanager import SwiftManager
+from core.utils import get_storage_manager
 from uploadedfiles.models import UploadedFile
 
+from .models import UserStorageUsage
+
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +27,32 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
                                    validators=[UniqueValidator(
                                        queryset=User.objects.all())])
     password = serializers.CharField(min_length=8, max_length=100, write_only=True)
+    files_count = serializers.SerializerMethodField()
+    files_size = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ('url', 'id', 'username', 'email', 'password', 'feed')
+        fields = ('url', 'id', 'username', 'email', 'password', 'files_count',
+                  'files_size', 'feed')
+
+    def get_files_count(self, obj):
+        """
+        Overriden to get the number of files in storage that belong to the user.
+        """
+        try:
+            return obj.storage_usage.files_count
+        except UserStorageUsage.DoesNotExist:
+            return 0
+
+    def get_files_size(self, obj):
+        """
+        Overriden to get the total size in bytes of the files in storage that belong
+        to the user.
+        """
+        try:
+            return obj.storage_usage.files_size
+        except UserStorageUsage.DoesNotExist:
+            return 0
 
     def create(self, validated_data):
         """
@@ -38,16 +63,22 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         email = validated_data.get('email')
         password = validated_data.get('password')
         user = User.objects.create_user(username, email, password)
-        swift_manager = SwiftManager(settings.SWIFT_CONTAINER_NAME,
-                                     settings.SWIFT_CONNECTION_PARAMS)
+        swift_manager = get_storage_manager()
         welcome_file_path = '%s/uploads/welcome.txt' % username
         try:
             with io.StringIO('Welcome to ChRIS!') as f:
-                swift_manager.upload_obj(welcome_file_path, f.read(),
+                contents = f.read()
+                swift_manager.upload_obj(welcome_file_path, contents,
                                          content_type='text/plain')
-            welcome_file = UploadedFile(owner=user)
+            # the file metadata is known so there is no need to ask storage for it
+            welcome_file = UploadedFile(owner=user, fsize=len(contents),
+                                        checksum=hashlib.md5(
+                                            contents.encode()).hexdigest(),
+                                        content_type='text/plain',
+                                        last_modified=timezone.now())
             welcome_file.fname.name = welcome_file_path
             welcome_file.save()
+            UserStorageUsage.add_storage_usage(user.id, 1, welcome_file.fsize)
         except Exception as e:
             logger.error('Could not create welcome file in user space, detail: %s' %
                          str(e))
@@ -0,0 +1,61 @@
+
+import logging
+from io import StringIO
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.conf import settings
+
+from feeds.models import Feed
+from plugins.models import PluginMeta, Plugin, ComputeResource
+from plugininstances.models import PluginInstance, PluginInstanceFile
+from uploadedfiles.models import UploadedFile
+from users.models import UserStorageUsage
+
+
+COMPUTE_RESOURCE_URL = settings.COMPUTE_RESOURCE_URL
+
+
+class RebuildStorageUsageCommandTests(TestCase):
+
+    def setUp(self):
+        # avoid cluttered console output (for instance logging all the http requests)
+        logging.disable(logging.WARNING)
+
+        self.username = 'foo'
+        user = User.objects.create_user(username=self.username, password='foo-pass')
+        (compute_resource, tf) = ComputeResource.objects.get_or_create(
+            name="host", compute_url=COMPUTE_RESOURCE_URL)
+        (pl_meta, tf) = PluginMeta.objects.get_or_create(name='pacspull', type='fs')
+        (plugin, tf) = Plugin.objects.get_or_create(meta=pl_meta, version='0.1')
+        plugin.compute_resources.set([compute_resource])
+        self.plg_inst = PluginInstance.objects.create(plugin=plugin, owner=user,
+                                                      compute_resource=compute_resource)
+        output_path = self.plg_inst.get_output_path()
+        for (i, fsize) in enumerate([10, 20, None]):
+            PluginInstanceFile.objects.create(plugin_inst=self.plg_inst, fsize=fsize,
+                                              fname='%s/file%s.txt' % (output_path, i))
+        upload = UploadedFile(owner=user, fsize=5)
+        upload.fname.name = '%s/uploads/file.txt' % self.username
+        upload.save()
+
+    def tearDown(self):
+        # re-enable logging
+        logging.disable(logging.NOTSET)
+
+    def test_rebuild_storage_usage(self):
+        """
+        Test whether the rebuild_storage_usage command recomputes the feeds' and users'
+        storage usage counters from the registered files.
+        """
+        user = User.objects.get(username=self.username)
+        UserStorageUsage.objects.create(user=user, files_count=100, files_size=1000)
+        Feed.objects.update(files_count=100, files_size=1000)
+
+        call_command('rebuild_storage_usage', stdout=StringIO())
+
+        feed = Feed.objects.get(pk=self.plg_inst.feed.id)
+        self.assertEqual((feed.files_count, feed.files_size), (3, 30))
+        usage = UserStorageUsage.objects.get(user=user)
+        self.assertEqual((usage.files_count, usage.files_size), (4, 35))
@@ -9,7 +9,8 @@ from django.test import TestCase
 from rest_framework import serializers
 
 from uploadedfiles.models import UploadedFile
-from users.serializers import UserSerializer, SwiftManager
+from core.swiftmanager import SwiftManager
+from users.serializers import UserSerializer
 
 
 class UserSerializerTests(TestCase):
@@ -50,6 +51,8 @@ class UserSerializerTests(TestCase):
             welcome_file_path = '%s/uploads/welcome.txt' % self.username
             welcome_file = UploadedFile.objects.get(owner=user)
             self.assertEqual(welcome_file.fname.name, welcome_file_path)
+            self.assertEqual(user.storage_usage.files_count, 1)
+            self.assertEqual(user.storage_usage.files_size, welcome_file.fsize)
             upload_obj_mock.assert_called_with(welcome_file_path, mock.ANY,
                                                content_type='text/plain')
 
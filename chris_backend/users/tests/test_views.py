@@ -11,7 +11,7 @@ from django.conf import settings
 from rest_framework import status
 
 from uploadedfiles.models import UploadedFile
-from users.serializers import SwiftManager
+from core.swiftmanager import SwiftManager
 
 
 class UserViewTests(TestCase):
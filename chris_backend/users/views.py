@@ -23,7 +23,7 @@ class UserCreate(generics.ListCreateAPIView):
 
 
 class UserDetail(generics.RetrieveUpdateAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('storage_usage')
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated, IsUserOrChrisOrReadOnly)
 
@@ -449,7 +449,7 @@ else
         windowBottom
         docker-compose -f docker-compose_dev.yml    \
             exec chris_dev python manage.py         \
-            test --exclude-tag integration
+            test --exclude-tag integration --exclude-tag benchmark
         status=$?
         title -d 1 "CUBE Unit results"
         if (( $status == 0 )) ; then